@@ -0,0 +1,87 @@
+"""Compare the memory and lookup cost of capability bitmaps held as lists of hex words against int bitsets.
+
+The corpus is the same as bench_devices.py's. Each row validates every device's bitmaps from their kernel text and
+reports the memory they hold, then times asking every device whether it has KEY_MACRO5: by decoding the word and bit
+by hand for the lists, and with has_key for the bitsets. The last row is the union of every device's capabilities.
+
+Run with: python benchmarks/bench_bitmaps.py [devices]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from itertools import repeat
+from typing import Any
+from typing import Callable
+from typing import List
+
+from pydantic import BaseModel
+from pydantic import field_validator
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from bench_devices import corpus
+
+from panasonic_programmable_keys.input.models import InputDeviceBitmaps
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.models import parse_devices
+
+KEY = KeyPressDescriptor.KEY_MACRO5.value
+
+
+class LegacyBitmaps(BaseModel):
+    """InputDeviceBitmaps as it was, with the key bitmap as a list of longs, most significant first."""
+
+    prop: str | int
+    ev: str | int
+    msc: int | None = None
+    key: str | List[int] = []
+    led: int | str | None = None
+
+    @field_validator("prop", "ev", "led")
+    @classmethod
+    def hex(cls, value: str | int | None) -> int | None:
+        return int(value, 16) if isinstance(value, str) else value
+
+    @field_validator("key")
+    @classmethod
+    def hex_list(cls, value: str | List[int]) -> List[int]:
+        return [int(v, 16) for v in value.split()] if isinstance(value, str) else value
+
+
+def legacy_has_key(bitmaps: Any, key: int) -> bool:
+    words = bitmaps.key
+    word = len(words) - 1 - key // 64
+    return 0 <= word < len(words) and bool(words[word] >> (key % 64) & 1)
+
+
+def measure(
+    name: str, load: Callable[[dict], Any], has_key: Callable[[Any, int], bool], bitmaps: List[dict]
+) -> List[Any]:
+    tracemalloc.start()
+    models = [load(fields) for fields in bitmaps]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    found = sum(map(has_key, models, repeat(KEY)))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>8}: {held / len(models):>7,.0f} bytes/device, "
+        f"{elapsed / len(models) * 1e9:>6,.0f} ns/has_key, {found} with KEY_MACRO5"
+    )
+    return models
+
+
+def main(devices: int = 5_000) -> None:
+    bitmaps = [dict(record.bitmaps) for record in parse_devices(corpus(devices).splitlines())]
+    print(f"{len(bitmaps):,} devices")
+    measure("lists", lambda fields: LegacyBitmaps(**fields), legacy_has_key, bitmaps)
+    models = measure("bitsets", InputDeviceBitmaps.validate, InputDeviceBitmaps.has_key, bitmaps)
+    start = time.perf_counter()
+    InputDeviceBitmaps.union(models)
+    print(f"{'union':>8}: {(time.perf_counter() - start) * 1e3:>7,.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
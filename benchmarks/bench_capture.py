@@ -0,0 +1,109 @@
+"""Compare the batched evdev reader against the original one-read-per-record loop.
+
+Run with: python benchmarks/bench_capture.py [presses]
+"""
+
+import io
+import os
+import struct
+import sys
+import time
+import tracemalloc
+from typing import Callable
+from typing import Iterator
+from typing import Tuple
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from panasonic_programmable_keys.input.capture import INPUT_EVENT
+from panasonic_programmable_keys.input.capture import read_events
+
+
+class CountingFile(io.RawIOBase):
+    """An in-memory raw file that counts read calls."""
+
+    def __init__(self, data: bytes) -> None:
+        self.inner = io.BytesIO(data)
+        self.calls = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        self.calls += 1
+        return self.inner.read(size)
+
+    def readinto(self, buffer) -> int:
+        self.calls += 1
+        return self.inner.readinto(buffer)
+
+
+def legacy_read_events(f) -> Iterator[tuple]:
+    """The original reader: one 24-byte read and one fresh bytes object per record."""
+    while True:
+        data = f.read(24)
+        if not data:
+            return
+        yield struct.unpack("4IHHI", data)
+
+
+def synthetic_presses(presses: int) -> bytes:
+    records = []
+    for i in range(presses):
+        code = 0x290 + i % 12
+        for value in (1, 0):
+            records.append(INPUT_EVENT.pack(i, 0, 0x04, 4, code))
+            records.append(INPUT_EVENT.pack(i, 0, 0x01, code, value))
+            records.append(INPUT_EVENT.pack(i, 0, 0x00, 0, 0))
+    return b"".join(records)
+
+
+def allocations(reader: Callable[[CountingFile], Iterator[tuple]], data: bytes) -> Tuple[int, int]:
+    """Bytes allocated and freed again between consecutive records, summed over the file, and the peak in use.
+
+    tracemalloc only sees live blocks, so the high-water mark above what's live when each record arrives is taken as
+    what was allocated in between, like the bytes object each legacy read returns. A block freed before the next is
+    allocated doesn't raise the mark, so this is a lower bound.
+    """
+    tracemalloc.start()
+    transient = 0
+    for record in reader(CountingFile(data)):
+        current, peak = tracemalloc.get_traced_memory()
+        transient += peak - current
+        # Let the record go before the next one is read, so it isn't counted as part of that
+        del record
+        tracemalloc.reset_peak()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return transient, peak
+
+
+def measure(name: str, reader: Callable[[CountingFile], Iterator[tuple]], data: bytes) -> None:
+    # Untimed warmup, so neither reader is charged for first-call costs
+    for _ in reader(CountingFile(data)):
+        pass
+
+    f = CountingFile(data)
+    start = time.perf_counter()
+    events = sum(1 for _ in reader(f))
+    elapsed = time.perf_counter() - start
+
+    # Measured on a separate pass, so tracing doesn't slow down the timed one
+    transient, peak = allocations(reader, data)
+
+    print(
+        f"{name:>8}: {events / elapsed:>12,.0f} events/s, "
+        f"{f.calls / events:.3f} reads/event, {transient / events:.1f} transient bytes/event, "
+        f"{peak / 1024:.1f} KiB peak"
+    )
+
+
+def main(presses: int = 100_000) -> None:
+    data = synthetic_presses(presses)
+    print(f"{len(data) // INPUT_EVENT.size:,} records of {INPUT_EVENT.size} bytes")
+    measure("legacy", legacy_read_events, data)
+    measure("batched", read_events, data)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
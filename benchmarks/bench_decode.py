@@ -0,0 +1,56 @@
+"""Compare the precomputed KeyEvent table against validating a KeyPressEvent per record.
+
+Run with: python benchmarks/bench_decode.py [presses]
+"""
+
+import os
+import sys
+import time
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from pydantic import ValidationError
+
+from panasonic_programmable_keys.input.capture import decode_events
+from panasonic_programmable_keys.input.models import KeyPressEvent
+
+
+def legacy_decode_events(records: Iterable[tuple]) -> Iterator[KeyPressEvent]:
+    """The original decoder: pydantic validation per record, using ValidationError as the filter."""
+    for _, _, _, descriptor, event in records:
+        try:
+            yield KeyPressEvent(descriptor=descriptor, type=event)
+        except ValidationError:
+            continue
+
+
+def synthetic_records(presses: int) -> list:
+    records = []
+    for i in range(presses):
+        code = 0x290 + i % 12
+        for value in (1, 0):
+            records.append((i, 0, 0x04, 4, code))
+            records.append((i, 0, 0x01, code, value))
+            records.append((i, 0, 0x00, 0, 0))
+    return records
+
+
+def measure(name: str, decoder: Callable[[Iterable[tuple]], Iterator], records: list) -> None:
+    start = time.perf_counter()
+    events = sum(1 for _ in decoder(records))
+    elapsed = time.perf_counter() - start
+    print(f"{name:>8}: {elapsed / len(records) * 1e9:>9,.0f} ns/record, {events:,} key events")
+
+
+def main(presses: int = 20_000) -> None:
+    records = synthetic_records(presses)
+    print(f"{len(records):,} records")
+    measure("legacy", legacy_decode_events, records)
+    measure("table", decode_events, records)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
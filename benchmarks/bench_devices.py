@@ -0,0 +1,115 @@
+"""Compare parsing /proc/bus/input/devices with the original line-by-line loader against the single-pass parser.
+
+The corpus is the example files from tests/examples repeated until it lists the requested number of devices, with
+each copy of the Panasonic keyboard renamed so only one of them is found by phys. Rows are the original loader, the
+new loader validating every device, the records alone, the records with only the keyboard validated, and finding the
+keyboard again through the cached device table once it's warm.
+
+Run with: python benchmarks/bench_devices.py [devices]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from itertools import cycle
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from panasonic_programmable_keys.input import device_table
+from panasonic_programmable_keys.input import is_panasonic_keyboard
+from panasonic_programmable_keys.input.models import InputDevice
+from panasonic_programmable_keys.input.models import InputDevices
+from panasonic_programmable_keys.util import logger
+from panasonic_programmable_keys.util import settings
+
+examples_dir = Path(__file__).parent.parent.joinpath("tests", "examples")
+examples = ["fz40-devices", "non-panasonic-devices-1", "non-panasonic-devices-2"]
+
+
+def legacy_load(source: Path) -> List[InputDevice]:
+    """The original loader: readlines, map and lambda splitting, and a debug message per line, validating everything."""
+    devices = []
+
+    def process(chunk: List[str]) -> InputDevice:
+        logger.debug(f"Processing chunk: {chunk}")
+        build: Dict[str, Any] = {}
+        for start, line in map(lambda x: x.split(": ", 1), chunk):
+            logger.debug(f"Processing line: {start}: {line}")
+            match start:
+                case "I":
+                    build["id"] = {k.lower(): v for k, v in map(lambda x: x.split("="), line.split())}
+                case "N":
+                    build["name"] = line.split("=", 1)[-1].strip('"')
+                case "P":
+                    build["phys"] = line.split("=", 1)[-1]
+                case "S":
+                    build["sys"] = line.split("=", 1)[-1]
+                case "U":
+                    if uniq := line.split("=", 1)[-1]:
+                        build["uniq"] = uniq
+                case "H":
+                    build["handlers"] = [{"name": handler} for handler in line.split("=", 1)[-1].split()]
+                case "B":
+                    build["bitmaps"] = build.get("bitmaps", {})
+                    bitmap, value = line.split("=", 1)
+                    build["bitmaps"][bitmap.lower()] = value
+        logger.debug(f"Validating InputDevice: {build}")
+        return InputDevice(**build)
+
+    this_chunk: List[str] = []
+    with open(source) as f:
+        for line in map(lambda l: l.rstrip(), f.readlines()):
+            if this_chunk and not line:
+                devices.append(process(this_chunk))
+                this_chunk = []
+            else:
+                this_chunk.append(line)
+    if this_chunk:
+        devices.append(process(this_chunk))
+    return devices
+
+
+def corpus(devices: int) -> str:
+    """The example devices repeated up to devices entries, with only the first keyboard keeping its phys."""
+    entries = [entry.strip() for name in examples for entry in examples_dir.joinpath(name).read_text().split("\n\n")]
+    entries = [entry for entry in entries if entry]
+    chunks = []
+    keyboards = 0
+    for _, entry in zip(range(devices), cycle(entries)):
+        if "panasonic/hkey" in entry:
+            keyboards += 1
+            if keyboards > 1:
+                entry = entry.replace("panasonic/hkey", f"panasonic/copy{keyboards}")
+        chunks.append(entry + "\n\n")
+    return "".join(chunks)
+
+
+def measure(name: str, load: Callable[[Path], Any], source: Path, devices: int) -> None:
+    start = time.perf_counter()
+    load(source)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {elapsed * 1e3:>9,.1f} ms, {elapsed / devices * 1e6:>7,.1f} us/device")
+
+
+def main(devices: int = 5_000) -> None:
+    settings.input["check_paths"] = False
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp).joinpath("devices")
+        source.write_text(corpus(devices))
+        print(f"{devices:,} devices, {source.stat().st_size:,} bytes")
+        measure("legacy", legacy_load, source, devices)
+        measure("load", InputDevices.load, source, devices)
+        measure("records", lambda path: list(InputDevices.records(path)), source, devices)
+        measure("keyboard", lambda path: InputDevices.load(path, where=is_panasonic_keyboard), source, devices)
+        device_table(source).devices(where=is_panasonic_keyboard)
+        measure("cached", lambda path: device_table(path).devices(where=is_panasonic_keyboard), source, devices)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
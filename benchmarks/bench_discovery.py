@@ -0,0 +1,60 @@
+"""Compare finding the keyboard's event handlers by parsing /proc/bus/input/devices against querying the nodes.
+
+Each row is a cold lookup with the device table cache emptied first: parsing /proc and validating every device as
+discovery originally did, parsing /proc and validating only the keyboard, and the ioctl backend. This needs real
+input devices and permission to open them, so run it as root (or as a member of the input group) on the laptop.
+
+Run with: python benchmarks/bench_discovery.py [lookups]
+"""
+
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+from typing import List
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from panasonic_programmable_keys.input import devices
+from panasonic_programmable_keys.input import panasonic_keyboard_device_paths
+from panasonic_programmable_keys.input.models import InputDevices
+from panasonic_programmable_keys.util import settings
+
+
+def legacy() -> List[Path]:
+    return panasonic_keyboard_device_paths(devices=InputDevices.load())
+
+
+def lookup(discovery: str) -> Callable[[], List[Path]]:
+    def run() -> List[Path]:
+        settings.input["discovery"] = discovery
+        devices.invalidate()
+        return panasonic_keyboard_device_paths()
+
+    return run
+
+
+def measure(name: str, find: Callable[[], List[Path]], lookups: int) -> List[Path]:
+    samples = []
+    for _ in range(lookups):
+        start = time.perf_counter()
+        found = find()
+        samples.append(time.perf_counter() - start)
+    print(f"{name:>8}: {statistics.median(samples) * 1e6:>9,.0f} us median, {min(samples) * 1e6:>9,.0f} us min")
+    return found
+
+
+def main(lookups: int = 200) -> None:
+    nodes = sorted(devices.NODES_PATH.glob("event*"))
+    if not nodes or not all(os.access(node, os.R_OK) for node in nodes):
+        sys.exit(f"Needs readable event handler nodes in {devices.NODES_PATH}")
+    print(f"{len(nodes)} event handler nodes")
+    expected = measure("legacy", legacy, lookups)
+    assert measure("proc", lookup("proc"), lookups) == expected
+    assert measure("ioctl", lookup("ioctl"), lookups) == expected
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""Compare the latency of writing to a file with an in-process action against doing it with a command.
+
+Each row is press-to-finished: through shell() as key handling originally did, through the executor as a command, and
+through the executor as the builtin write action.
+
+Run with: python benchmarks/bench_plugins.py [presses]
+"""
+
+import os
+import shlex
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from panasonic_programmable_keys.actions import ActionExecutor
+from panasonic_programmable_keys.input.dispatch import Action
+from panasonic_programmable_keys.input.dispatch import ActionPolicy
+from panasonic_programmable_keys.input.dispatch import DispatchTable
+from panasonic_programmable_keys.input.dispatch import OutputMode
+from panasonic_programmable_keys.util.shell import shell
+
+
+def legacy(command: str, presses: int) -> List[float]:
+    samples = []
+    for _ in range(presses):
+        start = time.perf_counter()
+        list(shell(shlex.split(command), fail=False, env=os.environ.copy()))
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def executed(action: Action, presses: int) -> List[float]:
+    samples = []
+    with ActionExecutor() as executor:
+        for _ in range(presses):
+            start = time.perf_counter()
+            executor.submit(action)
+            executor.wait()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(name: str, samples: List[float]) -> None:
+    median = statistics.median(samples) * 1e6
+    print(f"{name:>8}: {median:>8,.0f} us median, {max(samples) * 1e6:>8,.0f} us max")
+
+
+def main(presses: int = 500) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp).joinpath("out")
+        command = f"{shutil.which('sh')} -c 'echo pressed > {target}'"
+        keyboard = {
+            "enabled_keys": ["KEY_MACRO1", "KEY_MACRO2"],
+            "KEY_MACRO1": command,
+            "KEY_MACRO2": {"action": "write", "path": str(target), "data": "pressed"},
+        }
+        table = DispatchTable.compile(keyboard, {})
+        quiet = ActionPolicy(output=OutputMode.discard)
+        report("shell", legacy(command, presses))
+        report("command", executed(table.actions[0x290]._replace(policy=quiet), presses))
+        report("plugin", executed(table.actions[0x291]._replace(policy=quiet), presses))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
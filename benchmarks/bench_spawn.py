@@ -0,0 +1,96 @@
+"""Compare press-to-exec latency of the executor's posix_spawn launch path against the original shell() path.
+
+The command prints the time it started running, so exec latency is measured from inside the child. "blocked" is how
+long the thread reading key presses is held up by each press.
+
+Run with: python benchmarks/bench_spawn.py [presses]
+"""
+
+import logging
+import os
+import shlex
+import shutil
+import statistics
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import List
+from typing import Tuple
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from panasonic_programmable_keys.actions import ActionExecutor
+from panasonic_programmable_keys.input.dispatch import Action
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.util import logger
+from panasonic_programmable_keys.util.shell import shell
+
+command = f"{shutil.which('date')} +%s.%N"
+
+
+def legacy(presses: int) -> Tuple[List[float], List[float]]:
+    """Every press splits the command, copies the environment and runs it on the thread reading key presses."""
+    blocked, execed = [], []
+    for _ in range(presses):
+        pressed = time.time()
+        start = time.perf_counter()
+        output = list(shell(shlex.split(command), fail=False, env=os.environ.copy()))
+        blocked.append(time.perf_counter() - start)
+        execed.append(float(output[0]) - pressed)
+    return blocked, execed
+
+
+class OutputTimes(logging.Handler):
+    """Collects the times the executor logs from the command's output."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.times: List[float] = []
+        self.received = threading.Semaphore(0)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        key, _, output = record.getMessage().partition(": ")
+        if key == KeyPressDescriptor.KEY_MACRO1.name:
+            self.times.append(float(output))
+            self.received.release()
+
+
+def spawned(presses: int) -> Tuple[List[float], List[float]]:
+    """Presses are submitted to the executor, with the command split and environment copied when it's compiled."""
+    blocked, execed = [], []
+    argv = tuple(shlex.split(command))
+    action = Action(KeyPressDescriptor.KEY_MACRO1, command, argv, MappingProxyType(os.environ.copy()))
+    handler = OutputTimes()
+    logger.addHandler(handler)
+    try:
+        with ActionExecutor() as executor:
+            for _ in range(presses):
+                pressed = time.time()
+                start = time.perf_counter()
+                executor.submit(action)
+                blocked.append(time.perf_counter() - start)
+                handler.received.acquire()
+                execed.append(handler.times[-1] - pressed)
+                executor.wait()
+    finally:
+        logger.removeHandler(handler)
+    return blocked, execed
+
+
+def report(name: str, samples: List[float]) -> str:
+    return f"{name} {statistics.median(samples) * 1e6:>8,.0f} us median, {max(samples) * 1e6:>8,.0f} us max"
+
+
+def main(presses: int = 500) -> None:
+    # Only the output lines are needed, and at INFO
+    logger.setLevel(logging.INFO)
+    for handler in logger.handlers:
+        handler.setLevel(logging.WARNING)
+    for name, run in (("shell", legacy), ("executor", spawned)):
+        blocked, execed = run(presses)
+        print(f"{name:>8}: {report('press-to-exec', execed)}; {report('blocked', blocked)}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""Compare pushing batched events over the stream socket against iterating the remote Pyro generator.
+
+Run with: python benchmarks/bench_stream.py [events] [round_trips]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+from typing import Iterator
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+from panasonic_programmable_keys.input import CapturedEvent
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.rpc.broadcast import EventBroadcaster
+from panasonic_programmable_keys.rpc.client import KeyClient
+from panasonic_programmable_keys.rpc.server import get_server
+from panasonic_programmable_keys.util import settings
+
+devices = Path(__file__).parent.parent.joinpath("tests", "examples", "fz40-devices")
+source = Path("/dev/input/event99")
+
+
+def event(n: int) -> CapturedEvent:
+    return CapturedEvent(time.time(), source, KEY_EVENTS[0x290 + n % 12][n % 2])
+
+
+def wait_for_subscriber(broadcaster: EventBroadcaster) -> None:
+    while not broadcaster.subscribers:
+        time.sleep(0.001)
+
+
+def throughput(broadcaster: EventBroadcaster, keys: Callable[[], Iterator], count: int) -> float:
+    received = 0
+    done = threading.Event()
+
+    def consume():
+        nonlocal received
+        for _ in keys():
+            received += 1
+            if received == count:
+                done.set()
+                return
+
+    threading.Thread(target=consume, daemon=True).start()
+    wait_for_subscriber(broadcaster)
+    start = time.perf_counter()
+    for n in range(0, count, 64):
+        broadcaster.publish([event(i) for i in range(n, min(count, n + 64))])
+    done.wait()
+    return count / (time.perf_counter() - start)
+
+
+def latency(broadcaster: EventBroadcaster, keys: Callable[[], Iterator], count: int) -> float:
+    received = threading.Semaphore(0)
+
+    def consume():
+        for n, _ in enumerate(keys(), 1):
+            received.release()
+            if n == count:
+                return
+
+    threading.Thread(target=consume, daemon=True).start()
+    wait_for_subscriber(broadcaster)
+    start = time.perf_counter()
+    for n in range(count):
+        broadcaster.publish([event(n)])
+        received.acquire()
+    return (time.perf_counter() - start) / count
+
+
+def main(events: int = 20_000, round_trips: int = 2_000) -> None:
+    settings.input["check_paths"] = False
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.rpc["socket"] = str(Path(tmp).joinpath("keys.sock"))
+        daemon = get_server(device_path=devices)
+        threading.Thread(target=daemon.requestLoop, daemon=True).start()
+        service = daemon.objectsById["keyservice"]
+
+        for name, keys in (("pyro", lambda: KeyClient().yield_keys()), ("stream", lambda: KeyClient().stream_keys())):
+            # A broadcaster that's never started is only fed by publish
+            service._broadcaster = EventBroadcaster([], capacity=events)
+            rate = throughput(service._broadcaster, keys, events)
+            service._broadcaster = EventBroadcaster([], capacity=events)
+            delay = latency(service._broadcaster, keys, round_trips)
+            print(f"{name:>8}: {rate:>10,.0f} events/s in bursts, {delay * 1e6:>8,.1f} us publish-to-receive")
+
+        daemon.shutdown()
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""Compare encoding and decoding events in the binary wire format against serpent-serialized dicts.
+
+Run with: python benchmarks/bench_wire.py [events]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+os.environ["PANASONIC_KEYS_SKIP_LOAD_FILES"] = "true"
+
+import serpent
+
+from panasonic_programmable_keys.input import CapturedEvent
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.input.models import KeyPressEvent
+from panasonic_programmable_keys.rpc import wire
+
+
+def serpent_encode(events: list) -> list:
+    """What the Pyro iterator path does: one serialized dict per event."""
+    return [serpent.dumps(e.event._asdict()) for e in events]
+
+
+def serpent_decode(payloads: list) -> list:
+    return [KeyPressEvent(**serpent.loads(payload)) for payload in payloads]
+
+
+def wire_encode(events: list) -> bytes:
+    return wire.encode_batches(events)
+
+
+def wire_decode(data: bytes) -> list:
+    return list(wire.decode_frames(memoryview(data)[wire.BATCH_HEADER.size :]))
+
+
+def timed(function: Callable, argument):
+    start = time.perf_counter()
+    result = function(argument)
+    return result, time.perf_counter() - start
+
+
+def main(count: int = 50_000) -> None:
+    source = Path("/dev/input/event7")
+    events = [CapturedEvent(time.time(), source, KEY_EVENTS[0x290 + n % 12][n % 2]) for n in range(count)]
+    for name, encode, decode in (("serpent", serpent_encode, serpent_decode), ("wire", wire_encode, wire_decode)):
+        encoded, encode_time = timed(encode, events)
+        decoded, decode_time = timed(decode, encoded)
+        assert len(decoded) == count
+        size = len(encoded) if isinstance(encoded, bytes) else sum(map(len, encoded))
+        print(
+            f"{name:>8}: {encode_time / count * 1e9:>7,.0f} ns/event encode, "
+            f"{decode_time / count * 1e9:>7,.0f} ns/event decode, {size / count:>5.1f} bytes/event"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
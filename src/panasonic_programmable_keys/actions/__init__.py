@@ -0,0 +1,5 @@
+from .executor import ActionExecutor
+from .executor import ActionResult
+from .output import ActionOutput
+
+__all__ = ["ActionExecutor", "ActionOutput", "ActionResult"]
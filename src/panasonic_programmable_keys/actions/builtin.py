@@ -0,0 +1,52 @@
+"""The action types shipped with the package, registered as entry points in pyproject.toml.
+
+These run on the executor's plugin threads, so they do their checking up front and only make a system call or two
+when pressed.
+"""
+
+import os
+import signal as signals
+from pathlib import Path
+
+from ..input.plugins import ActionFunction
+
+
+def write(path: str, data: str = "", newline: bool = True, append: bool = False) -> ActionFunction:
+    """Write data to a file, FIFO or sysfs attribute, without blocking if a FIFO has no reader."""
+    payload = (data + "\n" if newline else data).encode()
+    flags = os.O_WRONLY | os.O_CREAT | os.O_NONBLOCK | os.O_CLOEXEC | (os.O_APPEND if append else os.O_TRUNC)
+
+    def run() -> None:
+        fd = os.open(path, flags, 0o644)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+
+    return run
+
+
+def signal(signal: str = "SIGUSR1", pid: int | None = None, pid_file: str | None = None) -> ActionFunction:
+    """Send a signal to a process, given directly or read from pid_file on each press."""
+    signum = signals.Signals[signal.upper()] if isinstance(signal, str) else signals.Signals(signal)
+    if (pid is None) == (pid_file is None):
+        raise TypeError("exactly one of pid and pid_file is required")
+
+    def run() -> None:
+        target = pid if pid is not None else int(Path(pid_file).read_text().strip())  # type: ignore
+        os.kill(target, signum)
+
+    return run
+
+
+def toggle(path: str, on: str = "1", off: str = "0") -> ActionFunction:
+    """Flip a sysfs attribute (or any small file) between two values, returning the one written."""
+
+    def run() -> str:
+        with open(path) as f:
+            value = off if f.read().strip() == on else on
+        with open(path, "w") as f:
+            f.write(value)
+        return value
+
+    return run
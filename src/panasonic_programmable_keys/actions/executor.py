@@ -0,0 +1,288 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import NamedTuple
+from typing import Set
+from typing import Tuple
+
+from ..input.dispatch import Action
+from ..input.dispatch import Overlap
+from ..input.models import KeyPressDescriptor
+from ..util import logger
+from ..util import settings
+from .output import ActionOutput
+from .output import OutputCapture
+from .spawn import reaped
+from .spawn import spawn
+from .supervisor import ChildSupervisor
+
+
+class ActionResult(NamedTuple):
+    key: KeyPressDescriptor
+    # The key or gesture name of the action
+    name: str
+    command: str
+    # None for in-process actions, or if the command couldn't be started
+    pid: int | None
+    # Negative for the signal that killed it, or None if it couldn't be started or didn't finish in time
+    returncode: int | None
+    # Seconds since the epoch the command was started at
+    started: float
+    # Seconds the command ran for
+    duration: float
+
+
+class ActionExecutor:
+    """Runs actions on an event loop in a background thread, so submitting one never waits on a child process.
+
+    Children are waited for and their output read by the loop itself, so it's the one thread however many are running,
+    plus a fixed few for in-process actions.
+    The output of the latest run of each action is kept, bounded by its policy, and can be had from last_output or in
+    stats. With the tail policy it's also logged at debug level once it's all been read.
+
+    At most max_concurrent actions run at once; the rest wait in order of submission. Each action's policy limits how
+    many runs of it there can be at once, and decides whether a press beyond that is queued, dropped or restarts it.
+    Queued presses of an action are limited too, so holding a key bound to a slow command can't queue without bound.
+    """
+
+    def __init__(self, max_concurrent: int | None = None, history: int = 64) -> None:
+        if max_concurrent is None:
+            max_concurrent = int(settings.actions.get("max_concurrent", 8))
+        self.max_concurrent = max(1, max_concurrent)
+        self.loop = asyncio.new_event_loop()
+        self.thread: threading.Thread | None = None
+        # Everything below is only touched from the loop's thread
+        self.waiting: Deque[Action] = deque()
+        # Runs by key or gesture name that still count towards its policy's limit
+        self.running: Dict[str, Set[asyncio.Task]] = {}
+        # Every run that hasn't finished, including ones being killed
+        self.active: Set[asyncio.Task] = set()
+        self.history: Deque[ActionResult] = deque(maxlen=history)
+        # Runs, failures and seconds spent running by key or gesture name
+        self.totals: Dict[str, Dict[str, Any]] = {}
+        # Output of the latest run by key or gesture name
+        self.outputs: Dict[str, ActionOutput] = {}
+        self.captures: Set[OutputCapture] = set()
+        self.supervisor = ChildSupervisor(self.loop)
+        # In-process actions run on a small pool of their own, started on first use
+        self.plugins: ThreadPoolExecutor | None = None
+        self.plugin_threads = max(1, int(settings.actions.get("plugin_threads", 2)))
+        self.plugin_timeout = float(settings.actions.get("plugin_timeout", 5))
+        self.dropped = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def submit(self, action: Action) -> None:
+        """Hand action to the executor, returning immediately."""
+        self.loop.call_soon_threadsafe(self._submit, action)
+
+    def _submit(self, action: Action) -> None:
+        key = action.name
+        policy = action.policy
+        if len(self.running.get(key, ())) >= policy.max_running:
+            match policy.overlap:
+                case Overlap.drop:
+                    logger.info(f"Dropping {action.name} as {action.command} is already running")
+                    self.dropped += 1
+                    return
+                case Overlap.restart:
+                    logger.info(f"Restarting {action.command} for {action.name}")
+                    for task in self.running.pop(key):
+                        task.cancel()
+                    self.waiting = deque(waiting for waiting in self.waiting if waiting.name != key)
+        running = len(self.running.get(key, ()))
+        if running >= policy.max_running or len(self.active) >= self.max_concurrent:
+            # It would have to wait, whether for its own runs or everyone else's
+            if sum(waiting.name == key for waiting in self.waiting) >= policy.max_queued:
+                logger.warning(f"Dropping {action.name} as {policy.max_queued} presses of it are already queued")
+                self.dropped += 1
+                return
+        self.waiting.append(action)
+        self._idle.clear()
+        self._pump()
+
+    def _pump(self) -> None:
+        """Start every waiting action there's room for, oldest first."""
+        still_waiting: Deque[Action] = deque()
+        for action in self.waiting:
+            running = self.running.setdefault(action.name, set())
+            if len(self.active) < self.max_concurrent and len(running) < action.policy.max_running:
+                task = self.loop.create_task(self._run(action))
+                task.add_done_callback(self._finished)
+                running.add(task)
+                self.active.add(task)
+            else:
+                still_waiting.append(action)
+        self.waiting = still_waiting
+        if not self.waiting and not self.active:
+            self._idle.set()
+
+    async def _run(self, action: Action) -> None:
+        started = time.time()
+        pid = returncode = None
+        try:
+            logger.info(f"Executing: {action.command}")
+            if action.function is not None:
+                returncode = await self._call(action)
+            else:
+                pid, returncode = await self._spawn(action)
+        finally:
+            result = ActionResult(
+                action.key, action.name, action.command, pid, returncode, started, time.time() - started
+            )
+            logger.debug(f"Finished {result}")
+            if returncode:
+                logger.warning(f"Command returned {returncode}: {action.command}")
+            self._record(result)
+
+    async def _spawn(self, action: Action) -> Tuple[int | None, int | None]:
+        try:
+            # The action gets its own session and process group, so we can stop anything it starts too
+            pid, output = spawn(action.argv, action.env)
+        except OSError as e:
+            logger.error(f"Unable to run {action.command}: {e}")
+            return None, None
+        exited = self.supervisor.watch(pid)
+        exited.add_done_callback(lambda _: reaped(pid, exited.result()))
+        returncode: int | None = None
+        try:
+            await self._capture_output(action, output)
+            returncode = await asyncio.wait_for(asyncio.shield(exited), action.policy.timeout)
+        except TimeoutError:
+            logger.warning(f"{action.command} ran longer than {action.policy.timeout}s, terminating it")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # However we stopped waiting, even while still setting up the output, don't leave it running or unreaped
+            if not exited.done():
+                returncode = await self._terminate(action, pid, exited)
+        return pid, returncode
+
+    async def _call(self, action: Action) -> int | None:
+        """Run an in-process action on a plugin thread: 0 if it returned, 1 if it raised, None if it didn't finish.
+
+        Threads can't be stopped, so a call that times out or is restarted is left to finish in the background with
+        its result ignored. It holds one of the plugin_threads until it does, and never more than that, so a plugin
+        that hangs can only hold up other plugins, never commands or key handling.
+        """
+        assert action.function is not None
+        if self.plugins is None:
+            self.plugins = ThreadPoolExecutor(max_workers=self.plugin_threads, thread_name_prefix="action-plugin")
+        timeout = action.policy.timeout or self.plugin_timeout
+        try:
+            value = await asyncio.wait_for(self.loop.run_in_executor(self.plugins, action.function), timeout)
+        except TimeoutError:
+            logger.warning(f"{action.command} ran longer than {timeout}s, abandoning it")
+            return None
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            logger.error(f"{action.command} failed: {e!r}")
+            return 1
+        capture = OutputCapture(action.name, action.command, action.policy)
+        self.outputs[action.name] = capture.output
+        if isinstance(value, str):
+            capture.data_received(value.encode())
+        capture.connection_lost(None)
+        return 0
+
+    def _finished(self, task: asyncio.Task) -> None:
+        # A task cancelled before it started never runs its body, so this is done in a callback instead
+        for running in self.running.values():
+            running.discard(task)
+        self.active.discard(task)
+        self._pump()
+
+    async def _capture_output(self, action: Action, fd: int) -> None:
+        """Read the action's output in the background, until every process holding the pipe has closed it."""
+        capture = OutputCapture(action.name, action.command, action.policy)
+        self.outputs[action.name] = capture.output
+        await self.loop.connect_read_pipe(lambda: capture, open(fd, "rb", buffering=0))
+        self.captures.add(capture)
+        capture.closed.add_done_callback(lambda _: self.captures.discard(capture))
+
+    def last_output(self, name: str) -> ActionOutput | None:
+        """The output of the latest run of the action for a key or gesture name, which may still be being read."""
+        return self.outputs.get(name)
+
+    async def _terminate(self, action: Action, pid: int, exited: "asyncio.Future[int | None]") -> int | None:
+        """Ask the action's process group to stop, killing it if it's still running kill_after seconds later."""
+        self._signal(pid, signal.SIGTERM)
+        try:
+            return await asyncio.wait_for(asyncio.shield(exited), action.policy.kill_after)
+        except TimeoutError:
+            logger.warning(f"{action.command} didn't stop within {action.policy.kill_after}s, killing it")
+            self._signal(pid, signal.SIGKILL)
+            return await exited
+
+    @staticmethod
+    def _signal(pid: int, signum: int) -> None:
+        # The group can't be reused until its leader is reaped, and that only happens once this run has finished
+        try:
+            os.killpg(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _record(self, result: ActionResult) -> None:
+        self.history.append(result)
+        totals = self.totals.setdefault(result.name, {"runs": 0, "failed": 0, "run_time": 0.0})
+        totals["runs"] += 1
+        totals["failed"] += result.returncode != 0
+        totals["run_time"] += result.duration
+        totals["last_returncode"] = result.returncode
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self.active),
+            "waiting": len(self.waiting),
+            "dropped": self.dropped,
+            "supervisor": self.supervisor.mode,
+            "actions": self.totals,
+            # Copied in one go, as the loop's thread may be replacing them
+            "output": {name: output.summary() for name, output in list(self.outputs.items())},
+        }
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.loop.run_forever, name="action-executor", daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Block until every submitted action has finished."""
+        asyncio.run_coroutine_threadsafe(self._idle.wait(), self.loop).result(timeout)
+
+    def stop(self) -> None:
+        """Wait for every submitted action to finish, then stop the loop."""
+        if self.thread is None:
+            return
+        self.wait()
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        self.thread.join()
+        self.thread = None
+        self.supervisor.close()
+        if self.plugins is not None:
+            # Don't wait for abandoned calls, they'll finish or not without us
+            self.plugins.shutdown(wait=False, cancel_futures=True)
+            self.plugins = None
+        self.loop.close()
+
+    async def _shutdown(self) -> None:
+        # Stop reading output still held open by anything the actions left running
+        captures = list(self.captures)
+        for capture in captures:
+            capture.close()
+        await asyncio.gather(*(capture.closed for capture in captures))
+        self.loop.stop()
+
+    def __enter__(self) -> "ActionExecutor":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
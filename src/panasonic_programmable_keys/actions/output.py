@@ -0,0 +1,128 @@
+import asyncio
+from collections import deque
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import List
+
+from ..input.dispatch import ActionPolicy
+from ..input.dispatch import OutputMode
+from ..util import logger
+from ..util.ratelimit import TokenBucket
+
+
+class ActionOutput:
+    """What one run of an action wrote, bounded to its last lines however much that was."""
+
+    def __init__(self, name: str, command: str, lines: int) -> None:
+        self.name = name
+        self.command = command
+        self.lines: Deque[str] = deque(maxlen=lines)
+        self.total_lines = 0
+        self.total_bytes = 0
+        # Lines that were cut short for being longer than OutputCapture.max_line
+        self.truncated = 0
+        # Lines that weren't logged because of the rate limit
+        self.suppressed = 0
+        self.closed = False
+
+    def tail(self) -> List[str]:
+        return list(self.lines)
+
+    def __str__(self) -> str:
+        return "\n".join(self.lines)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "command": self.command,
+            "lines": self.tail(),
+            "total_lines": self.total_lines,
+            "total_bytes": self.total_bytes,
+            "truncated": self.truncated,
+            "suppressed": self.suppressed,
+            "closed": self.closed,
+        }
+
+
+class OutputCapture(asyncio.Protocol):
+    """Reads an action's output pipe as the event loop finds it readable, so the child never blocks writing to it.
+
+    Only complete lines are kept, up to max_line bytes each, so memory use is bounded by the policy's output_lines.
+    """
+
+    max_line = 4096
+
+    def __init__(self, name: str, command: str, policy: ActionPolicy) -> None:
+        self.mode = policy.output
+        self.output = ActionOutput(name, command, policy.output_lines if self.mode is not OutputMode.discard else 0)
+        self.bucket = TokenBucket(policy.output_rate)
+        self.partial = bytearray()
+        # Lines skipped since the last one that was logged
+        self.unreported = 0
+        # Set after truncating a line, until the rest of it has been skipped
+        self.skipping = False
+        self.transport: asyncio.ReadTransport | None = None
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore
+
+    def data_received(self, data: bytes) -> None:
+        self.output.total_bytes += len(data)
+        if self.mode is OutputMode.discard:
+            return
+        *lines, rest = data.split(b"\n")
+        for line in lines:
+            if self.skipping:
+                self.skipping = False
+                self.partial.clear()
+                continue
+            # A whole line can arrive in one read as easily as in pieces, and is held to the same limit
+            room = self.max_line - len(self.partial)
+            if len(line) > room:
+                line = line[:room]
+                self.output.truncated += 1
+            self.partial += line
+            self._line(bytes(self.partial))
+            self.partial.clear()
+        if not self.skipping:
+            self.partial += rest
+            if len(self.partial) > self.max_line:
+                self._line(bytes(self.partial[: self.max_line]))
+                self.output.truncated += 1
+                self.partial.clear()
+                self.skipping = True
+
+    def _line(self, line: bytes) -> None:
+        text = line.decode("utf-8", "replace").rstrip("\r")
+        output = self.output
+        output.lines.append(text)
+        output.total_lines += 1
+        if self.mode is OutputMode.log:
+            if self.bucket.take():
+                self._report_suppressed()
+                logger.info(f"{output.name}: {text}")
+            else:
+                output.suppressed += 1
+                self.unreported += 1
+
+    def _report_suppressed(self) -> None:
+        if self.unreported:
+            logger.info(f"{self.output.name}: skipped logging {self.unreported} lines of output")
+            self.unreported = 0
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if self.partial and not self.skipping:
+            self._line(bytes(self.partial))
+        self._report_suppressed()
+        output = self.output
+        if self.mode is OutputMode.tail and output.lines:
+            # The log mode already logged these as they came, but a tail would otherwise never leave the client
+            logger.debug(f"{output.name}: last {len(output.lines)} of {output.total_lines} lines of output:\n{output}")
+        output.closed = True
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
@@ -0,0 +1,65 @@
+import os
+import signal
+import subprocess
+from typing import Dict
+from typing import Mapping
+from typing import Tuple
+
+# Python ignores these, and ignored signals survive exec; Popen restores them for its children too
+_restored_signals = tuple(getattr(signal, name) for name in ("SIGPIPE", "SIGXFSZ") if hasattr(signal, name))
+
+# Children started through Popen, held until they're reaped so a collected Popen never tries to reap them itself
+_popened: Dict[int, subprocess.Popen] = {}
+
+
+def spawn(argv: Tuple[str, ...], env: Mapping[str, str]) -> Tuple[int, int]:
+    """Start argv in a new session with its output on a pipe, returning its pid and the pipe's read end.
+
+    Uses posix_spawn, which the C library implements with a vfork-style clone, skipping Popen's Python-side setup, its
+    error reporting pipe and its sweep closing every inherited descriptor. Both ends of the pipe are close-on-exec
+    instead, so the child only keeps the copies it's given as stdout and stderr.
+    """
+    if not hasattr(os, "posix_spawn"):
+        return _popen(argv, env)
+    read_fd, write_fd = os.pipe2(os.O_CLOEXEC)
+    try:
+        pid = (os.posix_spawn if "/" in argv[0] else os.posix_spawnp)(
+            argv[0],
+            argv,
+            env,
+            file_actions=[
+                (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+                (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                (os.POSIX_SPAWN_DUP2, write_fd, 2),
+            ],
+            setsid=True,
+            setsigdef=_restored_signals,
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+    return pid, read_fd
+
+
+def _popen(argv: Tuple[str, ...], env: Mapping[str, str]) -> Tuple[int, int]:
+    process = subprocess.Popen(
+        argv,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    assert process.stdout is not None
+    read_fd = os.dup(process.stdout.fileno())
+    process.stdout.close()
+    _popened[process.pid] = process
+    return process.pid, read_fd
+
+
+def reaped(pid: int, returncode: int | None) -> None:
+    """Record the exit code the supervisor reaped pid with, for a child that was started through Popen."""
+    if (process := _popened.pop(pid, None)) is not None:
+        process.returncode = returncode
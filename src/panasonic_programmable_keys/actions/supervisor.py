@@ -0,0 +1,108 @@
+import asyncio
+import os
+import signal
+import threading
+from typing import Any
+from typing import Dict
+
+from ..util import logger
+
+
+def pidfd_supported() -> bool:
+    """Whether this kernel and Python can open pidfds (Linux 5.3 and later)."""
+    if not hasattr(os, "pidfd_open"):
+        return False
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return False
+    return True
+
+
+class ChildSupervisor:
+    """Waits for child processes from an event loop, without a thread per child.
+
+    Each child gets a pidfd that becomes readable when it exits, so it's reaped as soon as the loop sees it. Where
+    pidfds aren't available a SIGCHLD handler wakes the loop instead, or if that can't be installed either because
+    we're not on the main thread, the children are polled.
+
+    Only the children passed to watch are ever reaped, so processes started elsewhere keep working as normal. Must only
+    be used from the loop's thread, apart from construction.
+    """
+
+    poll_interval = 0.1
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, use_pidfd: bool | None = None) -> None:
+        self.loop = loop
+        self.use_pidfd = pidfd_supported() if use_pidfd is None else use_pidfd
+        self.children: Dict[int, asyncio.Future[int | None]] = {}
+        self.pidfds: Dict[int, int] = {}
+        self._previous_handler: Any = None
+        self._polling: asyncio.TimerHandle | None = None
+        if self.use_pidfd:
+            self.mode = "pidfd"
+        elif threading.current_thread() is threading.main_thread():
+            self.mode = "sigchld"
+            self._previous_handler = signal.signal(signal.SIGCHLD, self._sigchld)
+        else:
+            self.mode = "poll"
+        logger.debug(f"Supervising children with {self.mode}")
+
+    def watch(self, pid: int) -> "asyncio.Future[int | None]":
+        """A future resolving to pid's exit code once it's been reaped, negative if it was killed by a signal.
+
+        The result is None if something else reaped it first.
+        """
+        future = self.loop.create_future()
+        self.children[pid] = future
+        if self.use_pidfd:
+            pidfd = os.pidfd_open(pid)
+            self.pidfds[pid] = pidfd
+            self.loop.add_reader(pidfd, self._reap, pid)
+        elif self.mode == "poll" and self._polling is None:
+            self._polling = self.loop.call_later(self.poll_interval, self._poll)
+        # Catch a child that exited before we started watching it
+        self._reap(pid)
+        return future
+
+    def _reap(self, pid: int) -> None:
+        returncode: int | None
+        try:
+            waited, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            logger.warning(f"Child {pid} was reaped by someone else, its exit status is unknown")
+            returncode = None
+        else:
+            if waited == 0:
+                return
+            returncode = os.waitstatus_to_exitcode(status)
+        if (pidfd := self.pidfds.pop(pid, None)) is not None:
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        future = self.children.pop(pid)
+        if not future.done():
+            future.set_result(returncode)
+
+    def _reap_all(self) -> None:
+        for pid in list(self.children):
+            self._reap(pid)
+
+    def _sigchld(self, signum: int, frame: Any) -> None:
+        # Runs on the main thread, between bytecodes; all it may do is wake the loop
+        self.loop.call_soon_threadsafe(self._reap_all)
+
+    def _poll(self) -> None:
+        self._reap_all()
+        self._polling = self.loop.call_later(self.poll_interval, self._poll) if self.children else None
+
+    def close(self) -> None:
+        for pidfd in self.pidfds.values():
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        self.pidfds.clear()
+        if self._polling is not None:
+            self._polling.cancel()
+            self._polling = None
+        if self.mode == "sigchld":
+            signal.signal(signal.SIGCHLD, self._previous_handler)
+            self.mode = "poll"
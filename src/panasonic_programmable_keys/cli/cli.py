@@ -1,11 +1,16 @@
+import operator
 import os
+from functools import reduce
 from pathlib import Path
+from typing import Callable
+from typing import List
+from typing import Tuple
 
 import typer
 from rich import print
 from typing_extensions import Annotated
 
-from ..input import InputDevices
+from ..input import device_table
 from ..util import SettingsHotReloader
 from ..util import make_logger
 from ..util import settings
@@ -41,12 +46,72 @@ class Input(Cli):
             settings.input["check_paths"] = check_paths
         make_logger(verbose)
         try:
-            print(InputDevices.load(devices_file).model_dump())
+            print(device_table(devices_file).devices().model_dump())
         except AssertionError as e:
             if str(e).startswith("Path") and str(e).endswith("doesn't exist"):
                 raise AssertionError(f"{e}: Did you mean to pass --no-check-paths on the CLI or change the settings?")
             raise e
 
+    def cmd_find(
+        self,
+        _: VersionOption,
+        verbose: VerboseOption,
+        devices_file: DevicesFileArgument,
+        check_paths: CheckPathsOption,
+        phys: Annotated[List[str], typer.Option(help="Physical path, ending in * to match a prefix")] = [],
+        name: Annotated[List[str], typer.Option(help="Device name, ending in * to match a prefix")] = [],
+        handler: Annotated[
+            List[str], typer.Option(help="Handler, such as event3, or kind of handler, such as event")
+        ] = [],
+        sysfs: Annotated[List[str], typer.Option(help="Path under /sys, as listed in the devices file")] = [],
+        bus: Annotated[List[str], typer.Option(help="Bus number in hexadecimal")] = [],
+        device_id: Annotated[
+            List[str], typer.Option("--id", help="BUS:VENDOR:PRODUCT in hexadecimal, such as 0019:0000:0001")
+        ] = [],
+        key: Annotated[List[str], typer.Option(help="Key the device can send, by name (KEY_MACRO1) or code")] = [],
+        ev: Annotated[List[str], typer.Option(help="Event type the device can send, by number")] = [],
+        paths: Annotated[bool, typer.Option(help="Print only the event handler device paths, one per line")] = False,
+    ) -> None:
+        """Find input devices matching every option given, any of the values of an option given more than once."""
+        if check_paths is not None:
+            settings.input["check_paths"] = check_paths
+        make_logger(verbose)
+        from ..input import query
+        from ..input.models import KeyPressDescriptor
+
+        def text(lookup: Callable[..., query.DeviceQuery]) -> Callable[[str], query.DeviceQuery]:
+            return lambda value: lookup(value[:-1], prefix=True) if value.endswith("*") else lookup(value)
+
+        def key_code(value: str) -> int:
+            return KeyPressDescriptor[value].value if value in KeyPressDescriptor.__members__ else int(value, 0)
+
+        options: List[Tuple[List[str], Callable[[str], query.DeviceQuery]]] = [
+            (phys, text(query.phys)),
+            (name, text(query.name)),
+            (handler, query.handler),
+            (sysfs, query.sysfs),
+            (bus, lambda value: query.bus(int(value, 16))),
+            (device_id, lambda value: query.device_id(*(int(part, 16) for part in value.split(":")))),
+            (key, lambda value: query.has_key(key_code(value))),
+            (ev, lambda value: query.has_ev(int(value, 0))),
+        ]
+        found_query: query.DeviceQuery | None = None
+        for values, lookup in options:
+            if values:
+                any_of = reduce(operator.or_, map(lookup, values))
+                found_query = any_of if found_query is None else found_query & any_of
+        table = device_table(devices_file)
+        found = table.find(found_query) if found_query is not None else table.devices().devices
+        if paths:
+            for device in found:
+                for path in device.libinput_devices:
+                    if path.name.startswith("event"):
+                        print(path)
+        else:
+            print([device.model_dump() for device in found])
+        if not found:
+            raise typer.Exit(1)
+
     def cmd_read(
         self,
         _: VersionOption,
@@ -82,6 +147,13 @@ class Debug(Cli):
         client = KeyClient()
         print(client.ping())
 
+    def cmd_stats(self, verbose: VerboseOption) -> None:
+        """Print what the running server has read and how much of it each client received, filtered or dropped."""
+        make_logger(verbose)
+        from ..rpc.client import KeyClient
+
+        print(KeyClient().stats())
+
     def cmd_args(self) -> None:
         """Print sysv args for help with finding the path."""
         make_logger(5)
@@ -92,7 +164,7 @@ class Debug(Cli):
 
 class Main(Cli):
     help = "Panasonic Programmable Keys Configuration Utility"
-    subcommands = [Config(), Debug()]
+    subcommands = [Config(), Input(), Debug()]
 
     def cmd_version(self) -> None:
         """Print the version and exit."""
@@ -112,7 +184,8 @@ class Main(Cli):
 
         from ..gui import gui
 
-        gui(devices_file)
+        with SettingsHotReloader():
+            gui(devices_file)
 
     def cmd_server(
         self,
@@ -138,7 +211,10 @@ class Main(Cli):
         _: VersionOption,
         verbose: VerboseOption,
     ) -> None:
-        """Run the user-mode client, reading events from the rootful server's unix socket."""
+        """Run the user-mode client, reading events from the rootful server's unix socket.
+
+        Send it SIGUSR1 to log how its actions have run and the latest output of each.
+        """
         make_logger(2)  # Default to INFO logging for running the client
         verbose = verbose + 2
         make_logger(verbose)
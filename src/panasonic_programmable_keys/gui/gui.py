@@ -3,6 +3,7 @@ import os
 import sys
 from pathlib import Path
 from textwrap import dedent
+from typing import Iterator
 
 from PyQt5.QtCore import QMessageLogContext
 from PyQt5.QtCore import Qt
@@ -36,9 +37,15 @@ from PyQt5.QtWidgets import QWidget
 
 from ..input import panasonic_keyboard_device
 from ..input import yield_from
-from ..input.models import InputDevices
+from ..input.devices import device_table
+from ..input.models import KeyEvent
+from ..input.models import KeyPressEvent
 from ..input.models import KeyPressEventType
+from ..input.models import key_filter
 from ..util import logger
+from ..util.config import SettingsDiff
+from ..util.config import on_reload
+from ..util.config import reload_settings
 from ..util.config import settings
 from ..util.config import user_config
 
@@ -84,12 +91,13 @@ class UpdateThread(QThread):
 
     def run(self) -> None:
         start_index = 1
+        key_event_generator: Iterator[KeyEvent | KeyPressEvent]
         try:
             key_event_generator = yield_from(self.proc_input_file)
         except PermissionError:
             from ..rpc.client import KeyClient
 
-            key_event_generator = KeyClient().yield_keys()
+            key_event_generator = KeyClient().keys(key_filter(types=[KeyPressEventType.press]))
         for event in key_event_generator:
             if event.type == KeyPressEventType.press:
                 self.received.emit(f"P{start_index}: {event.descriptor.name}")
@@ -97,12 +105,14 @@ class UpdateThread(QThread):
 
 
 class PanasonicKeyboardWindow(QDialog):
+    keyboard_reloaded = pyqtSignal()
+
     def __init__(self, parent=None, proc_input_file: Path | None = None) -> None:
         super(PanasonicKeyboardWindow, self).__init__(parent)
 
         QApplication.setStyle(QStyleFactory.create("Fusion"))
 
-        self.devices = InputDevices.load(proc_input_file)
+        self.devices = device_table(proc_input_file).devices()
         device_combo_box = QComboBox()
         device_combo_box.addItems(map(lambda d: d.name, self.devices.devices))
         self.panasonic_device = panasonic_keyboard_device(self.devices)
@@ -167,6 +177,10 @@ class PanasonicKeyboardWindow(QDialog):
 
         self.create_macro_functions_box()
 
+        # Reloads can run on the hot reloader's timer thread, so rebuild the widgets through a queued signal
+        self.keyboard_reloaded.connect(self.create_macro_functions_box, Qt.QueuedConnection)
+        on_reload(self.settings_reloaded)
+
         self.setAttribute(Qt.WA_AlwaysShowToolTips, True)
 
         self.setWindowTitle(self.tr("Panasonic Keyboard Selector"))
@@ -175,6 +189,7 @@ class PanasonicKeyboardWindow(QDialog):
         window_layout: QGridLayout = self.layout()  # type: ignore
         if getattr(self, "macro_functions_box", None) is not None:
             window_layout.removeWidget(self.macro_functions_box)
+            self.macro_functions_box.deleteLater()
         self.macro_functions_box: QGroupBox = QGroupBox(self.tr("Macro Functions"))
 
         layout = QFormLayout()
@@ -193,8 +208,7 @@ class PanasonicKeyboardWindow(QDialog):
         buttons = QHBoxLayout()
 
         reload = QPushButton(self.tr("&Reload"))
-        reload.clicked.connect(settings.reload)
-        reload.clicked.connect(self.create_macro_functions_box)
+        reload.clicked.connect(self.reload)
         buttons.addWidget(reload)
 
         divider = QLabel()
@@ -215,6 +229,16 @@ class PanasonicKeyboardWindow(QDialog):
         self.macro_functions_box.setLayout(layout)
         window_layout.addWidget(self.macro_functions_box, 1, 0)
 
+    def settings_reloaded(self, diff: SettingsDiff) -> None:
+        if diff.touches("keyboard"):
+            logger.debug("Keyboard settings changed, refreshing the macro functions")
+            self.keyboard_reloaded.emit()
+
+    def reload(self, _: bool) -> None:
+        if not reload_settings().touches("keyboard"):
+            # Nothing changed on disk, but still discard any unsaved edits
+            self.create_macro_functions_box()
+
     def popup_rescan_buttons(self) -> None:
         logger.debug("Rescanning buttons")
         popup = QDialog(parent=self)
@@ -361,7 +385,7 @@ class PanasonicKeyboardWindow(QDialog):
 
         if file in settings.includes_for_dynaconf:
             # Load our new settings, if we expect them to have changed
-            settings.reload()
+            reload_settings()
         else:
             logger.debug(f"User selected save location: {file}")
             logger.debug(f"Known autoload locations: {settings.includes_for_dynaconf}")
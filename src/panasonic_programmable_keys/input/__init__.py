@@ -1,6 +1,37 @@
+from .capture import CapturedEvent
+from .capture import EventMultiplexer
+from .capture import async_yield_from
+from .capture import decode_events
+from .capture import is_panasonic_keyboard
 from .capture import panasonic_keyboard_device
 from .capture import panasonic_keyboard_device_path
+from .capture import panasonic_keyboard_device_paths
+from .capture import panasonic_keyboard_devices
+from .capture import read_events
 from .capture import yield_from
+from .capture import yield_from_all
+from .devices import DeviceTable
+from .devices import device_table
 from .models import InputDevices
+from .models import KeyEvent
+from .query import DeviceQuery
 
-__all__ = ["InputDevices", "panasonic_keyboard_device", "panasonic_keyboard_device_path", "yield_from"]
+__all__ = [
+    "async_yield_from",
+    "CapturedEvent",
+    "decode_events",
+    "device_table",
+    "DeviceQuery",
+    "DeviceTable",
+    "EventMultiplexer",
+    "InputDevices",
+    "is_panasonic_keyboard",
+    "KeyEvent",
+    "panasonic_keyboard_device",
+    "panasonic_keyboard_device_path",
+    "panasonic_keyboard_device_paths",
+    "panasonic_keyboard_devices",
+    "read_events",
+    "yield_from",
+    "yield_from_all",
+]
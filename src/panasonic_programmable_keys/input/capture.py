@@ -1,38 +1,163 @@
+import asyncio
+import os
+import selectors
 import struct
+from collections import deque
+from io import BufferedIOBase
+from io import RawIOBase
+from operator import attrgetter
 from pathlib import Path
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
 from typing import Iterator
-
-from pydantic import ValidationError
+from typing import List
+from typing import NamedTuple
+from typing import Tuple
 
 from ..util import logger
 from ..util import settings
+from . import evdev
+from .devices import device_table
+from .ecodes import EV_KEY
+from .ecodes import EV_SYN
+from .ecodes import KEY_CNT
+from .models import KEY_EVENTS
+from .models import DeviceRecord
 from .models import InputDevice
 from .models import InputDevices
-from .models import KeyPressEvent
+from .models import KeyEvent
+from .query import PANASONIC_KEYBOARD
 
+# struct input_event { struct timeval time; __u16 type; __u16 code; __s32 value; }
+INPUT_EVENT = struct.Struct("@llHHi")
+INPUT_EVENT_SIZE = INPUT_EVENT.size
 
-def panasonic_keyboard_device(devices: InputDevices | None = None) -> InputDevice | None:
+InputEventRecord = Tuple[int, int, int, int, int]
+
+
+class CapturedEvent(NamedTuple):
+    """A decoded key event along with its kernel timestamp and the device node it was read from."""
+
+    time: float
+    source: Path
+    event: KeyEvent
+
+
+def is_panasonic_keyboard(device: InputDevice | DeviceRecord) -> bool:
+    return (device.phys or "").startswith("panasonic/hkey")
+
+
+def panasonic_keyboard_devices(devices: InputDevices | None = None) -> List[InputDevice]:
     if devices is None:
-        devices = InputDevices.load()
-    for device in devices.devices:
-        if device.phys == "panasonic/hkey0":
-            logger.info(f"Found Panasonic keyboard: {device.name}")
-            return device
-    logger.warning(f"Unable to identify Panasonic keyboard in {list(map(lambda d: d.name, devices.devices))}")
+        # Only validate the devices that are Panasonic keyboards
+        table = device_table()
+        found = table.find(PANASONIC_KEYBOARD)
+        names = table.names
+    else:
+        found = [device for device in devices.devices if is_panasonic_keyboard(device)]
+        names = [device.name for device in devices.devices]
+    if found:
+        logger.info(f"Found Panasonic keyboards: {[device.name for device in found]}")
+    else:
+        logger.warning(f"Unable to identify Panasonic keyboard in {names}")
+    return found
+
+
+def panasonic_keyboard_device(devices: InputDevices | None = None) -> InputDevice | None:
+    found = panasonic_keyboard_devices(devices)
+    if found:
+        return found[0]
     return None
 
 
+def _event_handler_paths(device: InputDevice) -> Iterator[Path]:
+    for handler in device.handlers:
+        if handler.name.startswith("event") and (path := handler.libinput_device) is not None:
+            logger.info(f"Found libinput event handler: {path}")
+            yield path
+
+
 def panasonic_keyboard_device_path(devices: InputDevices | None = None) -> Path | None:
     device = panasonic_keyboard_device(devices)
     if device is not None:
-        for handler in device.handlers:
-            if handler.name.startswith("event") and handler.libinput_device is not None:
-                logger.info(f"Found libinput event handler: {handler.libinput_device}")
-                return handler.libinput_device
+        for path in _event_handler_paths(device):
+            return path
     return None
 
 
-def yield_from(device_path: Path | None = None) -> Iterator[KeyPressEvent]:
+def panasonic_keyboard_device_paths(devices: InputDevices | None = None, all_devices: bool | None = None) -> List[Path]:
+    """Find every event handler of the Panasonic keyboard, or of every matching keyboard with all_devices."""
+    if all_devices is None:
+        all_devices = settings.input.get("all_devices", False)
+    found = panasonic_keyboard_devices(devices)
+    if not all_devices:
+        found = found[:1]
+    return [path for device in found for path in _event_handler_paths(device)]
+
+
+def read_events(f: RawIOBase | BufferedIOBase, batch: int | None = None) -> Iterator[InputEventRecord]:
+    """Read raw input_event records from f as (sec, usec, type, code, value) tuples.
+
+    Many records are read at once into a single preallocated buffer and decoded in place, so a burst of events costs
+    one read call rather than one per record. Partial records left over by a short read are carried into the next one.
+    """
+    if batch is None:
+        batch = settings.input.get("read_batch", 64)
+    buffer = bytearray(INPUT_EVENT_SIZE * max(1, batch))
+    view = memoryview(buffer)
+    pending = 0
+    while True:
+        read = f.readinto(view[pending:])
+        if not read:
+            return
+        pending += read
+        whole = pending - pending % INPUT_EVENT_SIZE
+        yield from INPUT_EVENT.iter_unpack(view[:whole])
+        pending -= whole
+        if pending:
+            view[:pending] = view[whole : whole + pending]
+
+
+def decode_events(records: Iterable[InputEventRecord]) -> Iterator[KeyEvent]:
+    """Decode raw records into interned KeyEvents, skipping anything that isn't a known macro key event."""
+    table = KEY_EVENTS
+    for _, _, ev_type, code, value in records:
+        if ev_type != EV_KEY:
+            continue
+        values = table.get(code)
+        if values is None:
+            continue
+        event = values.get(value)
+        if event is not None:
+            yield event
+
+
+def prepare_device(fd: int) -> None:
+    """Apply the kernel-side event mask and exclusive grab to an open device, as enabled in the input settings.
+
+    Either is skipped with a warning if the device or kernel doesn't support it, leaving decode_events to filter.
+    """
+    if settings.input.get("mask", True):
+        try:
+            # EV_SYN must stay unmasked, as the kernel only wakes readers up on SYN_REPORT
+            evdev.set_type_mask(fd, (EV_SYN, EV_KEY))
+            evdev.set_mask(fd, EV_KEY, KEY_EVENTS.keys(), KEY_CNT)
+            logger.debug(f"Masked events on fd {fd} to macro keys")
+        except OSError as e:
+            logger.warning(f"Unable to mask events on fd {fd}, filtering in userspace instead: {e}")
+    if settings.input.get("grab", False):
+        try:
+            evdev.grab(fd)
+            logger.info(f"Grabbed exclusive access to fd {fd}")
+        except OSError as e:
+            logger.warning(f"Unable to grab exclusive access to fd {fd}: {e}")
+
+
+def yield_from(device_path: Path | None = None) -> Iterator[KeyEvent]:
     # Force check paths to prevent reads on wrong device
     settings.input["check_paths"] = True
 
@@ -40,16 +165,172 @@ def yield_from(device_path: Path | None = None) -> Iterator[KeyPressEvent]:
         device_path = panasonic_keyboard_device_path()
     if device_path is not None:
         logger.debug(f"Reading bytes from: {device_path}")
-        with open(device_path, "rb") as f:
-            while True:
-                data = f.read(24)
-                if not data:
-                    logger.debug("Ending byte read")
-                    raise StopIteration()
-                _, _, _, _, _, descriptor, event = struct.unpack("4IHHI", data)
-                try:
-                    yield KeyPressEvent(descriptor=descriptor, type=event)
-                except ValidationError:
-                    continue
+        with open(device_path, "rb", buffering=0) as f:
+            prepare_device(f.fileno())
+            yield from decode_events(read_events(f))
+            logger.debug("Ending byte read")
     else:
         raise RuntimeError("Unable to find Panasonic keyboard device event handler")
+
+
+class EventMultiplexer:
+    """Reads key events from several device nodes at once, non-blocking, from a single thread.
+
+    Events read in the same wakeup are merged in kernel timestamp order and keep the path they were read from.
+    Devices that error or reach EOF are dropped, and iteration ends once none are left.
+    """
+
+    # Called with each fd just before it's closed, so that other pollers can forget it first
+    on_close: Callable[[int], Any] | None = None
+
+    def __init__(self, device_paths: Iterable[Path] = (), batch: int | None = None) -> None:
+        if batch is None:
+            batch = settings.input.get("read_batch", 64)
+        self.buffer = bytearray(INPUT_EVENT_SIZE * max(1, batch))
+        self.view = memoryview(self.buffer)
+        self.selector = selectors.DefaultSelector()
+        self.sources: Dict[int, Path] = {}
+        # Other fds to wait on alongside the devices, and what to call when they're readable
+        self.watches: Dict[int, Callable[[], Any]] = {}
+        for device_path in device_paths:
+            self.add(device_path)
+
+    def add(self, device_path: Path) -> None:
+        fd = os.open(device_path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        logger.debug(f"Reading bytes from: {device_path}")
+        prepare_device(fd)
+        self.selector.register(fd, selectors.EVENT_READ, device_path)
+        self.sources[fd] = device_path
+
+    def watch(self, fd: int, callback: Callable[[], Any]) -> None:
+        """Call callback from poll whenever fd is readable, such as to add and remove devices as they come and go."""
+        self.selector.register(fd, selectors.EVENT_READ)
+        self.watches[fd] = callback
+
+    def remove(self, device_path: Path) -> None:
+        for fd, source in list(self.sources.items()):
+            if source == device_path:
+                self._close(fd)
+
+    def _close(self, fd: int) -> None:
+        logger.debug(f"Ending byte read from: {self.sources[fd]}")
+        if self.on_close is not None:
+            self.on_close(fd)
+        self.selector.unregister(fd)
+        del self.sources[fd]
+        os.close(fd)
+
+    def close(self) -> None:
+        for fd in list(self.sources):
+            self._close(fd)
+        for fd in list(self.watches):
+            self.selector.unregister(fd)
+            del self.watches[fd]
+        self.selector.close()
+
+    def __enter__(self) -> "EventMultiplexer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def read(self, fd: int) -> List[CapturedEvent]:
+        """Read and decode everything currently queued on fd."""
+        source = self.sources[fd]
+        table = KEY_EVENTS
+        events: List[CapturedEvent] = []
+        while True:
+            try:
+                read = os.readv(fd, [self.view])
+            except BlockingIOError:
+                break
+            except OSError as e:
+                logger.warning(f"Unable to read from {source}, dropping it: {e}")
+                self._close(fd)
+                break
+            if not read:
+                self._close(fd)
+                break
+            # evdev only ever returns whole records
+            for sec, usec, ev_type, code, value in INPUT_EVENT.iter_unpack(self.view[: read - read % INPUT_EVENT_SIZE]):
+                if ev_type != EV_KEY:
+                    continue
+                values = table.get(code)
+                if values is None:
+                    continue
+                event = values.get(value)
+                if event is not None:
+                    events.append(CapturedEvent(sec + usec / 1_000_000, source, event))
+            if read < len(self.buffer):
+                break
+        return events
+
+    def poll(self, timeout: float | None = None) -> List[CapturedEvent]:
+        """Wait up to timeout seconds for any device to be readable, returning the events read."""
+        ready = self.selector.select(timeout)
+        events: List[CapturedEvent] = []
+        for key, _ in ready:
+            if key.fd in self.watches:
+                self.watches[key.fd]()
+            elif key.fd in self.sources:
+                events.extend(self.read(key.fd))
+        if len(ready) > 1:
+            events.sort(key=attrgetter("time"))
+        return events
+
+    def __iter__(self) -> Iterator[CapturedEvent]:
+        while self.sources:
+            yield from self.poll()
+
+
+def yield_from_all(device_paths: List[Path] | None = None) -> Iterator[CapturedEvent]:
+    """Read events from every Panasonic keyboard event handler at once."""
+    # Force check paths to prevent reads on wrong device
+    settings.input["check_paths"] = True
+
+    if device_paths is None:
+        device_paths = panasonic_keyboard_device_paths()
+    if not device_paths:
+        raise RuntimeError("Unable to find Panasonic keyboard device event handler")
+    with EventMultiplexer(device_paths) as multiplexer:
+        yield from multiplexer
+
+
+async def async_yield_from(
+    device_paths: List[Path] | None = None, timeout: float | None = None
+) -> AsyncIterator[CapturedEvent]:
+    """Asynchronously read events from every Panasonic keyboard event handler on the running event loop.
+
+    Device fds are watched with the loop's add_reader, and each wakeup decodes everything queued on the fd at once.
+    Raises TimeoutError if no event arrives within timeout seconds. Cancelling the consuming task, or closing the
+    generator, releases the devices.
+    """
+    # Force check paths to prevent reads on wrong device
+    settings.input["check_paths"] = True
+
+    if device_paths is None:
+        device_paths = panasonic_keyboard_device_paths()
+    if not device_paths:
+        raise RuntimeError("Unable to find Panasonic keyboard device event handler")
+
+    loop = asyncio.get_running_loop()
+    pending: Deque[CapturedEvent] = deque()
+    readable = asyncio.Event()
+
+    with EventMultiplexer(device_paths) as multiplexer:
+
+        def on_readable(fd: int) -> None:
+            pending.extend(multiplexer.read(fd))
+            readable.set()
+
+        multiplexer.on_close = loop.remove_reader
+        for fd in multiplexer.sources:
+            loop.add_reader(fd, on_readable, fd)
+
+        while multiplexer.sources or pending:
+            if pending:
+                yield pending.popleft()
+                continue
+            readable.clear()
+            async with asyncio.timeout(timeout):
+                await readable.wait()
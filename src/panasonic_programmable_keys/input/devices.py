@@ -0,0 +1,152 @@
+"""A process-wide cache of the input device list, shared by everything that looks for the keyboard.
+
+The kernel's /proc files have no useful size or modification time, so each lookup reads the source and compares a
+hash of its contents with the cached table's. Reading a few kilobytes and hashing them is far cheaper than parsing
+and validating, so repeated lookups cost next to nothing until a device comes or goes, and every caller in the
+process sees the same snapshot in the meantime.
+
+With input.discovery set to ioctl, the default table is built by querying /dev/input's event handler nodes instead,
+fingerprinted by what they answered, falling back to /proc if they can't be opened.
+
+Validation depends on input.check_paths, so a table is also read again when that's changed, whether by a reload or
+in place. Tables can be dropped explicitly with invalidate. Callbacks registered with on_devices_changed are told about every new table.
+"""
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from ..util import SettingsDiff
+from ..util import logger
+from ..util import on_reload
+from ..util import settings
+from .discovery import scan_devices
+from .models import DeviceRecord
+from .models import InputDevice
+from .models import InputDevices
+from .models import parse_devices
+from .query import DeviceIndex
+from .query import DeviceQuery
+
+DEVICES_PATH = Path("/proc/bus/input/devices")
+NODES_PATH = Path("/dev/input")
+SYSFS_PATH = Path("/sys")
+
+
+def fingerprint(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class DeviceTable:
+    """The devices listed in one source at one moment, each validated the first time it's asked for."""
+
+    def __init__(
+        self, source: Path, fingerprint: bytes, records: Tuple[DeviceRecord, ...], check_paths: bool = True
+    ) -> None:
+        self.source = source
+        self.fingerprint = fingerprint
+        self.records = records
+        # Whether the models are validated against the filesystem
+        self.check_paths = check_paths
+        self._models: List[InputDevice | None] = [None] * len(records)
+        self._all: InputDevices | None = None
+        self._index: DeviceIndex | None = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def names(self) -> List[str]:
+        return [(record.name or "").strip('"') for record in self.records]
+
+    def model(self, index: int) -> InputDevice:
+        model = self._models[index]
+        if model is None:
+            model = self._models[index] = self.records[index].model()
+        return model
+
+    @property
+    def index(self) -> DeviceIndex:
+        if self._index is None:
+            self._index = DeviceIndex(self.records)
+        return self._index
+
+    def find(self, query: DeviceQuery) -> List[InputDevice]:
+        """The validated devices matching query, in the order they're listed."""
+        return [self.model(position) for position in sorted(query(self.index))]
+
+    def devices(self, where: Callable[[DeviceRecord], bool] | None = None) -> InputDevices:
+        """The validated devices, or only those for which where is true."""
+        if where is None:
+            if self._all is None:
+                self._all = InputDevices(devices=[self.model(index) for index in range(len(self.records))])
+            return self._all
+        return InputDevices(devices=[self.model(index) for index, record in enumerate(self.records) if where(record)])
+
+
+_tables: Dict[Path, DeviceTable] = {}
+_lock = threading.Lock()
+_listeners: List[Callable[[DeviceTable], Any]] = []
+
+
+def _read(source: Path | None) -> Tuple[Path, bytes, Callable[[], Tuple[DeviceRecord, ...]]]:
+    """The source to key the table on, its fingerprint, and how to get its records if they're needed."""
+    if source is None and settings.input.get("discovery", "proc") == "ioctl":
+        try:
+            records = tuple(scan_devices(NODES_PATH, SYSFS_PATH))
+            return NODES_PATH, fingerprint(repr(records).encode()), lambda: records
+        except PermissionError as e:
+            logger.warning(f"Unable to query the devices in {NODES_PATH}, reading {DEVICES_PATH} instead: {e}")
+    if source is None:
+        source = DEVICES_PATH
+    data = source.read_bytes()
+    return source, fingerprint(data), lambda: tuple(parse_devices(data.decode().splitlines()))
+
+
+def device_table(source: Path | None = None) -> DeviceTable:
+    """The table for source, which is only parsed again if its contents have changed since it was last read.
+
+    Without a source, the devices are discovered with the backend chosen by input.discovery.
+    """
+    source, digest, records = _read(source)
+    check_paths = bool(settings.input.get("check_paths", True))
+    with _lock:
+        cached = _tables.get(source)
+    if cached is not None and cached.fingerprint == digest and cached.check_paths == check_paths:
+        return cached
+    table = DeviceTable(source, digest, records(), check_paths)
+    with _lock:
+        _tables[source] = table
+        listeners = list(_listeners)
+    logger.debug(f"Read {len(table)} input devices from {source}")
+    for listener in listeners:
+        listener(table)
+    return table
+
+
+def invalidate(source: Path | None = None) -> None:
+    """Drop the cached table for source, or for every source, so the next lookup parses it again."""
+    with _lock:
+        if source is None:
+            _tables.clear()
+        else:
+            _tables.pop(source, None)
+
+
+def on_devices_changed(callback: Callable[[DeviceTable], Any]) -> Callable[[DeviceTable], Any]:
+    """Call callback with every table read after this, whether it's new or replaces one that changed."""
+    with _lock:
+        _listeners.append(callback)
+    return callback
+
+
+@on_reload
+def _settings_reloaded(diff: SettingsDiff) -> None:
+    # The default table may now come from the other backend
+    if diff.touches("input.discovery"):
+        invalidate()
@@ -0,0 +1,88 @@
+"""Discover input devices by asking each event handler node about itself, instead of parsing /proc.
+
+Every /dev/input/event* node is opened once and queried with the evdev ioctls for its identity, name, physical path,
+unique identifier and capability bitmaps, and the sysfs tree is read for its device path and the other handlers
+attached to it. The answers are written out as the DeviceRecords the /proc parser would produce, so they validate
+into the same InputDevice models, with bitmaps that come straight from the kernel.
+
+Handlers with no device node, such as kbd and sysrq, aren't in sysfs and so aren't listed; nothing reads from them.
+Opening the nodes needs the same permissions as reading them, which the server has.
+"""
+
+import os
+from pathlib import Path
+from typing import Iterator
+from typing import List
+
+from ..util import logger
+from . import evdev
+from .ecodes import EV_CNT
+from .ecodes import EV_KEY
+from .ecodes import EV_LED
+from .ecodes import EV_MSC
+from .ecodes import INPUT_PROP_CNT
+from .ecodes import KEY_CNT
+from .ecodes import LED_CNT
+from .ecodes import MSC_CNT
+from .models import DeviceRecord
+
+# The bitmaps InputDeviceBitmaps knows about, beyond PROP and EV, listed when the device has their event type
+BITMAPS = ((EV_KEY, "key", KEY_CNT), (EV_MSC, "msc", MSC_CNT), (EV_LED, "led", LED_CNT))
+# Prefixes of the handlers that have device nodes
+NODE_HANDLERS = ("event", "mouse", "js")
+
+
+def _handlers(device: Path) -> str:
+    """The handlers attached to the input device at device in sysfs, in the order /proc lists them."""
+    try:
+        names = [entry.name for entry in os.scandir(device) if entry.name.startswith(NODE_HANDLERS)]
+    except OSError:
+        return ""
+    # evdev attaches after mousedev and joydev
+    return " ".join(sorted(names, key=lambda name: (name.startswith("event"), name)))
+
+
+def query_device(fd: int, node: str, sysfs: Path = Path("/sys")) -> DeviceRecord:
+    """Describe the open event handler fd, whose node is named node, as a DeviceRecord."""
+    bus, vendor, product, version = evdev.get_id(fd)
+    ev = evdev.get_bits(fd, 0, EV_CNT)
+    ev_types = int.from_bytes(ev, "little")
+    bitmaps = [("prop", evdev.bitmap_text(evdev.get_props(fd, INPUT_PROP_CNT))), ("ev", evdev.bitmap_text(ev))]
+    for ev_type, bitmap, size in BITMAPS:
+        if ev_types & (1 << ev_type):
+            bitmaps.append((bitmap, evdev.bitmap_text(evdev.get_bits(fd, ev_type, size))))
+    device = Path(os.path.realpath(sysfs.joinpath("class", "input", node, "device")))
+    return DeviceRecord(
+        id=f"Bus={bus:04x} Vendor={vendor:04x} Product={product:04x} Version={version:04x}",
+        name=f'"{evdev.get_name(fd)}"',
+        phys=evdev.get_phys(fd),
+        sys=f"/{device.relative_to(sysfs)}" if device.is_relative_to(sysfs) else str(device),
+        uniq=evdev.get_uniq(fd),
+        handlers=_handlers(device) or node,
+        bitmaps=tuple(bitmaps),
+    )
+
+
+def scan_devices(directory: Path = Path("/dev/input"), sysfs: Path = Path("/sys")) -> Iterator[DeviceRecord]:
+    """Query every event handler node in directory, in the order of their numbers.
+
+    Raises PermissionError if a node can't be opened, as the result would otherwise silently miss devices. Nodes
+    that disappear part way through the scan are skipped.
+    """
+    nodes: List[str] = [
+        entry.name for entry in os.scandir(directory) if entry.name.startswith("event") and entry.name[5:].isdigit()
+    ]
+    for node in sorted(nodes, key=lambda name: int(name[5:])):
+        try:
+            fd = os.open(directory.joinpath(node), os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        except FileNotFoundError:
+            continue
+        try:
+            record = query_device(fd, node, sysfs)
+        except OSError as e:
+            # Most likely ENODEV, as the device went away after it was opened
+            logger.debug(f"Unable to query {node}, skipping it: {e}")
+            continue
+        finally:
+            os.close(fd)
+        yield record
@@ -0,0 +1,260 @@
+import os
+import shlex
+import shutil
+from enum import Enum
+from types import MappingProxyType
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Mapping
+from typing import NamedTuple
+from typing import Tuple
+
+from ..util import SettingsSnapshot
+from ..util import logger
+from ..util import settings
+from .gestures import GestureTrie
+from .models import KEY_EVENTS
+from .models import KeyEvent
+from .models import KeyPressDescriptor
+from .models import KeyPressEvent
+from .models import KeyPressEventType
+from .models import key_filter
+from .plugins import ActionFunction
+from .plugins import build_action
+from .plugins import describe_action
+
+
+class Overlap(Enum):
+    """What to do when a key is pressed while its action is already running as many times as it may."""
+
+    queue = "queue"
+    drop = "drop"
+    restart = "restart"
+
+
+class OutputMode(Enum):
+    """What to do with an action's output."""
+
+    # Read and throw it away
+    discard = "discard"
+    # Keep the last few lines, to be looked at when debugging
+    tail = "tail"
+    # Keep the last few lines and send them all to the log, up to a rate limit
+    log = "log"
+
+
+class RepeatMode(Enum):
+    """What to do with the kernel's autorepeats while a key is held."""
+
+    ignore = "ignore"
+    # Fire the key's action on each repeat, up to repeat_rate times a second
+    fire = "fire"
+    # Treat presses and repeats less than coalesce_window apart as one burst, firing once when it starts
+    coalesce = "coalesce"
+
+
+class ActionPolicy(NamedTuple):
+    overlap: Overlap = Overlap.queue
+    # Most runs of this action at once
+    max_running: int = 1
+    # Most presses of this action waiting for a run to finish, beyond which they're dropped
+    max_queued: int = 8
+    # Seconds the action may run before it's terminated, or None for no limit
+    timeout: float | None = None
+    # Seconds between terminating and killing an action that won't stop
+    kill_after: float = 5.0
+    output: OutputMode = OutputMode.log
+    # Lines of output to keep from the latest run
+    output_lines: int = 20
+    # Lines of output per second to send to the log
+    output_rate: float = 10.0
+    repeat: RepeatMode = RepeatMode.ignore
+    # Times per second a held key's repeats may fire its action
+    repeat_rate: float = 5.0
+    # Seconds between presses, or repeats, of a key that still count as the same burst
+    coalesce_window: float = 0.25
+    # Times per second a key may fire at all, after a burst of as many, or None for no limit
+    rate_limit: float | None = 10.0
+
+    @classmethod
+    def from_settings(cls, defaults: Mapping[str, Any], overrides: Mapping[str, Any]) -> "ActionPolicy":
+        def get(name: str, default: Any) -> Any:
+            return overrides.get(name, defaults.get(name, default))
+
+        return cls(
+            overlap=Overlap(get("overlap", cls._field_defaults["overlap"].value)),
+            max_running=max(1, int(get("max_per_key", cls._field_defaults["max_running"]))),
+            max_queued=max(0, int(get("max_queued", cls._field_defaults["max_queued"]))),
+            timeout=float(get("timeout", 0)) or None,
+            kill_after=float(get("kill_after", cls._field_defaults["kill_after"])),
+            output=OutputMode(get("output", cls._field_defaults["output"].value)),
+            output_lines=max(0, int(get("output_lines", cls._field_defaults["output_lines"]))),
+            output_rate=float(get("output_rate", cls._field_defaults["output_rate"])),
+            repeat=RepeatMode(get("repeat", cls._field_defaults["repeat"].value)),
+            repeat_rate=float(get("repeat_rate", cls._field_defaults["repeat_rate"])),
+            coalesce_window=float(get("coalesce_window", cls._field_defaults["coalesce_window"])),
+            rate_limit=float(get("rate_limit", cls._field_defaults["rate_limit"])) or None,
+        )
+
+
+class Action(NamedTuple):
+    """A configured command, prepared ahead of time so running it needs no settings lookups or parsing.
+
+    In-process actions have a function to call instead of an argv to run.
+    """
+
+    key: KeyPressDescriptor
+    command: str
+    argv: Tuple[str, ...]
+    env: Mapping[str, str]
+    policy: ActionPolicy = ActionPolicy()
+    function: ActionFunction | None = None
+    # The name of the gesture that triggers this action, if it's not a plain press of key
+    gesture: str | None = None
+
+    @property
+    def name(self) -> str:
+        return self.gesture or self.key.name
+
+
+class DispatchTable:
+    """The actions for each enabled key and gesture, compiled once from the keyboard and gestures settings.
+
+    Tables are never modified after they're built, so a reader holding one always sees a consistent set of actions.
+    """
+
+    def __init__(
+        self,
+        actions: Dict[int, Action],
+        enabled: FrozenSet[int],
+        version: int = 0,
+        gestures: GestureTrie[Action] | None = None,
+        policies: Dict[int, ActionPolicy] | None = None,
+    ) -> None:
+        self.actions = actions
+        self.enabled = enabled
+        self.version = version
+        if gestures is None:
+            gestures = GestureTrie()
+            for code, action in actions.items():
+                gestures.add([(frozenset([code]), False)], action)
+        self.gestures = gestures
+        # The policy for each key's own events, which decides how they're limited before they're dispatched
+        if policies is None:
+            policies = {code: action.policy for code, action in actions.items()}
+        self.policies = policies
+        self.accepts: FrozenSet[KeyEvent] = (
+            gestures.accepts
+            | frozenset(KEY_EVENTS[code][KeyPressEventType.press.value] for code in actions)
+            | frozenset(
+                KEY_EVENTS[code][KeyPressEventType.repeat.value]
+                for code, policy in policies.items()
+                if policy.repeat is not RepeatMode.ignore
+            )
+        )
+        # What to ask the server for: everything acted on, and presses of every other key so that keys nobody
+        # configured can be pointed out
+        self.subscription: FrozenSet[KeyEvent] = self.accepts | key_filter(types=[KeyPressEventType.press])
+
+    @classmethod
+    def compile(
+        cls,
+        keyboard: Mapping[str, Any] | None = None,
+        actions_settings: Mapping[str, Any] | None = None,
+        version: int | None = None,
+        gestures: Mapping[str, Any] | None = None,
+        snapshot: SettingsSnapshot | None = None,
+    ) -> "DispatchTable":
+        """Compile the table from the sections given, and any not given from snapshot, or the live settings without
+        one. The table takes snapshot's version unless version is given.
+        """
+        source: Any = settings if snapshot is None else snapshot
+        if keyboard is None:
+            keyboard = source.keyboard
+        if actions_settings is None:
+            actions_settings = source.get("actions", {})
+        if gestures is None:
+            gestures = source.get("gestures", {})
+        if version is None:
+            version = 0 if snapshot is None else snapshot.version
+        overrides = actions_settings.get("keys", {})
+        env = MappingProxyType(os.environ.copy())
+
+        def build(name: str, key: KeyPressDescriptor, command: Any) -> Action | None:
+            policy = ActionPolicy.from_settings(actions_settings, overrides.get(name, {}))
+            gesture = None if name == key.name else name
+            return cls._compile_action(name, key, command, env, policy, gesture)
+
+        actions: Dict[int, Action] = {}
+        enabled = set()
+        for key_name in keyboard.get("enabled_keys", []):
+            if key_name not in KeyPressDescriptor.__members__:
+                logger.warning(f"Ignoring unknown enabled key {key_name}")
+                continue
+            key = KeyPressDescriptor[key_name]
+            enabled.add(key.value)
+            action = build(key_name, key, keyboard.get(key_name, ""))
+            if action is not None:
+                actions[key.value] = action
+        trie = GestureTrie.compile(gestures, build, actions)
+        policies = {
+            code: ActionPolicy.from_settings(actions_settings, overrides.get(KeyPressDescriptor(code).name, {}))
+            for code in trie.keys | actions.keys()
+        }
+        logger.debug(
+            f"Compiled dispatch table version {version}: {[(a.name, a.command, a.policy) for a in actions.values()]}"
+        )
+        return cls(actions, frozenset(enabled), version, trie, policies)
+
+    @staticmethod
+    def _compile_action(
+        name: str,
+        key: KeyPressDescriptor,
+        command: Any,
+        env: Mapping[str, str],
+        policy: ActionPolicy,
+        gesture: str | None = None,
+    ) -> Action | None:
+        """The action for a command string or in-process action table, or None if there isn't a usable one."""
+        if not command:
+            return None
+        if isinstance(command, Mapping):
+            options = dict(command)
+            action_type = options.pop("action", "")
+            try:
+                function = build_action(action_type, options)
+            except ValueError as e:
+                logger.error(f"Unable to build the action for {name}: {e}")
+                return None
+            return Action(key, describe_action(action_type, options), (), env, policy, function, gesture)
+        try:
+            argv = shlex.split(command)
+        except ValueError as e:
+            logger.error(f"Unable to parse the command for {name} ({command}): {e}")
+            return None
+        if not argv:
+            return None
+        executable = shutil.which(argv[0], path=env.get("PATH"))
+        if executable is None:
+            logger.warning(f"Unable to find {argv[0]} on PATH for {name}, it will fail when pressed")
+        else:
+            argv[0] = executable
+        return Action(key, command, tuple(argv), env, policy, None, gesture)
+
+    def lookup(self, key_event: KeyEvent | KeyPressEvent) -> Action | None:
+        if key_event.type is not KeyPressEventType.press:
+            return None
+        return self.actions.get(key_event.descriptor.value)
+
+
+class Dispatcher:
+    """Holds the current DispatchTable, replacing it whole whenever the settings are reloaded."""
+
+    def __init__(self, snapshot: SettingsSnapshot | None = None) -> None:
+        self.table = DispatchTable.compile(snapshot=snapshot)
+
+    def reload(self, snapshot: SettingsSnapshot | None = None) -> None:
+        # Build the new table completely before publishing it with a single assignment
+        version = self.table.version + 1 if snapshot is None else snapshot.version
+        self.table = DispatchTable.compile(version=version, snapshot=snapshot)
@@ -0,0 +1,16 @@
+"""Event types and codes from linux/input-event-codes.h that this package cares about."""
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_MSC = 0x04
+EV_SW = 0x05
+EV_LED = 0x11
+EV_CNT = 0x20
+
+INPUT_PROP_CNT = 0x20
+MSC_CNT = 0x08
+LED_CNT = 0x10
+
+KEY_CNT = 0x300
+
+MSC_SCAN = 0x04
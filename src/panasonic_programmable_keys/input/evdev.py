@@ -0,0 +1,150 @@
+"""Thin wrappers around the evdev ioctls from linux/input.h."""
+
+import ctypes
+import fcntl
+import struct
+from typing import Iterable
+from typing import Tuple
+
+from .ecodes import EV_CNT
+
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def _IOC(direction: int, nr: int, size: int) -> int:
+    return (direction << 30) | (size << 16) | (ord("E") << 8) | nr
+
+
+# struct input_mask { __u32 type; __u32 codes_size; __u64 codes_ptr; }
+INPUT_MASK = struct.Struct("@IIQ")
+
+# struct input_id { __u16 bustype; __u16 vendor; __u16 product; __u16 version; }
+INPUT_ID = struct.Struct("@HHHH")
+
+EVIOCGID = _IOC(_IOC_READ, 0x02, INPUT_ID.size)
+EVIOCGRAB = _IOC(_IOC_WRITE, 0x90, struct.calcsize("@i"))
+EVIOCSMASK = _IOC(_IOC_WRITE, 0x93, INPUT_MASK.size)
+
+# The kernel's bitmaps are arrays of unsigned longs
+LONG_SIZE = ctypes.sizeof(ctypes.c_ulong)
+# Longest name, phys or uniq string read back
+STRING_SIZE = 256
+
+
+def EVIOCGNAME(length: int) -> int:
+    return _IOC(_IOC_READ, 0x06, length)
+
+
+def EVIOCGPHYS(length: int) -> int:
+    return _IOC(_IOC_READ, 0x07, length)
+
+
+def EVIOCGUNIQ(length: int) -> int:
+    return _IOC(_IOC_READ, 0x08, length)
+
+
+def EVIOCGPROP(length: int) -> int:
+    return _IOC(_IOC_READ, 0x09, length)
+
+
+def EVIOCGBIT(ev_type: int, length: int) -> int:
+    return _IOC(_IOC_READ, 0x20 + ev_type, length)
+
+
+def bitmap(bits: Iterable[int], size: int) -> bytearray:
+    """Build a kernel-style little-endian bitmap with room for `size` bits."""
+    ret = bytearray((size + 7) // 8)
+    for bit in bits:
+        ret[bit // 8] |= 1 << (bit % 8)
+    return ret
+
+
+def bitmap_text(data: bytes | bytearray | int) -> str:
+    """Format a kernel bitmap, or an int as made by bitmap_int, the way /proc/bus/input/devices does: hexadecimal
+    longs, most significant first, without any leading zero longs.
+    """
+    if isinstance(data, int):
+        data = data.to_bytes(max(1, (data.bit_length() + 7) // 8), "little")
+    words = [int.from_bytes(data[start : start + LONG_SIZE], "little") for start in range(0, len(data), LONG_SIZE)]
+    while len(words) > 1 and not words[-1]:
+        words.pop()
+    return " ".join(f"{word:x}" for word in reversed(words))
+
+
+def bitmap_int(text: str) -> int:
+    """The bitmap in text, formatted as by bitmap_text, as an int with bit n set for code n."""
+    value = 0
+    for word in text.split():
+        value = (value << (LONG_SIZE * 8)) | int(word, 16)
+    return value
+
+
+def set_mask(fd: int, ev_type: int, codes: Iterable[int], size: int) -> None:
+    """Install an EVIOCSMASK so that only `codes` of `ev_type` are delivered to this fd.
+
+    An ev_type of 0 masks the event types themselves rather than codes. Raises OSError if the kernel or fd doesn't
+    support event masks.
+    """
+    codes_bitmap = bitmap(codes, size)
+    codes_buffer = (ctypes.c_ubyte * len(codes_bitmap)).from_buffer(codes_bitmap)
+    request = INPUT_MASK.pack(ev_type, len(codes_bitmap), ctypes.addressof(codes_buffer))
+    fcntl.ioctl(fd, EVIOCSMASK, request)
+
+
+def set_type_mask(fd: int, ev_types: Iterable[int]) -> None:
+    """Install an EVIOCSMASK so that only `ev_types` are delivered to this fd."""
+    set_mask(fd, 0, ev_types, EV_CNT)
+
+
+def grab(fd: int, exclusive: bool = True) -> None:
+    """Take (or release) an exclusive EVIOCGRAB on the device, so no other reader receives its events."""
+    fcntl.ioctl(fd, EVIOCGRAB, int(exclusive))
+
+
+def get_id(fd: int) -> Tuple[int, int, int, int]:
+    """The device's (bus, vendor, product, version)."""
+    buffer = bytearray(INPUT_ID.size)
+    fcntl.ioctl(fd, EVIOCGID, buffer, True)
+    return INPUT_ID.unpack(buffer)
+
+
+def _get_string(fd: int, request: int) -> str:
+    buffer = bytearray(STRING_SIZE)
+    try:
+        length = fcntl.ioctl(fd, request, buffer, True)
+    except FileNotFoundError:
+        # Devices without the string, usually uniq, answer ENOENT
+        return ""
+    return buffer[:length].split(b"\0", 1)[0].decode(errors="replace")
+
+
+def get_name(fd: int) -> str:
+    return _get_string(fd, EVIOCGNAME(STRING_SIZE))
+
+
+def get_phys(fd: int) -> str:
+    return _get_string(fd, EVIOCGPHYS(STRING_SIZE))
+
+
+def get_uniq(fd: int) -> str:
+    return _get_string(fd, EVIOCGUNIQ(STRING_SIZE))
+
+
+def _round_up(size: int) -> int:
+    bytes_size = (size + 7) // 8
+    return (bytes_size + LONG_SIZE - 1) // LONG_SIZE * LONG_SIZE
+
+
+def get_props(fd: int, size: int) -> bytearray:
+    """The device's property bitmap, with room for size properties."""
+    buffer = bytearray(_round_up(size))
+    fcntl.ioctl(fd, EVIOCGPROP(len(buffer)), buffer, True)
+    return buffer
+
+
+def get_bits(fd: int, ev_type: int, size: int) -> bytearray:
+    """The bitmap of codes the device supports for ev_type, or of event types for an ev_type of 0."""
+    buffer = bytearray(_round_up(size))
+    fcntl.ioctl(fd, EVIOCGBIT(ev_type, len(buffer)), buffer, True)
+    return buffer
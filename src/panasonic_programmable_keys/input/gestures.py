@@ -0,0 +1,300 @@
+"""Chords, sequences, long presses and double taps of the macro keys.
+
+Key presses are grouped into tokens: the keys pressed together within the chord window, and whether they were held
+for a long press. Every binding is a path of tokens through a trie, a plain press of one key being a path of length one,
+so recognising gestures is a dictionary lookup per token.
+
+The recognizer only knows the time from the events it's given, so it behaves the same fed a synthetic stream as it
+does fed the kernel's timestamps. Deadlines, like the end of a long press, are reported by next_deadline and must be
+passed to expire once they've passed; GestureDriver does that with event loop timers.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from dataclasses import field
+from itertools import combinations
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import FrozenSet
+from typing import Generic
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Set
+from typing import Tuple
+from typing import TypeVar
+
+from ..util import logger
+from .models import KEY_EVENTS
+from .models import KeyEvent
+from .models import KeyPressDescriptor
+from .models import KeyPressEventType
+
+T = TypeVar("T")
+
+# The keys pressed together, and whether they were held for a long press
+Token = Tuple[FrozenSet[int], bool]
+
+GESTURE_TYPES = ("chord", "sequence", "long_press", "double_tap")
+
+
+@dataclass
+class GestureNode(Generic[T]):
+    action: T | None = None
+    children: Dict[Token, "GestureNode[T]"] = field(default_factory=dict)
+    # Seconds allowed between the previous token starting and this one starting
+    gap: float = 0.0
+    # Seconds to wait for a child before settling on this node
+    window: float = 0.0
+
+
+class GestureTrie(Generic[T]):
+    """Every binding as a path of tokens, built once per settings version."""
+
+    def __init__(self, chord_window: float = 0.05, long_press: float = 0.6) -> None:
+        self.root: GestureNode[T] = GestureNode()
+        self.chord_window = chord_window
+        self.long_press = long_press
+        # Keys that may be the start of a chord, which hold back their token until the chord window has passed
+        self.chord_keys: Set[int] = set()
+        # Groups of keys that a chord could still be made from by pressing more keys
+        self.extendable: Set[FrozenSet[int]] = set()
+        # Keys whose releases matter, because they decide whether a press was long
+        self.long_keys: Set[int] = set()
+
+    def add(self, path: List[Token], action: T, gap: float = 0.0, name: str = "") -> None:
+        node = self.root
+        for depth, token in enumerate(path):
+            codes, long = token
+            if len(codes) > 1:
+                self.chord_keys.update(codes)
+                self.extendable.update(frozenset(c) for n in range(1, len(codes)) for c in combinations(codes, n))
+            if long:
+                self.long_keys.update(codes)
+            child = node.children.get(token)
+            if child is None:
+                child = node.children[token] = GestureNode(gap=gap if depth else 0.0)
+            elif depth:
+                child.gap = max(child.gap, gap)
+            node.window = max(node.window, child.gap)
+            node = child
+        if node.action is not None:
+            logger.warning(f"Gesture {name or path} is bound more than once, keeping the first binding")
+            return
+        node.action = action
+
+    @property
+    def keys(self) -> Set[int]:
+        """Every key that's part of a binding."""
+        keys: Set[int] = set()
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for (codes, _), child in node.children.items():
+                keys.update(codes)
+                stack.append(child)
+        return keys
+
+    @property
+    def accepts(self) -> FrozenSet[KeyEvent]:
+        """The events the recognizer needs to see: presses of every bound key, and releases where they matter."""
+        releases = self.chord_keys | self.long_keys
+        press, release = KeyPressEventType.press.value, KeyPressEventType.release.value
+        return frozenset(KEY_EVENTS[code][press] for code in self.keys) | frozenset(
+            KEY_EVENTS[code][release] for code in self.keys & releases
+        )
+
+    @classmethod
+    def compile(
+        cls,
+        gestures: Mapping[str, Any],
+        build: Callable[[str, KeyPressDescriptor, Any], T | None],
+        single: Mapping[int, T] | None = None,
+    ) -> "GestureTrie[T]":
+        """Compile the gestures settings, using build to make each binding's action from its name, first key and
+        command. Any single key actions are bound to plain presses of their keys.
+        """
+        milliseconds = 1000
+        trie: GestureTrie[T] = cls(
+            chord_window=float(gestures.get("chord_window", 50)) / milliseconds,
+            long_press=float(gestures.get("long_press", 600)) / milliseconds,
+        )
+        for code, single_action in (single or {}).items():
+            trie.add([(frozenset([code]), False)], single_action)
+        defaults = {
+            "sequence": float(gestures.get("sequence_window", 500)) / milliseconds,
+            "double_tap": float(gestures.get("double_tap_window", 300)) / milliseconds,
+        }
+        for name, binding in gestures.get("bindings", {}).items():
+            kinds = [kind for kind in GESTURE_TYPES if kind in binding]
+            if len(kinds) != 1:
+                logger.error(f"Gesture {name} needs exactly one of {', '.join(GESTURE_TYPES)}, ignoring it")
+                continue
+            kind = kinds[0]
+            names = [binding[kind]] if isinstance(binding[kind], str) else list(binding[kind])
+            unknown = [key_name for key_name in names if key_name not in KeyPressDescriptor.__members__]
+            if unknown or not names:
+                logger.error(f"Gesture {name} has unknown keys {unknown}, ignoring it")
+                continue
+            codes = [KeyPressDescriptor[key_name].value for key_name in names]
+            match kind:
+                case "chord":
+                    path = [(frozenset(codes), False)]
+                case "sequence":
+                    path = [(frozenset([code]), False) for code in codes]
+                case "long_press":
+                    path = [(frozenset(codes), True)]
+                case "double_tap":
+                    path = [(frozenset(codes), False)] * 2
+            gap = float(binding["window"]) / milliseconds if "window" in binding else defaults.get(kind, 0.0)
+            action = build(name, KeyPressDescriptor[names[0]], binding.get("command", ""))
+            if action is not None:
+                trie.add(path, action, gap, name)
+        return trie
+
+
+class GestureRecognizer(Generic[T]):
+    """Turns timestamped key events into the actions of the bindings they complete, one trie step per token.
+
+    When one binding is a prefix of another, as a plain press is of a double tap, the shorter one only fires once the
+    longer one can no longer be completed. Keys with nothing but a plain press bound fire as soon as they're pressed.
+    """
+
+    def __init__(self, trie: GestureTrie[T]) -> None:
+        self.trie = trie
+        self.node = trie.root
+        # When the token that led to node started
+        self.node_time = 0.0
+        # Keys pressed since the current token started, until it's been emitted
+        self.group: Set[int] = set()
+        self.group_start = 0.0
+        # Whether more keys may still join the group as a chord
+        self.group_open = False
+        # Whether the group's keys are being held to see if it's a long press
+        self.awaiting_long = False
+
+    @property
+    def next_deadline(self) -> float | None:
+        if self.group_open:
+            return self.group_start + self.trie.chord_window
+        if self.awaiting_long:
+            return self.group_start + self.trie.long_press
+        if self.node is not self.trie.root and not self.group:
+            return self.node_time + self.node.window
+        return None
+
+    def feed(self, time: float, event: KeyEvent) -> List[T]:
+        """Process one event, returning the actions it (or any deadline before it) completed."""
+        fired = self.expire(time)
+        code = event.descriptor.value
+        if event.type is KeyPressEventType.press:
+            if self.group_open:
+                self.group.add(code)
+                if frozenset(self.group) not in self.trie.extendable:
+                    self._close_group(fired)
+                return fired
+            if self.group:
+                # Another key was pressed while these were held, so they weren't a long press
+                self._emit((frozenset(self.group), False), fired)
+            self.group = {code}
+            self.group_start = time
+            self.group_open = frozenset(self.group) in self.trie.extendable
+            if not self.group_open:
+                self._close_group(fired)
+        elif event.type is KeyPressEventType.release and code in self.group:
+            if self.group_open:
+                self._close_group(fired)
+            if self.awaiting_long:
+                self._emit((frozenset(self.group), False), fired)
+        return fired
+
+    def expire(self, now: float) -> List[T]:
+        """Settle every deadline up to now, returning the actions that completed."""
+        fired: List[T] = []
+        while (deadline := self.next_deadline) is not None and deadline <= now:
+            if self.group_open:
+                self._close_group(fired)
+            elif self.awaiting_long:
+                self._emit((frozenset(self.group), True), fired)
+            else:
+                # Nothing followed in time, so settle on the binding matched so far
+                self._settle(fired)
+        return fired
+
+    def _bound(self, token: Token) -> bool:
+        return token in self.node.children or token in self.trie.root.children
+
+    def _close_group(self, fired: List[T]) -> None:
+        self.group_open = False
+        codes = frozenset(self.group)
+        if self._bound((codes, True)):
+            self.awaiting_long = True
+        else:
+            self._emit((codes, False), fired)
+
+    def _emit(self, token: Token, fired: List[T]) -> None:
+        start = self.group_start
+        self.group = set()
+        self.group_open = self.awaiting_long = False
+        child = self.node.children.get(token)
+        if child is not None and self.node is not self.trie.root and start - self.node_time > child.gap:
+            child = None
+        if child is None and self.node is not self.trie.root:
+            self._settle(fired)
+            child = self.node.children.get(token)
+        if child is None:
+            return
+        if child.children:
+            self.node = child
+            self.node_time = start
+            return
+        if child.action is not None:
+            fired.append(child.action)
+        self.node = self.trie.root
+
+    def _settle(self, fired: List[T]) -> None:
+        if self.node.action is not None:
+            fired.append(self.node.action)
+        self.node = self.trie.root
+
+
+class GestureDriver(Generic[T]):
+    """Runs a GestureRecognizer on an event loop, firing its deadlines with the loop's timers.
+
+    Event times are mapped onto the loop's clock using the time each event is fed at, so a deadline fires however long
+    after its event it's due, measured in the event's clock. Only call feed from the loop's thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, fire: Callable[[T], Any]) -> None:
+        self.loop = loop
+        self.fire = fire
+        self.recognizer: GestureRecognizer[T] | None = None
+        # loop.time() minus the event clock, as of the latest event
+        self.offset = 0.0
+        self.timer: asyncio.TimerHandle | None = None
+
+    def feed(self, trie: GestureTrie[T], time: float, event: KeyEvent) -> None:
+        if self.recognizer is None or self.recognizer.trie is not trie:
+            # The settings were reloaded, so start again with the new bindings
+            self.recognizer = GestureRecognizer(trie)
+        self.offset = self.loop.time() - time
+        self._fire_all(self.recognizer.feed(time, event))
+
+    def feed_threadsafe(self, trie: GestureTrie[T], time: float, event: KeyEvent) -> None:
+        self.loop.call_soon_threadsafe(self.feed, trie, time, event)
+
+    def _expire(self) -> None:
+        self.timer = None
+        if self.recognizer is not None:
+            self._fire_all(self.recognizer.expire(self.loop.time() - self.offset))
+
+    def _fire_all(self, actions: Iterable[T]) -> None:
+        for action in actions:
+            self.fire(action)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        deadline = self.recognizer.next_deadline if self.recognizer is not None else None
+        if deadline is not None:
+            self.timer = self.loop.call_at(deadline + self.offset, self._expire)
@@ -1,43 +1,82 @@
-from concurrent.futures import ThreadPoolExecutor
+import json
+import signal
+from contextlib import contextmanager
+from typing import Any
+from typing import Iterator
 
+from ..actions import ActionExecutor
 from ..rpc.client import KeyClient
+from ..util import SettingsDiff
+from ..util import current_settings
 from ..util import logger
-from ..util import settings
-from ..util.shell import shell
-from .models import KeyPressEvent
+from ..util import on_reload
+from .dispatch import Action
+from .dispatch import Dispatcher
+from .dispatch import DispatchTable
+from .gestures import GestureDriver
+from .models import KeyPressEventType
+from .repeat import RepeatLimiter
+
+
+@contextmanager
+def _stats_on_signal(executor: ActionExecutor) -> Iterator[None]:
+    """Log the executor's stats, with the latest output of each action, whenever the client is sent SIGUSR1."""
+
+    def log_stats(signum: int, frame: Any) -> None:
+        logger.info(f"Action stats: {json.dumps(executor.stats(), indent=2, default=str)}")
+
+    previous = signal.signal(signal.SIGUSR1, log_stats)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
 
 
 def handle_keys():
-    handled_keys = settings.keyboard.get("enabled_keys", [])
+    # Tables are compiled from settings snapshots, so a reload can't be seen halfway through, and share their versions
+    dispatcher = Dispatcher(current_settings())
     client = KeyClient()
     # Only handle if the client is operational
     if client.ping():
-        futures = []
-        # Submit shell execution to the thread pool
-        with ThreadPoolExecutor() as thread_pool:
-            # Iterate through keys delivered by the client proxy
-            key_event: KeyPressEvent
-            for key_event in client.yield_keys():
+
+        @on_reload
+        def recompile(diff: SettingsDiff) -> None:
+            if not diff.touches("keyboard", "actions", "gestures"):
+                return
+            dispatcher.reload(current_settings())
+            # Have the server only send the events we act on
+            client.set_filter(dispatcher.table.subscription)
+
+        # Run actions in the background so a slow command never holds up the next key press, and on the way out
+        # block until all remaining children processes have stopped
+        with ActionExecutor() as executor, _stats_on_signal(executor):
+            # Gestures are recognised on the executor's loop, which times long presses and sequences for us
+            gestures: GestureDriver[Action] = GestureDriver(executor.loop, executor.submit)
+            limiter = RepeatLimiter(dispatcher.table)
+            # Iterate through keys delivered by the client, with the time the kernel saw them
+            for timed in client.timed_keys(dispatcher.table.subscription):
+                key_event = timed.event
                 logger.debug(f"Processing {key_event}")
-                # Only react to press events, not release events
-                if key_event.type.name == "press":
-                    # Only react if it's a key we've marked for handling
-                    key_name = key_event.descriptor.name
-                    if key_name in handled_keys:
-                        desired_command = settings.keyboard.get(key_name, "")
-                        if desired_command != "":
-                            logger.info(f"Executing: {desired_command}")
-                            output = shell(desired_command, fail=False)
-                            futures.append(thread_pool.submit(logger.info, output))
-                        else:
-                            logger.debug(f"Skipping handling {key_event} as command not specified")
-                    else:
-                        logger.warning(f"Unhandled key received ({key_name}) - did you mean to configure it?")
-                else:
-                    # This was a release
+                # Take the table once per event, so a reload can't change it partway through
+                table: DispatchTable = dispatcher.table
+                if limiter.table is not table:
+                    limiter = RepeatLimiter(table)
+                # Hold back repeats, bursts and runaway keys before they can start anything
+                if not limiter.allow(timed.time, key_event):
+                    continue
+                if key_event.type is KeyPressEventType.repeat:
+                    # Held keys repeat their own action, never a gesture's
+                    if (action := table.actions.get(key_event.descriptor.value)) is not None:
+                        executor.submit(action)
+                elif key_event in table.accepts:
+                    gestures.feed_threadsafe(table.gestures, timed.time, key_event)
+                elif key_event.type is not KeyPressEventType.press:
+                    # Only react to press events, not release events
                     pass
-        # Block until all remaining children processes have stopped
-        for future in futures:
-            future.result()
+                elif key_event.descriptor.value in table.enabled:
+                    logger.debug(f"Skipping handling {key_event} as command not specified")
+                else:
+                    key_name = key_event.descriptor.name
+                    logger.warning(f"Unhandled key received ({key_name}) - did you mean to configure it?")
     else:
         raise RuntimeError(f"Unable to reach the server on {client.socket}")
@@ -0,0 +1,122 @@
+"""Notice input devices coming and going, such as the keyboard's hotkey device after a suspend or an ACPI reset.
+
+DeviceMonitor watches /dev/input with inotify, so it wakes up as event handler nodes are created and removed rather
+than polling. On each wakeup it reads the device list through the cached device table, which is only parsed again
+if it has changed, and reports which devices were added and removed as a DeviceDiff.
+"""
+
+import ctypes
+import os
+import struct
+from pathlib import Path
+from typing import FrozenSet
+from typing import NamedTuple
+
+from ..util import logger
+from .devices import DeviceTable
+from .devices import device_table
+from .models import DeviceRecord
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+# A node's permissions are usually set by udev after it's created, which IN_ATTRIB catches
+WATCH_MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[len]; }
+INOTIFY_EVENT = struct.Struct("@iIII")
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+def _check(result: int) -> int:
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return result
+
+
+class DeviceDiff(NamedTuple):
+    """How the device list changed between two readings of it."""
+
+    added: FrozenSet[DeviceRecord]
+    removed: FrozenSet[DeviceRecord]
+    table: DeviceTable
+    # Whether any event handler nodes were created, removed or had their permissions changed, even if no devices were
+    nodes: bool = True
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+class DeviceMonitor:
+    """Watches a directory of event handler nodes, diffing the device list whenever one of them changes.
+
+    The monitor's fileno becomes readable when there's something to look at, so it can be waited on with the device
+    fds themselves. Raises OSError if inotify isn't available.
+    """
+
+    def __init__(self, directory: Path = Path("/dev/input"), source: Path | None = None) -> None:
+        self.directory = directory
+        self.source = source
+        self.buffer = bytearray(4096)
+        self.fd = _check(_libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC))
+        try:
+            _check(_libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK))
+        except OSError:
+            os.close(self.fd)
+            raise
+        self.table = device_table(source)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self) -> "DeviceMonitor":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _handlers_changed(self) -> bool:
+        """Drain the queued inotify events, returning whether any were about event handler nodes."""
+        changed = False
+        while True:
+            try:
+                read = os.readv(self.fd, [self.buffer])
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < read:
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(self.buffer, offset)
+                name = bytes(self.buffer[offset + INOTIFY_EVENT.size : offset + INOTIFY_EVENT.size + length])
+                offset += INOTIFY_EVENT.size + length
+                # Missed events could have been about anything
+                if mask & IN_Q_OVERFLOW or name.startswith(b"event"):
+                    changed = True
+
+    def read(self) -> DeviceDiff:
+        """Diff the device list against the last reading, if any event handlers were created or removed.
+
+        The diff is empty when nothing relevant happened, so call this whenever fileno is readable.
+        """
+        if not self._handlers_changed():
+            return DeviceDiff(frozenset(), frozenset(), self.table, nodes=False)
+        before = self.table
+        self.table = device_table(self.source)
+        if self.table is before:
+            return DeviceDiff(frozenset(), frozenset(), self.table)
+        old, new = set(before.records), set(self.table.records)
+        diff = DeviceDiff(frozenset(new - old), frozenset(old - new), self.table)
+        if diff:
+            logger.info(
+                f"Input devices added: {[r.name for r in diff.added]}, removed: {[r.name for r in diff.removed]}"
+            )
+        return diff
@@ -1,17 +1,31 @@
+import operator
 from enum import Enum
-from functools import cached_property
+from functools import reduce
 from pathlib import Path
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Tuple
 
 from pydantic import BaseModel
+from pydantic import GetCoreSchemaHandler
 from pydantic import ValidationInfo
 from pydantic import computed_field
 from pydantic import field_validator
+from pydantic_core import core_schema
 
 from ..util import logger
 from ..util import settings
+from .ecodes import EV_CNT
+from .ecodes import KEY_CNT
+from .evdev import bitmap_int
+from .evdev import bitmap_text
 
 NON_DEVICE_HANDLERS = ["kbd", "sysrq", "leds", "rfkill"]
 
@@ -37,39 +51,121 @@ class InputDeviceId(BaseModel):
         return value_int
 
 
-class InputDeviceBitmaps(BaseModel):
-    prop: str | int
-    ev: str | int
-    msc: int | None = None
-    key: str | List[int] = []
-    led: int | str | None = None
+# The bit for each code, so testing one is an and rather than shifting the whole bitmap down to it
+_KEY_MASKS = tuple(1 << code for code in range(KEY_CNT))
+_EV_MASKS = tuple(1 << ev_type for ev_type in range(EV_CNT))
+
+
+def _bitmap(value: str | int | List[int] | None) -> int | None:
+    if isinstance(value, str):
+        return bitmap_int(value)
+    elif isinstance(value, list):
+        # Longs, most significant first, as the key bitmap used to be held
+        return bitmap_int(" ".join(f"{word:x}" for word in value))
+    elif value is None or isinstance(value, int):
+        return value
+    raise ValueError(f"A bitmap must be the kernel's hexadecimal text or an int, not {value!r}")
+
+
+class InputDeviceBitmaps:
+    """A device's capability bitmaps, each held as an int with bit n set for code n.
+
+    There's one of these for every device, so they're kept in slots rather than as a pydantic model, which costs
+    several times the memory and slows every attribute read. Pydantic still validates them, from the kernel's text as
+    in /proc/bus/input/devices or an instance, and serializes them back to that text.
+    """
+
+    __slots__ = ("prop", "ev", "msc", "key", "led")
+
+    def __init__(
+        self,
+        prop: str | int,
+        ev: str | int,
+        msc: str | int | None = None,
+        key: str | int | List[int] = 0,
+        led: str | int | None = None,
+    ) -> None:
+        self.prop: int = _bitmap(prop) or 0
+        self.ev: int = _bitmap(ev) or 0
+        self.msc: int | None = _bitmap(msc)
+        self.key: int = _bitmap(key) or 0
+        self.led: int | None = _bitmap(led)
 
-    @field_validator("prop", "ev", "led")
     @classmethod
-    def hex(cls, value: str | int | None) -> int | None:
-        if isinstance(value, str):
-            return int(value, 16)
-        elif isinstance(value, int):
+    def validate(cls, value: Any) -> "InputDeviceBitmaps":
+        if isinstance(value, cls):
             return value
-        return value
+        if not isinstance(value, Mapping):
+            raise ValueError(f"Bitmaps must be a mapping of bitmap names to values, not {value!r}")
+        try:
+            # Bitmaps this package doesn't use, such as abs and sw, are ignored
+            return cls(**{name: value[name] for name in cls.__slots__ if name in value})
+        except TypeError as e:
+            raise ValueError(str(e)) from None
 
-    @field_validator("key")
     @classmethod
-    def hex_list(cls, value: str | List[int]) -> List[int]:
-        int_list: List[int]
-        if isinstance(value, str):
-            int_list = [int(v, 16) for v in value.split()]
-        else:
-            int_list = value
-        return int_list
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls.validate, serialization=core_schema.plain_serializer_function_ser_schema(cls.text)
+        )
+
+    def text(self) -> Dict[str, str | None]:
+        """Each bitmap as the kernel's text, or None for those the device doesn't have."""
+        return {name: None if value is None else bitmap_text(value) for name, value in self.items()}
+
+    def items(self) -> Iterator[Tuple[str, int | None]]:
+        return ((name, getattr(self, name)) for name in self.__slots__)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, InputDeviceBitmaps):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={value!r}' for name, value in self.items())})"
+
+    def has_key(self, key: "KeyPressDescriptor | int") -> bool:
+        # _value_ is a plain attribute, where value is a much slower property
+        code = key if type(key) is int else key._value_  # type: ignore[union-attr]
+        return self.key & _KEY_MASKS[code] != 0
+
+    def has_ev(self, ev_type: int) -> bool:
+        return self.ev & _EV_MASKS[ev_type] != 0
+
+    def _combine(self, other: "InputDeviceBitmaps", op: Callable[[int, int], int]) -> "InputDeviceBitmaps":
+        values: Dict[str, Any] = {}
+        for name, value in self.items():
+            theirs = getattr(other, name)
+            combined = op(value or 0, theirs or 0)
+            # Missing bitmaps, such as msc on a device without EV_MSC, stay missing unless there's something in them
+            values[name] = None if not combined and (value is None or theirs is None) else combined
+        return InputDeviceBitmaps(**values)
+
+    def __and__(self, other: "InputDeviceBitmaps") -> "InputDeviceBitmaps":
+        """The capabilities both have."""
+        return self._combine(other, operator.and_)
+
+    def __or__(self, other: "InputDeviceBitmaps") -> "InputDeviceBitmaps":
+        """The capabilities either has."""
+        return self._combine(other, operator.or_)
+
+    @classmethod
+    def union(cls, bitmaps: Iterable["InputDeviceBitmaps"]) -> "InputDeviceBitmaps":
+        return reduce(operator.or_, bitmaps, cls(prop=0, ev=0))
+
+    @classmethod
+    def intersection(cls, bitmaps: Iterable["InputDeviceBitmaps"]) -> "InputDeviceBitmaps":
+        """The capabilities every one of bitmaps has. There must be at least one."""
+        return reduce(operator.and_, bitmaps)
 
 
 class InputDeviceHandler(BaseModel):
     name: str
 
     @computed_field  # type: ignore
-    @cached_property
+    @property
     def libinput_device(self) -> Path | None:
+        # Looked up every time, as the node may be created after the device is listed and the model cached
         if self.name not in NON_DEVICE_HANDLERS:
             path = Path("/dev/input").joinpath(self.name)
             if settings.input.get("check_paths", True):
@@ -91,79 +187,96 @@ class InputDevice(BaseModel):
 
     @property
     def libinput_devices(self) -> List[Path]:
-        ret = []
-        for handler in self.handlers:
-            ret.append(handler.libinput_device)
-        return [handler.libinput_device for handler in self.handlers if handler.libinput_device is not None]
+        return [path for path in (handler.libinput_device for handler in self.handlers) if path is not None]
+
+
+class DeviceRecord(NamedTuple):
+    """One device's entry in /proc/bus/input/devices, kept as the kernel's text until its model is asked for.
+
+    Fields are None when the entry didn't have their line, which only matters once the record is validated.
+    """
+
+    id: str | None = None
+    name: str | None = None
+    phys: str | None = None
+    sys: str | None = None
+    uniq: str | None = None
+    handlers: str | None = None
+    # (bitmap, value) pairs, in the order they were listed
+    bitmaps: Tuple[Tuple[str, str], ...] = ()
+
+    def model(self) -> InputDevice:
+        """Validate the record into an InputDevice, raising ValidationError if it isn't one."""
+        build: Dict[str, Any] = {}
+        if self.id is not None:
+            build["id"] = {key.lower(): value for key, value in (pair.split("=") for pair in self.id.split())}
+        if self.name is not None:
+            build["name"] = self.name.strip('"')
+        if self.phys is not None:
+            build["phys"] = self.phys
+        if self.sys is not None:
+            build["sys"] = self.sys
+            path = Path(f"/sys{self.sys}")
+            if settings.input.get("check_paths", True):
+                assert path.exists(), f"Path '{path}' doesn't exist"
+        if self.uniq:
+            build["uniq"] = self.uniq
+        if self.handlers is not None:
+            build["handlers"] = [{"name": handler} for handler in self.handlers.split()]
+        if self.bitmaps:
+            build["bitmaps"] = dict(self.bitmaps)
+        return InputDevice(**build)
+
+
+# The record field for each line prefix other than B, whose lines are the bitmaps
+_RECORD_FIELDS = {"I: ": "id", "N: ": "name", "P: ": "phys", "S: ": "sys", "U: ": "uniq", "H: ": "handlers"}
+
+
+def parse_devices(lines: Iterable[str]) -> Iterator[DeviceRecord]:
+    """Split the lines of /proc/bus/input/devices into a DeviceRecord per device, in a single pass.
+
+    Nothing is validated beyond each line having a known prefix, so this costs little more than reading the lines.
+    """
+    fields: Dict[str, str] = {}
+    bitmaps: List[Tuple[str, str]] = []
+    for line in lines:
+        if not line or line.isspace():
+            if fields or bitmaps:
+                yield DeviceRecord(**fields, bitmaps=tuple(bitmaps))
+                fields = {}
+                bitmaps = []
+            continue
+        prefix = line[:3]
+        if prefix == "B: ":
+            bitmap, _, value = line[3:].rstrip().partition("=")
+            bitmaps.append((bitmap.lower(), value))
+        elif prefix == "I: ":
+            fields["id"] = line[3:].rstrip()
+        elif prefix in _RECORD_FIELDS:
+            fields[_RECORD_FIELDS[prefix]] = line[3:].rstrip().partition("=")[2]
+        else:
+            raise ValueError(f"Unable to parse input prefix {line[:1]} with value {line.rstrip()}")
+    if fields or bitmaps:
+        yield DeviceRecord(**fields, bitmaps=tuple(bitmaps))
 
 
 class InputDevices(BaseModel):
     devices: List[InputDevice] = []
 
-    @classmethod
-    def load(cls, source: Path | None = None) -> "InputDevices":
-        ret = cls()
-
-        def process(chunk: List[str]) -> InputDevice:
-            logger.debug(f"Processing chunk: {chunk}")
-            build: Dict[str, Any] = {}
-            for start, line in map(lambda x: x.split(": ", 1), chunk):
-                logger.debug(f"Processing line: {start}: {line}")
-                match start:
-                    case "I":
-                        id_parsed = {k.lower(): v for k, v in map(lambda x: x.split("="), line.split())}
-                        build["id"] = id_parsed
-                        logger.debug(f"Identified device ID struct: {id_parsed}")
-                    case "N":
-                        name_parsed = line.split("=", 1)[-1].strip('"')
-                        build["name"] = name_parsed
-                        logger.debug(f"Identified device name: {name_parsed}")
-                    case "P":
-                        phys_parsed = line.split("=", 1)[-1]
-                        build["phys"] = phys_parsed
-                        logger.debug(f"Identified device physical location: {phys_parsed}")
-                    case "S":
-                        sys_parsed = line.split("=", 1)[-1]
-                        build["sys"] = sys_parsed
-                        path = Path(f"/sys{sys_parsed}")
-                        if settings.input.get("check_paths", True):
-                            logger.debug(f"Checking path: {path}")
-                            assert path.exists(), f"Path '{path}' doesn't exist"
-                        logger.debug(f"Identified device /sys path: {sys_parsed}")
-                    case "U":
-                        if uniq := line.split("=", 1)[-1]:
-                            build["uniq"] = uniq
-                            logger.debug(f"Identified device unique identifier: {uniq}")
-                    case "H":
-                        build["handlers"] = []
-                        for handler in line.split("=", 1)[-1].split():
-                            logger.debug(f"Identified input event handler device: {handler}")
-                            build["handlers"].append({"name": handler})
-                    case "B":
-                        build["bitmaps"] = build.get("bitmaps", {})
-                        bitmap, value = line.split("=", 1)
-                        bitmap = bitmap.lower()
-                        build["bitmaps"][bitmap] = value
-                        logger.debug(f"Identified device bitmap {bitmap}: {value}")
-                    case _:
-                        raise ValueError(f"Unable to parse input prefix {start} with value {line}")
-            logger.debug(f"Validating InputDevice: {build}")
-            return InputDevice(**build)
-
+    @staticmethod
+    def records(source: Path | None = None) -> Iterator[DeviceRecord]:
+        """Stream the unvalidated records of every device listed in source."""
         if source is None:
             source = Path("/proc/bus/input/devices")
-
-        this_chunk: List[str] = []
         with open(source) as f:
-            for line in map(lambda l: l.rstrip(), f.readlines()):
-                if this_chunk and not line:
-                    ret.devices.append(process(this_chunk))
-                    this_chunk = []
-                else:
-                    this_chunk.append(line)
-        if this_chunk:
-            ret.devices.append(process(this_chunk))
-        return ret
+            yield from parse_devices(f)
+
+    @classmethod
+    def load(cls, source: Path | None = None, where: Callable[[DeviceRecord], bool] | None = None) -> "InputDevices":
+        """Load and validate the devices listed in source, or only those for which where is true."""
+        devices = [record.model() for record in cls.records(source) if where is None or where(record)]
+        logger.debug(f"Loaded {len(devices)} input devices from {source or '/proc/bus/input/devices'}")
+        return cls(devices=devices)
 
 
 class KeyPressDescriptor(Enum):
@@ -184,8 +297,41 @@ class KeyPressDescriptor(Enum):
 class KeyPressEventType(Enum):
     release = 0
     press = 1
+    # Sent by the kernel's autorepeat while a key is held
+    repeat = 2
 
 
 class KeyPressEvent(BaseModel):
     descriptor: KeyPressDescriptor
     type: KeyPressEventType
+
+
+class KeyEvent(NamedTuple):
+    """An immutable key event, used on the capture path in place of validating a KeyPressEvent per record.
+
+    Every valid combination is built once into KEY_EVENTS, so decoding never allocates or validates.
+    """
+
+    descriptor: KeyPressDescriptor
+    type: KeyPressEventType
+
+
+# Interned events, looked up by evdev code and then value
+KEY_EVENTS: Dict[int, Dict[int, KeyEvent]] = {
+    descriptor.value: {event_type.value: KeyEvent(descriptor, event_type) for event_type in KeyPressEventType}
+    for descriptor in KeyPressDescriptor
+}
+
+
+def key_filter(
+    descriptors: Iterable[KeyPressDescriptor] | None = None, types: Iterable[KeyPressEventType] | None = None
+) -> FrozenSet[KeyEvent]:
+    """The interned KeyEvents for any of descriptors with any of types, defaulting to all of either."""
+    if descriptors is None:
+        descriptors = KeyPressDescriptor
+    if types is None:
+        types = KeyPressEventType
+    types = list(types)
+    return frozenset(
+        KEY_EVENTS[descriptor.value][event_type.value] for descriptor in descriptors for event_type in types
+    )
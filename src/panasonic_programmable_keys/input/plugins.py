@@ -0,0 +1,54 @@
+"""Action types that run in-process rather than as a command.
+
+A key is mapped to one with a table instead of a command string, naming the action type and its options:
+
+    KEY_MACRO1 = { action = "signal", pid_file = "/run/example.pid", signal = "SIGHUP" }
+
+Action types are found through the panasonic_programmable_keys.actions entry point group. Each is a factory, called
+with the options when the settings are compiled, that returns the zero-argument callable to run on each press. Any
+string it returns is treated as the action's output.
+"""
+
+from functools import lru_cache
+from importlib.metadata import entry_points
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Mapping
+
+from ..util import logger
+
+ENTRY_POINT_GROUP = "panasonic_programmable_keys.actions"
+
+ActionFunction = Callable[[], Any]
+ActionFactory = Callable[..., ActionFunction]
+
+
+@lru_cache(maxsize=1)
+def action_types() -> Dict[str, ActionFactory]:
+    """The installed action types by name, loaded once."""
+    types: Dict[str, ActionFactory] = {}
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name in types:
+            logger.warning(f"Ignoring {entry_point.value} as action type {entry_point.name} is already registered")
+            continue
+        try:
+            types[entry_point.name] = entry_point.load()
+        except Exception as e:
+            logger.error(f"Unable to load action type {entry_point.name} from {entry_point.value}: {e}")
+    return types
+
+
+def describe_action(name: str, options: Mapping[str, Any]) -> str:
+    return f"{name}({', '.join(f'{option}={value!r}' for option, value in options.items())})"
+
+
+def build_action(name: str, options: Mapping[str, Any]) -> ActionFunction:
+    """Build an in-process action, raising ValueError if the type doesn't exist or doesn't accept the options."""
+    factory = action_types().get(name)
+    if factory is None:
+        raise ValueError(f"No action type named {name}, installed types are {sorted(action_types())}")
+    try:
+        return factory(**options)
+    except Exception as e:
+        raise ValueError(f"Invalid options for {name}: {e!r}") from e
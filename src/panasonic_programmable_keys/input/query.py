@@ -0,0 +1,161 @@
+"""Indexed lookups and composable queries over the devices in a DeviceTable.
+
+A DeviceIndex maps each phys, name, handler, sysfs path and (bus, vendor, product) to the positions of the records
+that have it, built in one pass over a table's records the first time it's queried. Capabilities are indexed from the
+bitmaps too, but only once a query asks about them. Queries resolve to sets of positions, and combine with &, | and ~:
+
+    table.find(handler("event") & bus(0x19))
+    table.find(has_key(KeyPressDescriptor.KEY_MACRO1) | phys("panasonic/hkey", prefix=True))
+"""
+
+from string import digits
+from typing import Callable
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import Mapping
+from typing import Set
+from typing import Tuple
+
+from .evdev import bitmap_int
+from .models import DeviceRecord
+from .models import KeyPressDescriptor
+
+Positions = FrozenSet[int]
+DeviceId = Tuple[int, int, int]
+
+
+def _bits(value: int) -> Iterable[int]:
+    while value:
+        lowest = value & -value
+        yield lowest.bit_length() - 1
+        value ^= lowest
+
+
+class DeviceIndex:
+    """Positions of a table's records by each of the fields they're looked up by."""
+
+    def __init__(self, records: Tuple[DeviceRecord, ...]) -> None:
+        self.records = records
+        self.all: Positions = frozenset(range(len(records)))
+        self.phys: Dict[str, Set[int]] = {}
+        self.name: Dict[str, Set[int]] = {}
+        self.sysfs: Dict[str, Set[int]] = {}
+        # By handler name, such as event3, and by kind, such as event
+        self.handler: Dict[str, Set[int]] = {}
+        self.id: Dict[DeviceId, Set[int]] = {}
+        self.bus: Dict[int, Set[int]] = {}
+        self._capabilities: Dict[str, Dict[int, Set[int]]] = {}
+        for position, record in enumerate(records):
+            self.phys.setdefault(record.phys or "", set()).add(position)
+            self.name.setdefault((record.name or "").strip('"'), set()).add(position)
+            self.sysfs.setdefault(record.sys or "", set()).add(position)
+            for handler in (record.handlers or "").split():
+                self.handler.setdefault(handler, set()).add(position)
+                kind = handler.rstrip(digits)
+                if kind != handler:
+                    self.handler.setdefault(kind, set()).add(position)
+            try:
+                ids = {
+                    key.lower(): int(value, 16)
+                    for key, value in (pair.split("=") for pair in (record.id or "").split())
+                }
+                device_id = (ids["bus"], ids["vendor"], ids["product"])
+            except (KeyError, ValueError):
+                # Left for validation to complain about
+                continue
+            self.id.setdefault(device_id, set()).add(position)
+            self.bus.setdefault(device_id[0], set()).add(position)
+
+    def capabilities(self, bitmap: str) -> Mapping[int, Set[int]]:
+        """Positions by each bit set in the named bitmap, such as key or ev, indexed the first time it's asked for."""
+        index = self._capabilities.get(bitmap)
+        if index is None:
+            index = {}
+            for position, record in enumerate(self.records):
+                text = dict(record.bitmaps).get(bitmap)
+                if text is None:
+                    continue
+                try:
+                    value = bitmap_int(text)
+                except ValueError:
+                    continue
+                for bit in _bits(value):
+                    index.setdefault(bit, set()).add(position)
+            self._capabilities[bitmap] = index
+        return index
+
+
+class DeviceQuery:
+    """A set of devices, described by the positions of their records in an index."""
+
+    def __init__(self, resolve: Callable[[DeviceIndex], Iterable[int]], description: str) -> None:
+        self._resolve = resolve
+        self.description = description
+
+    def __call__(self, index: DeviceIndex) -> Positions:
+        return frozenset(self._resolve(index))
+
+    def __and__(self, other: "DeviceQuery") -> "DeviceQuery":
+        return DeviceQuery(lambda index: self(index) & other(index), f"({self} & {other})")
+
+    def __or__(self, other: "DeviceQuery") -> "DeviceQuery":
+        return DeviceQuery(lambda index: self(index) | other(index), f"({self} | {other})")
+
+    def __invert__(self) -> "DeviceQuery":
+        return DeviceQuery(lambda index: index.all - self(index), f"~{self}")
+
+    def __repr__(self) -> str:
+        return self.description
+
+
+def _lookup(field: str, value: str, prefix: bool) -> DeviceQuery:
+    def resolve(index: DeviceIndex) -> Iterable[int]:
+        entries: Dict[str, Set[int]] = getattr(index, field)
+        if not prefix:
+            return entries.get(value, ())
+        return (position for key, positions in entries.items() if key.startswith(value) for position in positions)
+
+    return DeviceQuery(resolve, f"{field}({value!r}{', prefix=True' if prefix else ''})")
+
+
+def phys(value: str, prefix: bool = False) -> DeviceQuery:
+    return _lookup("phys", value, prefix)
+
+
+def name(value: str, prefix: bool = False) -> DeviceQuery:
+    return _lookup("name", value, prefix)
+
+
+def sysfs(value: str) -> DeviceQuery:
+    """The device at the sysfs path value, as listed in /proc, such as /devices/platform/i8042/serio0/input/input2."""
+    return _lookup("sysfs", value, False)
+
+
+def handler(value: str) -> DeviceQuery:
+    """Devices with the handler named value, such as event3, or with any handler of a kind, such as event."""
+    return _lookup("handler", value, False)
+
+
+def bus(value: int) -> DeviceQuery:
+    return DeviceQuery(lambda index: index.bus.get(value, ()), f"bus({value:#06x})")
+
+
+def device_id(bus: int, vendor: int, product: int) -> DeviceQuery:
+    return DeviceQuery(
+        lambda index: index.id.get((bus, vendor, product), ()), f"device_id({bus:#06x}, {vendor:#06x}, {product:#06x})"
+    )
+
+
+def has_key(key: KeyPressDescriptor | int) -> DeviceQuery:
+    """Devices whose key bitmap has the key, from the kernel's own capabilities rather than anything configured."""
+    code = key.value if isinstance(key, KeyPressDescriptor) else key
+    return DeviceQuery(lambda index: index.capabilities("key").get(code, ()), f"has_key({code:#x})")
+
+
+def has_ev(ev_type: int) -> DeviceQuery:
+    return DeviceQuery(lambda index: index.capabilities("ev").get(ev_type, ()), f"has_ev({ev_type:#x})")
+
+
+# The Panasonic hotkey devices, however many there are
+PANASONIC_KEYBOARD = phys("panasonic/hkey", prefix=True)
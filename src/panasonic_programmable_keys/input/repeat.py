@@ -0,0 +1,72 @@
+"""Limits on how often each key's events reach dispatch.
+
+A held key sends the kernel's autorepeats, and a bouncing or stuck key can send presses far faster than anyone could
+press it. Each key's policy decides what happens to its repeats, whether presses close together are coalesced into
+one, and how many times a second the key may fire at all, so no key can start its action without bound.
+"""
+
+from typing import Dict
+from typing import Set
+
+from ..util import logger
+from ..util.ratelimit import TokenBucket
+from .dispatch import DispatchTable
+from .dispatch import RepeatMode
+from .models import KeyEvent
+from .models import KeyPressEventType
+
+
+class RepeatLimiter:
+    """Decides which of a key's events go on to dispatch, following the policies of the table it was built for.
+
+    Times are the events' own, so the limits hold however late the events are delivered.
+    """
+
+    def __init__(self, table: DispatchTable) -> None:
+        self.table = table
+        # Refilled at each key's repeat_rate, spent by repeats that fire the action
+        self.repeats: Dict[int, TokenBucket] = {}
+        # Refilled at each key's rate_limit, spent by everything that fires
+        self.limits: Dict[int, TokenBucket] = {}
+        # When each key's latest press or repeat arrived, for coalescing
+        self.latest: Dict[int, float] = {}
+        # Keys that have been rate limited since they last fired, so the warning is only logged once
+        self.limited: Set[int] = set()
+        self.dropped: Dict[int, int] = {}
+
+    def allow(self, time: float, event: KeyEvent) -> bool:
+        """Whether event, at time, should be dispatched."""
+        code = event.descriptor.value
+        policy = self.table.policies.get(code)
+        if policy is None or event.type is KeyPressEventType.release:
+            return True
+        if event.type is KeyPressEventType.repeat and policy.repeat is RepeatMode.ignore:
+            return False
+        if policy.repeat is RepeatMode.coalesce:
+            latest = self.latest.get(code)
+            self.latest[code] = time
+            if event.type is KeyPressEventType.repeat or (
+                latest is not None and time - latest <= policy.coalesce_window
+            ):
+                return False
+        elif event.type is KeyPressEventType.repeat:
+            repeats = self.repeats.get(code)
+            if repeats is None:
+                repeats = self.repeats[code] = TokenBucket(policy.repeat_rate, 1, now=time)
+            if not repeats.take(time):
+                return False
+        if policy.rate_limit is None:
+            return True
+        limit = self.limits.get(code)
+        if limit is None:
+            limit = self.limits[code] = TokenBucket(policy.rate_limit, now=time)
+        if limit.take(time):
+            self.limited.discard(code)
+            return True
+        self.dropped[code] = self.dropped.get(code, 0) + 1
+        if code not in self.limited:
+            self.limited.add(code)
+            logger.warning(
+                f"{event.descriptor.name} is firing more than {policy.rate_limit:g} times a second, dropping presses"
+            )
+        return False
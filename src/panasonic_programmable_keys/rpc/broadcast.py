@@ -0,0 +1,281 @@
+import threading
+from collections import deque
+from enum import Enum
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterator
+from typing import List
+
+from ..input import CapturedEvent
+from ..input import EventMultiplexer
+from ..input import KeyEvent
+from ..input import is_panasonic_keyboard
+from ..input import panasonic_keyboard_device_paths
+from ..input.devices import DeviceTable
+from ..input.hotplug import DeviceMonitor
+from ..input.query import PANASONIC_KEYBOARD
+from ..util import logger
+
+
+class Backpressure(Enum):
+    """What to do with a subscriber that falls a whole buffer behind the reader."""
+
+    drop_oldest = "drop_oldest"
+    drop_newest = "drop_newest"
+    disconnect = "disconnect"
+
+
+class SubscriberDisconnected(RuntimeError):
+    """The subscriber fell too far behind and was disconnected by its backpressure policy."""
+
+
+class Subscription:
+    """One subscriber's cursor into an EventBroadcaster's ring buffer."""
+
+    def __init__(
+        self, broadcaster: "EventBroadcaster", policy: Backpressure, accepts: FrozenSet[KeyEvent] | None = None
+    ) -> None:
+        self.broadcaster = broadcaster
+        self.policy = policy
+        # The events this subscriber wants, or None for all of them
+        self.accepts = accepts
+        self.cursor = broadcaster.head
+        self.dropped = 0
+        self.filtered = 0
+        self.delivered = 0
+        self.closed = False
+        self.disconnected = False
+        # Events saved from the ring when a drop_newest subscriber overflowed
+        self.backlog: Deque[CapturedEvent] = deque()
+
+    def _overflow(self) -> None:
+        """Called by the publisher, under the lock, when the next publish would overwrite our oldest unread event.
+
+        drop_newest subscribers are also called for every publish until they've read their saved backlog.
+        """
+        ring = self.broadcaster.ring
+        capacity = len(ring)
+        match self.policy:
+            case Backpressure.drop_oldest:
+                self.cursor += 1
+                self.dropped += 1
+            case Backpressure.drop_newest:
+                if not self.backlog:
+                    self.backlog.extend(ring[i % capacity] for i in range(self.cursor, self.broadcaster.head))  # type: ignore
+                # Skip the event being published, we'll only see events from after we've caught up
+                self.cursor = self.broadcaster.head + 1
+                self.dropped += 1
+            case Backpressure.disconnect:
+                logger.warning(f"Disconnecting subscriber {id(self):x} after falling {capacity} events behind")
+                self.disconnected = True
+                self.broadcaster.subscribers.remove(self)
+
+    def _ready(self) -> bool:
+        return (
+            bool(self.backlog)
+            or self.cursor < self.broadcaster.head
+            or self.closed
+            or self.disconnected
+            or self.broadcaster.finished
+        )
+
+    def get(self, timeout: float | None = None) -> List[CapturedEvent]:
+        """Wait up to timeout seconds for new events, returning all of those available (or none on timeout)."""
+        broadcaster = self.broadcaster
+        with broadcaster.condition:
+            broadcaster.condition.wait_for(self._ready, timeout)
+            if self.disconnected:
+                raise SubscriberDisconnected(f"Subscriber fell more than {len(broadcaster.ring)} events behind")
+            events = list(self.backlog)
+            self.backlog.clear()
+            capacity = len(broadcaster.ring)
+            events.extend(broadcaster.ring[i % capacity] for i in range(self.cursor, broadcaster.head))  # type: ignore
+            self.cursor = max(self.cursor, broadcaster.head)
+        accepts = self.accepts
+        if accepts is not None:
+            read = len(events)
+            events = [captured for captured in events if captured.event in accepts]
+            self.filtered += read - len(events)
+        self.delivered += len(events)
+        return events
+
+    def set_filter(self, accepts: FrozenSet[KeyEvent] | None) -> None:
+        """Replace the events this subscriber wants, taking effect from its next get."""
+        self.accepts = accepts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy.value,
+            "accepts": None if self.accepts is None else len(self.accepts),
+            "lag": self.broadcaster.head - self.cursor + len(self.backlog),
+            "delivered": self.delivered,
+            "filtered": self.filtered,
+            "dropped": self.dropped,
+        }
+
+    @property
+    def exhausted(self) -> bool:
+        return self.closed or (self.broadcaster.finished and not self.backlog and self.cursor >= self.broadcaster.head)
+
+    def __iter__(self) -> Iterator[CapturedEvent]:
+        while not self.exhausted:
+            yield from self.get()
+
+    def close(self) -> None:
+        with self.broadcaster.condition:
+            self.closed = True
+            if self in self.broadcaster.subscribers:
+                self.broadcaster.subscribers.remove(self)
+            self.broadcaster.condition.notify_all()
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def keyboard_paths(table: DeviceTable) -> List[Path]:
+    return panasonic_keyboard_device_paths(devices=table.devices(where=is_panasonic_keyboard))
+
+
+class EventBroadcaster:
+    """A single device reader fanning events out to any number of subscribers through a shared ring buffer.
+
+    Publishing never waits on subscribers: each one keeps its own cursor into the ring, and one that falls a whole
+    ring behind is handled by its backpressure policy without affecting the others.
+
+    Given a DeviceMonitor, the reader keeps running when its devices go away, and whenever the device list changes
+    it attaches to the paths resolve finds in it and lets go of any others. Without one, it stops once every device
+    has gone.
+    """
+
+    max_retries = 10
+
+    def __init__(
+        self,
+        device_paths: List[Path],
+        capacity: int = 256,
+        policy: Backpressure = Backpressure.drop_oldest,
+        monitor: DeviceMonitor | None = None,
+        resolve: Callable[[DeviceTable], List[Path]] = keyboard_paths,
+    ) -> None:
+        self.device_paths = device_paths
+        self.monitor = monitor
+        self.resolve = resolve
+        # Whether the last attempt to reattach failed, so it's worth trying again when the nodes change even if the
+        # device list hasn't, and how many times that's been tried since it last did
+        self.retry = False
+        self.retries = 0
+        self.policy = policy
+        self.ring: List[CapturedEvent | None] = [None] * max(1, capacity)
+        self.head = 0
+        self.subscribers: List[Subscription] = []
+        self.condition = threading.Condition()
+        self.finished = False
+        self.stopping = False
+        self.thread: threading.Thread | None = None
+
+    def publish(self, events: List[CapturedEvent]) -> None:
+        capacity = len(self.ring)
+        with self.condition:
+            for event in events:
+                for subscriber in list(self.subscribers):
+                    if subscriber.backlog or self.head - subscriber.cursor >= capacity:
+                        subscriber._overflow()
+                self.ring[self.head % capacity] = event
+                self.head += 1
+            self.condition.notify_all()
+
+    def subscribe(self, policy: Backpressure | None = None, accepts: FrozenSet[KeyEvent] | None = None) -> Subscription:
+        """Add a subscriber that will receive every event it accepts that's published from now on."""
+        with self.condition:
+            subscription = Subscription(self, policy or self.policy, accepts)
+            self.subscribers.append(subscription)
+        return subscription
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                "devices": [str(path) for path in self.device_paths],
+                "hotplug": self.monitor is not None,
+                "published": self.head,
+                "finished": self.finished,
+                "subscribers": [subscriber.stats() for subscriber in self.subscribers],
+            }
+
+    def run(self) -> None:
+        logger.debug(f"Broadcasting events from {self.device_paths}")
+        try:
+            with EventMultiplexer(self.device_paths) as multiplexer:
+                if self.monitor is not None:
+                    multiplexer.watch(self.monitor.fileno(), lambda: self.reattach(multiplexer))
+                while (multiplexer.sources or self.monitor is not None) and not self.stopping:
+                    events = multiplexer.poll(timeout=0.5)
+                    if events:
+                        self.publish(events)
+        finally:
+            if self.monitor is not None:
+                self.monitor.close()
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+            logger.debug("Stopped broadcasting events")
+
+    def reattach(self, multiplexer: EventMultiplexer) -> None:
+        """Bring the devices being read in line with the device list, if the monitor says it changed.
+
+        If that didn't attach everything it should have, it's tried again when the nodes next change, such as when
+        udev creates one or sets its permissions, up to max_retries times until the device list changes again.
+        """
+        assert self.monitor is not None
+        diff = self.monitor.read()
+        if diff:
+            self.retries = 0
+        elif self.retry and diff.nodes:
+            self.retries += 1
+        else:
+            return
+        self.retry = False
+        try:
+            wanted = set(self.resolve(diff.table))
+        except (AssertionError, ValueError) as e:
+            # The device list can change again while it's being validated, in which case there'll be another diff
+            logger.warning(f"Unable to resolve the devices to read after they changed: {e}")
+            self._retry_later()
+            return
+        if not wanted and PANASONIC_KEYBOARD(diff.table.index):
+            # The keyboard may be listed before udev has made its node, which we'll see created
+            self._retry_later()
+        attached = set(multiplexer.sources.values())
+        for path in attached - wanted:
+            multiplexer.remove(path)
+        for path in wanted - attached:
+            try:
+                multiplexer.add(path)
+                logger.info(f"Attached to {path}")
+            except OSError as e:
+                # Most likely udev hasn't finished with the node, which will be noticed as another change
+                logger.warning(f"Unable to attach to {path}, will retry: {e}")
+                self._retry_later()
+        with self.condition:
+            self.device_paths = sorted(multiplexer.sources.values())
+
+    def _retry_later(self) -> None:
+        if self.retries < self.max_retries:
+            self.retry = True
+        else:
+            logger.warning(f"Giving up on attaching after {self.retries} retries, until the device list changes")
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name="key-broadcaster", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopping = True
+        if self.thread is not None:
+            self.thread.join()
@@ -1,13 +1,29 @@
+import socket
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any
+from typing import Dict
+from typing import FrozenSet
 from typing import Iterator
+from typing import Tuple
 
 import Pyro5.api
 
+from ..input.models import KEY_EVENTS
+from ..input.models import KeyEvent
 from ..input.models import KeyPressEvent
+from ..input.models import key_filter
 from ..util import logger
 from ..util import settings
 from .server import KeyService
+from .stream import stream_socket_path
+from .wire import WireEvent
+from .wire import WireVersionError
+from .wire import client_handshake
+from .wire import decode_stream
+from .wire import decode_timed_stream
+from .wire import encode_filter
 
 
 class KeyServerProxy(Pyro5.api.Proxy):
@@ -19,6 +35,10 @@ class KeyClient(object):
     def __init__(self) -> None:
         self.socket = Path(settings.rpc.get("socket", "/run/panasonic/keys.sock"))
         self.proxy: KeyService = KeyServerProxy(f"PYRO:keyservice@./u:{self.socket}")  # type: ignore
+        self.stream_socket = stream_socket_path()
+        self.stream: socket.socket | None = None
+        # The events the caller wants, as last asked for or set with set_filter, or None for all of them
+        self.accepts: FrozenSet[KeyEvent] | None = None
 
     def ping(self) -> bool:
         try:
@@ -28,7 +48,94 @@ class KeyClient(object):
             return False
         return True
 
-    def yield_keys(self) -> Iterator[KeyPressEvent]:
+    def stats(self) -> Dict[str, Any]:
+        return self.proxy.stats()
+
+    def _rpc_keys(self, accepts: FrozenSet[KeyEvent] | None) -> Iterator[dict]:
+        """Iterate over events by RPC, limited to those in accepts until set_filter changes them.
+
+        The server drops unwanted events before sending them, but can't be sent a new filter partway through an
+        iteration, so after set_filter the remote iteration is closed and started again with the new one. That happens
+        when the next event the old filter let through arrives.
+        """
         logger.debug("Receiving keys")
-        for key_event in self.proxy.yield_keys():
+        self.accepts = accepts
+        while True:
+            pairs = None if accepts is None else [(e.descriptor.value, e.type.value) for e in accepts]
+            events = self.proxy.yield_keys(pairs)
+            try:
+                for key_event in events:
+                    if self.accepts is not accepts:
+                        break
+                    yield key_event
+                else:
+                    return
+            finally:
+                events.close()
+            accepts = self.accepts
+            logger.debug(f"Receiving keys again with {'every' if accepts is None else len(accepts)} kinds of events")
+            if accepts is None or KEY_EVENTS[key_event["descriptor"]][key_event["type"]] in accepts:
+                yield key_event
+
+    def yield_keys(self, accepts: FrozenSet[KeyEvent] | None = None) -> Iterator[KeyPressEvent]:
+        for key_event in self._rpc_keys(accepts):
             yield KeyPressEvent(**key_event)
+
+    def stream_keys(self, accepts: FrozenSet[KeyEvent] | None = None) -> Iterator[KeyEvent]:
+        """Receive events pushed by the server over its stream socket, without a round trip per event.
+
+        Only the events in accepts (or every event, if not given) are sent by the server, see set_filter to change them.
+        """
+        with self._stream(accepts) as (sock, version):
+            yield from decode_stream(sock, version)
+
+    def stream_timed_keys(self, accepts: FrozenSet[KeyEvent] | None = None) -> Iterator[WireEvent]:
+        """Receive events like stream_keys, with the time the kernel recorded each one at."""
+        with self._stream(accepts) as (sock, version):
+            yield from decode_timed_stream(sock, version)
+
+    @contextmanager
+    def _stream(self, accepts: FrozenSet[KeyEvent] | None) -> Iterator[Tuple[socket.socket, int]]:
+        logger.debug(f"Streaming keys from {self.stream_socket}")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(self.stream_socket))
+            version = client_handshake(sock)
+            logger.debug(f"Negotiated wire version {version}")
+            sock.sendall(encode_filter(key_filter() if accepts is None else accepts))
+            self.accepts = accepts
+            self.stream = sock
+            try:
+                yield sock, version
+            finally:
+                self.stream = None
+
+    def set_filter(self, accepts: FrozenSet[KeyEvent]) -> None:
+        """Change the events received, by the server for the open stream if there is one, or here over RPC."""
+        self.accepts = accepts
+        stream = self.stream
+        if stream is not None:
+            logger.debug(f"Updating stream filter to {len(accepts)} kinds of events")
+            stream.sendall(encode_filter(accepts))
+
+    def keys(self, accepts: FrozenSet[KeyEvent] | None = None) -> Iterator[KeyEvent | KeyPressEvent]:
+        """Receive events over the stream socket if enabled and available, otherwise by iterating over RPC."""
+        if settings.rpc.get("streaming", True):
+            try:
+                yield from self.stream_keys(accepts)
+                return
+            except (FileNotFoundError, ConnectionRefusedError, WireVersionError) as e:
+                logger.warning(f"Unable to stream keys from {self.stream_socket}, falling back to RPC: {e}")
+        yield from self.yield_keys(accepts)
+
+    def timed_keys(self, accepts: FrozenSet[KeyEvent] | None = None) -> Iterator[WireEvent]:
+        """Receive events like keys, with the time each was recorded at, for handling that depends on timing."""
+        if settings.rpc.get("streaming", True):
+            try:
+                yield from self.stream_timed_keys(accepts)
+                return
+            except (FileNotFoundError, ConnectionRefusedError, WireVersionError) as e:
+                logger.warning(f"Unable to stream keys from {self.stream_socket}, falling back to RPC: {e}")
+        for key_event in self._rpc_keys(accepts):
+            # Older servers don't send the time, in which case the time it arrived is the best we have
+            event = KEY_EVENTS[key_event["descriptor"]][key_event["type"]]
+            yield WireEvent(key_event.get("time", time.time()), 0, event)
@@ -1,20 +1,35 @@
 import os
+import threading
 from pathlib import Path
 from typing import Any
-from typing import Iterator
+from typing import Dict
+from typing import FrozenSet
+from typing import Generator
+from typing import List
+from typing import Tuple
 
 import Pyro5.api
 from Pyro5.socketutil import SocketConnection
 
-from ..input import InputDevices
-from ..input import panasonic_keyboard_device_path
-from ..input import yield_from
-from ..input.models import KeyPressEvent
+from ..input import CapturedEvent
+from ..input import KeyEvent
+from ..input import device_table
+from ..input import is_panasonic_keyboard
+from ..input import panasonic_keyboard_device_paths
+from ..input.hotplug import DeviceMonitor
+from ..input.models import KEY_EVENTS
+from ..util import current_settings
 from ..util import logger
 from ..util import settings
+from .broadcast import Backpressure
+from .broadcast import EventBroadcaster
+from .broadcast import Subscription
+from .stream import KeyStreamServer
+from .stream import stream_socket_path
 
 
 class KeyServiceDaemon(Pyro5.api.Daemon):
+    stream_server: KeyStreamServer | None = None
 
     def validateHandshake(self, conn: SocketConnection, data: Any) -> Any:
         logger.info(f"Incoming request from {conn.sock} with data: {data}")
@@ -23,20 +38,89 @@ class KeyServiceDaemon(Pyro5.api.Daemon):
     def clientDisconnect(self, conn: SocketConnection) -> None:
         logger.info(f"Session closed with {conn.sock}")
 
+    def serve_stream(self, service: "KeyService") -> None:
+        """Push events to streaming clients from a background thread, alongside the RPC request loop."""
+        path = stream_socket_path()
+        if path.exists():
+            path.unlink()
+        self.stream_server = KeyStreamServer(path, service._subscribe)
+        os.chmod(path, 0o777)  # ensure that the socket can be read by everyone
+        threading.Thread(target=self.stream_server.serve_forever, name="key-stream", daemon=True).start()
+        logger.debug(f"Streaming at: {path}")
+
+    def close(self) -> None:
+        if self.stream_server is not None:
+            self.stream_server.shutdown()
+            self.stream_server.server_close()
+        super().close()
+
 
 @Pyro5.api.expose
 class KeyService(object):
     def __init__(self, device_path: Path | None = None) -> None:
         self.device_path: Path | None = device_path
-        self.devices = InputDevices.load(self.device_path)
+        # Only the keyboards are read from, so there's no need to validate every other device
+        self.devices = device_table(self.device_path).devices(where=is_panasonic_keyboard)
+        self._broadcaster: EventBroadcaster | None = None
+        self._broadcaster_lock = threading.Lock()
+
+    def _shared_broadcaster(self) -> EventBroadcaster:
+        """The one reader shared by every client, started on first use and restarted if its devices went away."""
+        with self._broadcaster_lock:
+            if self._broadcaster is None or self._broadcaster.finished:
+                # Force check paths to prevent reads on wrong device
+                settings.input["check_paths"] = True
+                # Looked up again, as the devices are validated differently now that paths are checked
+                self.devices = device_table(self.device_path).devices(where=is_panasonic_keyboard)
+                device_paths = panasonic_keyboard_device_paths(devices=self.devices)
+                if not device_paths:
+                    raise RuntimeError("Unable to find Panasonic keyboard device event handler")
+                # Read from one snapshot, as the settings may be reloaded on another thread meanwhile
+                rpc = current_settings().rpc
+                self._broadcaster = EventBroadcaster(
+                    device_paths,
+                    capacity=rpc.get("buffer_size", 256),
+                    policy=Backpressure(rpc.get("backpressure", "drop_oldest")),
+                    monitor=self._device_monitor(),
+                )
+                self._broadcaster.start()
+            return self._broadcaster
+
+    def _device_monitor(self) -> DeviceMonitor | None:
+        """A monitor for the broadcaster to reattach with when the keyboard comes back, if hotplug is enabled."""
+        if not current_settings().input.get("hotplug", True):
+            return None
+        try:
+            return DeviceMonitor(source=self.device_path)
+        except OSError as e:
+            logger.warning(f"Unable to watch for input devices coming and going, the keyboard won't be reattached: {e}")
+            return None
 
-    def yield_keys(self) -> Iterator[dict]:
+    def _subscribe(self, accepts: FrozenSet[KeyEvent] | None = None) -> Subscription:
+        return self._shared_broadcaster().subscribe(accepts=accepts)
+
+    def yield_keys(self, accepts: List[Tuple[int, int]] | None = None) -> Generator[dict, None, None]:
+        """Yield events one at a time, limited to the (code, value) pairs in accepts if given."""
         logger.debug("Reading keys")
 
-        key_event: KeyPressEvent
-        for key_event in yield_from(panasonic_keyboard_device_path(devices=self.devices)):
-            logger.debug(key_event)
-            yield key_event.model_dump()
+        accepted: FrozenSet[KeyEvent] | None = None
+        if accepts is not None:
+            accepted = frozenset(
+                KEY_EVENTS[code][value] for code, value in accepts if value in KEY_EVENTS.get(code, {})
+            )
+
+        captured: CapturedEvent
+        with self._subscribe(accepted) as subscription:
+            for captured in subscription:
+                logger.debug(captured)
+                # Same shape as KeyPressEvent.model_dump(), validated by the client on receipt, plus the time
+                yield {**captured.event._asdict(), "time": captured.time}
+
+    def stats(self) -> Dict[str, Any]:
+        """Report what the shared reader has published and how much each subscriber received, filtered or dropped."""
+        if self._broadcaster is None:
+            return {}
+        return self._broadcaster.stats()
 
     def echo(self, data: Any) -> Any:
         logger.debug(f"Received echo request: {data}")
@@ -51,6 +135,9 @@ def get_server(device_path: Path | None = None) -> KeyServiceDaemon:
 
     server = KeyServiceDaemon(unixsocket=str(socket))
     os.chmod(socket, 0o777)  # ensure that the socket can be read by everyone
-    uri = server.register(KeyService(device_path=device_path), objectId="keyservice")
+    service = KeyService(device_path=device_path)
+    uri = server.register(service, objectId="keyservice")
     logger.debug(f"Listening at: {uri}")
+    if settings.rpc.get("streaming", True):
+        server.serve_stream(service)
     return server
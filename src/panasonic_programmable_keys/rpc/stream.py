@@ -0,0 +1,69 @@
+import select
+import socket
+import socketserver
+from pathlib import Path
+from typing import Callable
+from typing import FrozenSet
+
+from ..input import KeyEvent
+from ..util import logger
+from ..util import settings
+from .broadcast import SubscriberDisconnected
+from .broadcast import Subscription
+from .wire import WireError
+from .wire import encode_batches
+from .wire import read_filter
+from .wire import server_handshake
+
+
+def stream_socket_path() -> Path:
+    """The unix socket that events are pushed over, next to the RPC socket unless configured otherwise."""
+    if stream_socket := settings.rpc.get("stream_socket"):
+        return Path(stream_socket)
+    rpc_socket = Path(settings.rpc.get("socket", "/run/panasonic/keys.sock"))
+    return rpc_socket.with_name(f"{rpc_socket.stem}.stream{rpc_socket.suffix}")
+
+
+class KeyStreamHandler(socketserver.BaseRequestHandler):
+    """Pushes events to one connected client as soon as they're published, batching whatever has piled up.
+
+    Only the events named by the client's latest FILTER are sent.
+    """
+
+    server: "KeyStreamServer"
+    request: socket.socket
+
+    def handle(self) -> None:
+        try:
+            version = server_handshake(self.request)
+            accepts = read_filter(self.request)
+            if accepts is None:
+                return
+            logger.info(f"Streaming {len(accepts)} kinds of events to {self.request} with wire version {version}")
+            with self.server.subscribe(accepts) as subscription:
+                while not subscription.exhausted:
+                    events = subscription.get(timeout=1)
+                    if events:
+                        self.request.sendall(encode_batches(events, version))
+                    if self._readable():
+                        accepts = read_filter(self.request)
+                        if accepts is None:
+                            break
+                        logger.info(f"Updating filter for {self.request} to {len(accepts)} kinds of events")
+                        subscription.set_filter(accepts)
+        except (BrokenPipeError, ConnectionResetError, SubscriberDisconnected, WireError) as e:
+            logger.info(f"Stopped streaming events to {self.request}: {e}")
+        logger.info(f"Stream closed with {self.request}")
+
+    def _readable(self) -> bool:
+        # Clients only write filters after the handshake, or hang up
+        readable, _, _ = select.select([self.request], [], [], 0)
+        return bool(readable)
+
+
+class KeyStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, subscribe: Callable[[FrozenSet[KeyEvent]], Subscription]) -> None:
+        self.subscribe = subscribe
+        super().__init__(str(path), KeyStreamHandler)
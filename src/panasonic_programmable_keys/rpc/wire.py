@@ -0,0 +1,186 @@
+"""The binary format key events are pushed to clients in.
+
+A stream starts with the client sending a HELLO naming the range of versions it can decode, and the server answering
+with a WELCOME naming the version it'll send (or 0 if there's no overlap, before hanging up). After that the server
+only writes batches: a count followed by that many fixed-size event frames of the negotiated version.
+
+Right after the handshake, and again whenever it likes, the client sends a FILTER listing the key events it wants.
+The server filters before encoding, so events the client wouldn't act on never cross the socket.
+"""
+
+import re
+import socket
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
+
+from ..input import CapturedEvent
+from ..input.models import KEY_EVENTS
+from ..input.models import KeyEvent
+
+MAGIC = b"PPKE"
+# magic, lowest version, highest version
+HELLO = struct.Struct("!4sBB")
+# magic, chosen version
+WELCOME = struct.Struct("!4sB")
+# magic, number of FILTER_ENTRYs that follow
+FILTER_MAGIC = b"PPKF"
+FILTER_HEADER = struct.Struct("!4sH")
+# code, value
+FILTER_ENTRY = struct.Struct("!Hh")
+BATCH_HEADER = struct.Struct("!H")
+MAX_BATCH = 0xFFFF
+
+# Frames by version. v1: time in microseconds, code, value, source event handler number, padding
+FRAMES: Dict[int, struct.Struct] = {
+    1: struct.Struct("!QHhH2x"),
+}
+VERSION = max(FRAMES)
+MIN_VERSION = min(FRAMES)
+
+_event_handler_number = re.compile(r"event(\d+)$")
+
+
+class WireError(ConnectionError):
+    """The other end of the stream sent something that isn't part of the protocol."""
+
+
+class WireVersionError(WireError):
+    """The client and server have no wire format version in common."""
+
+
+class WireEvent(NamedTuple):
+    """A decoded frame, with its time in seconds and its source as the number of the device's event handler."""
+
+    time: float
+    source: int
+    event: KeyEvent
+
+
+@lru_cache(maxsize=64)
+def source_id(path: Path) -> int:
+    """The number of the event handler at path, e.g. 7 for /dev/input/event7, or 0 if it isn't one."""
+    match = _event_handler_number.search(path.name)
+    return int(match.group(1)) & 0xFFFF if match else 0
+
+
+def encode_batches(events: Iterable[CapturedEvent], version: int = VERSION) -> bytes:
+    """Encode events as one or more batches, ready to be written to the stream in a single call."""
+    pack = FRAMES[version].pack
+    frames = [
+        pack(round(e.time * 1_000_000), e.event.descriptor.value, e.event.type.value, source_id(e.source))
+        for e in events
+    ]
+    chunks = []
+    for start in range(0, len(frames), MAX_BATCH):
+        batch = frames[start : start + MAX_BATCH]
+        chunks.append(BATCH_HEADER.pack(len(batch)))
+        chunks.extend(batch)
+    return b"".join(chunks)
+
+
+def decode_frames(data: bytes | memoryview, version: int = VERSION) -> Iterator[WireEvent]:
+    """Decode a run of frames, keeping their timestamps and sources, skipping any that aren't known key events."""
+    table = KEY_EVENTS
+    for time_us, code, value, source in FRAMES[version].iter_unpack(data):
+        event = table.get(code, {}).get(value)
+        if event is not None:
+            yield WireEvent(time_us / 1_000_000, source, event)
+
+
+def encode_filter(accepts: Iterable[KeyEvent]) -> bytes:
+    entries = [FILTER_ENTRY.pack(event.descriptor.value, event.type.value) for event in accepts]
+    return FILTER_HEADER.pack(FILTER_MAGIC, len(entries)) + b"".join(entries)
+
+
+def read_filter(sock: socket.socket) -> FrozenSet[KeyEvent] | None:
+    """Read a FILTER from sock, returning None if the client hung up instead."""
+    header = bytearray(FILTER_HEADER.size)
+    if not _recv_exactly(sock, memoryview(header)):
+        return None
+    magic, count = FILTER_HEADER.unpack(header)
+    if magic != FILTER_MAGIC:
+        raise WireError(f"Expected a filter, received {bytes(header)!r}")
+    entries = bytearray(count * FILTER_ENTRY.size)
+    if not _recv_exactly(sock, memoryview(entries)):
+        return None
+    table = KEY_EVENTS
+    accepts = (table.get(code, {}).get(value) for code, value in FILTER_ENTRY.iter_unpack(entries))
+    return frozenset(event for event in accepts if event is not None)
+
+
+def _recv_exactly(sock: socket.socket, view: memoryview) -> bool:
+    """Fill view from sock, returning False if the stream ended first."""
+    received = 0
+    while received < len(view):
+        read = sock.recv_into(view[received:])
+        if not read:
+            return False
+        received += read
+    return True
+
+
+def _stream_batches(sock: socket.socket, frame: struct.Struct) -> Iterator[memoryview]:
+    """Read batches from sock until the server closes the stream, yielding each batch's frames."""
+    header = bytearray(BATCH_HEADER.size)
+    buffer = bytearray(frame.size * 64)
+    while _recv_exactly(sock, memoryview(header)):
+        (count,) = BATCH_HEADER.unpack(header)
+        size = count * frame.size
+        if size > len(buffer):
+            buffer = bytearray(size)
+        view = memoryview(buffer)[:size]
+        if not _recv_exactly(sock, view):
+            break
+        yield view
+
+
+def decode_stream(sock: socket.socket, version: int = VERSION) -> Iterator[KeyEvent]:
+    """Decode batches from sock into interned KeyEvents until the server closes the stream."""
+    table = KEY_EVENTS
+    frame = FRAMES[version]
+    for view in _stream_batches(sock, frame):
+        for _, code, value, _ in frame.iter_unpack(view):
+            event = table.get(code, {}).get(value)
+            if event is not None:
+                yield event
+
+
+def decode_timed_stream(sock: socket.socket, version: int = VERSION) -> Iterator[WireEvent]:
+    """Decode batches from sock like decode_stream, keeping each event's timestamp and source."""
+    frame = FRAMES[version]
+    for view in _stream_batches(sock, frame):
+        yield from decode_frames(view, version)
+
+
+def client_handshake(sock: socket.socket, lowest: int = MIN_VERSION, highest: int = VERSION) -> int:
+    """Offer a range of versions to the server, returning the one it chose."""
+    sock.sendall(HELLO.pack(MAGIC, lowest, highest))
+    welcome = bytearray(WELCOME.size)
+    if not _recv_exactly(sock, memoryview(welcome)):
+        raise WireVersionError("Server closed the stream during the handshake")
+    magic, version = WELCOME.unpack(welcome)
+    if magic != MAGIC:
+        raise WireVersionError(f"Server doesn't speak the key event stream protocol: {bytes(welcome)!r}")
+    if version not in FRAMES:
+        raise WireVersionError(f"Server supports none of wire versions {lowest}-{highest}")
+    return version
+
+
+def server_handshake(sock: socket.socket) -> int:
+    """Answer a client's HELLO with the highest version we share, raising WireVersionError if there's none."""
+    hello = bytearray(HELLO.size)
+    if not _recv_exactly(sock, memoryview(hello)):
+        raise WireVersionError("Client closed the stream during the handshake")
+    magic, lowest, highest = HELLO.unpack(hello)
+    shared = [version for version in FRAMES if lowest <= version <= highest] if magic == MAGIC else []
+    version = max(shared, default=0)
+    sock.sendall(WELCOME.pack(MAGIC, version))
+    if not version:
+        raise WireVersionError(f"Client offered {bytes(hello)!r}, which shares no version with {sorted(FRAMES)}")
+    return version
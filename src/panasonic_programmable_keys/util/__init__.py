@@ -1,7 +1,23 @@
+from .config import SettingsDiff
 from .config import SettingsHotReloader
+from .config import SettingsSnapshot
+from .config import current_settings
+from .config import on_reload
+from .config import reload_settings
 from .config import settings
 from .helpers import Truthy
 from .logging import logger
 from .logging import make_logger
 
-__all__ = ["logger", "make_logger", "settings", "SettingsHotReloader", "Truthy"]
+__all__ = [
+    "current_settings",
+    "logger",
+    "make_logger",
+    "on_reload",
+    "reload_settings",
+    "settings",
+    "SettingsDiff",
+    "SettingsHotReloader",
+    "SettingsSnapshot",
+    "Truthy",
+]
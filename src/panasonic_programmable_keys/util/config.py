@@ -1,10 +1,24 @@
+import hashlib
 import os
+import threading
 from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Set
+from typing import Tuple
 
 from dynaconf import Dynaconf
-from watchdog.events import FileDeletedEvent
-from watchdog.events import FileModifiedEvent
-from watchdog.events import FileMovedEvent
+from watchdog.events import EVENT_TYPE_CLOSED
+from watchdog.events import EVENT_TYPE_CREATED
+from watchdog.events import EVENT_TYPE_DELETED
+from watchdog.events import EVENT_TYPE_MODIFIED
+from watchdog.events import EVENT_TYPE_MOVED
 from watchdog.events import FileSystemEvent
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers.inotify import InotifyObserver
@@ -40,33 +54,261 @@ else:
     )
 
 
+class SettingsDiff(NamedTuple):
+    """How the settings changed across a reload, by dotted lowercase key, such as keyboard.key_macro1."""
+
+    added: Dict[str, Any]
+    removed: Dict[str, Any]
+    # Old and new values
+    changed: Dict[str, Tuple[Any, Any]]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    @property
+    def keys(self) -> Set[str]:
+        return self.added.keys() | self.removed.keys() | self.changed.keys()
+
+    def touches(self, *prefixes: str) -> bool:
+        """Whether any key at or under one of the dotted prefixes changed, such as input or input.discovery."""
+        return any(key == prefix or key.startswith(f"{prefix}.") for key in self.keys for prefix in prefixes)
+
+
+def _flatten(values: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, Any]]:
+    for key, value in values.items():
+        key = f"{prefix}{key.lower()}"
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, f"{key}.")
+        else:
+            yield key, value
+
+
+def settings_diff(before: Dict[str, Any], after: Dict[str, Any]) -> SettingsDiff:
+    """The difference between two snapshots of the settings, as returned by settings.as_dict()."""
+    old = dict(_flatten(before))
+    new = dict(_flatten(after))
+    return SettingsDiff(
+        added={key: new[key] for key in new.keys() - old.keys()},
+        removed={key: old[key] for key in old.keys() - new.keys()},
+        changed={key: (old[key], new[key]) for key in old.keys() & new.keys() if old[key] != new[key]},
+    )
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return FrozenSettings(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_freeze, value))
+    return value
+
+
+class FrozenSettings(Mapping[str, Any]):
+    """A read-only section of a settings snapshot, read by key or as attributes like dynaconf's settings.
+
+    Keys are looked up as given first and then ignoring case, as dynaconf's boxes do, so that values set from the
+    environment, which arrive lowercase, are found by the names they're written with in the config files.
+    """
+
+    __slots__ = ("_values", "_keys")
+
+    def __init__(self, values: Mapping[str, Any]) -> None:
+        frozen = {key: _freeze(value) for key, value in values.items()}
+        keys: Dict[str, str] = {}
+        for key in frozen:
+            keys.setdefault(key.lower(), key)
+        object.__setattr__(self, "_values", frozen)
+        object.__setattr__(self, "_keys", keys)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            if not isinstance(key, str) or key.lower() not in self._keys:
+                raise
+            return self._values[self._keys[key.lower()]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Settings snapshots are read-only, unable to set {name}")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._values!r})"
+
+
+class SettingsSnapshot(FrozenSettings):
+    """The settings as they were after one load, numbered in the order the snapshots were published.
+
+    Sections are lowercase, as they're written in the config files, and lists are tuples.
+    """
+
+    __slots__ = ("version",)
+
+    def __init__(self, values: Mapping[str, Any], version: int) -> None:
+        super().__init__({key.lower(): value for key, value in values.items()})
+        object.__setattr__(self, "version", version)
+
+
+# The latest snapshot, replaced whole so that readers need no lock and never see a reload partway through
+_current: SettingsSnapshot | None = None
+_publish_lock = threading.Lock()
+
+
+def current_settings() -> SettingsSnapshot:
+    """The latest snapshot of the settings, taken on first use and replaced by every reload that changes them.
+
+    Changes made to settings in place aren't seen until publish_settings() is called.
+    """
+    global _current
+    current = _current
+    if current is not None:
+        return current
+    with _publish_lock:
+        if _current is None:
+            _current = SettingsSnapshot(settings.as_dict(), 1)
+        return _current
+
+
+def publish_settings(values: Dict[str, Any] | None = None) -> SettingsSnapshot:
+    """Replace the current snapshot with one of values, as returned by settings.as_dict(), or of the settings now."""
+    global _current
+    snapshot = SettingsSnapshot(settings.as_dict() if values is None else values, 0)
+    with _publish_lock:
+        object.__setattr__(snapshot, "version", 1 if _current is None else _current.version + 1)
+        _current = snapshot
+    return snapshot
+
+
+def changed_since(version: int) -> bool:
+    """Whether the settings were published again since the snapshot numbered version."""
+    return current_settings().version != version
+
+
+# Called, in order, with what changed after every reload of the settings that changed something
+reload_callbacks: List[Callable[[SettingsDiff], Any]] = []
+_reload_lock = threading.Lock()
+
+
+def on_reload(callback: Callable[[SettingsDiff], Any]) -> Callable[[SettingsDiff], Any]:
+    """Register callback to be run with what changed after the settings are hot reloaded."""
+    reload_callbacks.append(callback)
+    return callback
+
+
+def reload_settings() -> SettingsDiff:
+    """Reload the settings, and run the on_reload callbacks if that changed any of them."""
+    with _reload_lock:
+        before = settings.as_dict()
+        settings.reload()
+        after = settings.as_dict()
+        diff = settings_diff(before, after)
+        if not diff:
+            logger.debug("Reloaded settings, nothing changed")
+            return diff
+        # Callbacks, and anything reading the settings from here on, see the new snapshot
+        snapshot = publish_settings(after)
+        logger.info(f"Reloaded settings to version {snapshot.version}, changing {', '.join(sorted(diff.keys))}")
+        for callback in list(reload_callbacks):
+            try:
+                callback(diff)
+            except Exception as e:
+                logger.error(f"Settings reload callback {callback} failed: {e}")
+        return diff
+
+
+def _digest(path: Path) -> bytes | None:
+    try:
+        return hashlib.blake2b(path.read_bytes(), digest_size=16).digest()
+    except OSError:
+        return None
+
+
 class SettingsHotReloader:
+    """Reloads the settings when one of the config files they include is changed, created or removed.
+
+    The directories holding the files are watched, rather than the files themselves, so that files created after
+    startup are picked up and files replaced by a rename keep being followed. Events are coalesced until none have
+    arrived for a debounce window, so an editor's write, rename and chmod make one reload, and the settings are only
+    reloaded when the content of a file actually changed.
+    """
+
     class SettingsEventHandler(FileSystemEventHandler):
-        @staticmethod
-        def _meaningful_event(event: FileSystemEvent) -> bool:
-            if isinstance(event, FileModifiedEvent):
-                return True
-            if isinstance(event, FileDeletedEvent):
-                return True
-            if isinstance(event, FileMovedEvent):
-                return True
-            return False
+        # Reads, our own included, are not changes
+        meaningful_events = {
+            EVENT_TYPE_CLOSED,
+            EVENT_TYPE_CREATED,
+            EVENT_TYPE_DELETED,
+            EVENT_TYPE_MODIFIED,
+            EVENT_TYPE_MOVED,
+        }
+
+        def __init__(self, reloader: "SettingsHotReloader") -> None:
+            self.reloader = reloader
 
         def on_any_event(self, event: FileSystemEvent) -> None:
-            if self._meaningful_event(event):
-                logger.debug(f"Reloading config due to {event}")
-                settings.reload()
-            else:
-                logger.debug(f"Recording unmeaningful envent: {event}")
-
-    def __init__(self) -> None:
-        self.event_handler = self.SettingsEventHandler()
+            if event.event_type not in self.meaningful_events:
+                return
+            paths = {Path(os.fsdecode(event.src_path))}
+            if event.dest_path:
+                paths.add(Path(os.fsdecode(event.dest_path)))
+            if event.is_directory:
+                # A directory on the way to a config file may have appeared, which can be watched instead
+                if any(path in config.parents for path in paths for config in self.reloader.configs):
+                    self.reloader.watch()
+                    # A config file may have been written into it before the watch started
+                    self.reloader.changed()
+            elif paths & self.reloader.configs:
+                logger.debug(f"Config changed: {event}")
+                self.reloader.changed()
+
+    def __init__(self, configs: Iterable[Path] | None = None, debounce: float | None = None) -> None:
+        self.configs = set(include_configs if configs is None else configs)
+        self.debounce = settings.hot_reload.debounce if debounce is None else debounce
+        self.digests = {config: _digest(config) for config in self.configs}
+        self.event_handler = self.SettingsEventHandler(self)
         self.observer = InotifyObserver()
-        self.observed = []
-        for config in include_configs:
-            if config.exists():
-                self.observed.append(config)
-                self.observer.schedule(self.event_handler, str(config))
+        self.observed: List[Path] = []
+        self.timer: threading.Timer | None = None
+        self.lock = threading.Lock()
+        self.watch()
+
+    def watch(self) -> None:
+        """Watch the closest existing directory to each config file, if it isn't already."""
+        for config in sorted(self.configs):
+            directory = next(parent for parent in config.parents if parent.is_dir())
+            with self.lock:
+                if directory in self.observed:
+                    continue
+                self.observed.append(directory)
+            self.observer.schedule(self.event_handler, str(directory))
+
+    def changed(self) -> None:
+        """Check the config files once debounce seconds have passed without another change."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce, self.settle)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def settle(self) -> SettingsDiff | None:
+        """Reload the settings if any of the config files' content changed since they were last loaded."""
+        digests = {config: _digest(config) for config in self.configs}
+        if digests == self.digests:
+            logger.debug("Config files unchanged, not reloading")
+            return None
+        self.digests = digests
+        return reload_settings()
 
     def __enter__(self) -> None:
         logger.info(f"Watching {self.observed} for updates")
@@ -75,3 +317,6 @@ class SettingsHotReloader:
     def __exit__(self, *_) -> None:
         self.observer.stop()
         self.observer.join()
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
@@ -0,0 +1,25 @@
+import time
+
+
+class TokenBucket:
+    """Allows bursts of up to burst events, refilling at rate events per second.
+
+    Times are in seconds and only ever compared with each other, so callers may pass their own clock's readings.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None, now: float | None = None) -> None:
+        self.rate = rate
+        self.burst = max(1.0, rate if burst is None else burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now: float | None = None) -> bool:
+        """Take a token if there's one available, returning whether there was."""
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
@@ -1,8 +1,8 @@
-import os
 import shlex
 import subprocess
-from typing import Dict
 from typing import Iterable
+from typing import Mapping
+from typing import Sequence
 
 from .helpers import merge
 from .logging import logger
@@ -29,18 +29,21 @@ def _utf8ify(line_bytes: bytes | None = None) -> str:
 
 
 def shell(
-    cmd: str = "",
+    cmd: str | Sequence[str] = "",
     fail: bool = True,
     stderr: int | None = subprocess.STDOUT,
-    env: Dict[str, str] = os.environ.copy(),
+    env: Mapping[str, str] | None = None,
 ) -> Iterable[str]:
     """Run a command in a subprocess, yielding lines of output from it.
+    The command may be a string to be split like a shell would, or an
+    already split argument list.
     By default will throw an Exception depending on  the return code of the
     command. To change this behavior, pass fail=False.
+    The command inherits our environment unless env is given.
     """
     logger.debug("Running: {}".format(cmd))
     proc = subprocess.Popen(
-        shlex.split(cmd),  # nosec
+        shlex.split(cmd) if isinstance(cmd, str) else list(cmd),  # nosec
         stdout=subprocess.PIPE,
         stderr=stderr,
         env=env,
@@ -64,7 +67,7 @@ def shellw(
     cmd: str = "",
     fail: bool = True,
     stderr: int | None = subprocess.STDOUT,
-    env: Dict[str, str] = os.environ.copy(),
+    env: Mapping[str, str] | None = None,
 ) -> str:
     """Run a command in a subprocess, wait for it to finish, return all
     lines from it as a single string."""
@@ -0,0 +1,87 @@
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from panasonic_programmable_keys.input import CapturedEvent
+from panasonic_programmable_keys.input.capture import INPUT_EVENT
+from panasonic_programmable_keys.input.ecodes import EV_KEY
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.rpc.broadcast import Backpressure
+from panasonic_programmable_keys.rpc.broadcast import EventBroadcaster
+from panasonic_programmable_keys.rpc.broadcast import SubscriberDisconnected
+
+source = Path("/dev/input/event99")
+
+
+def captured(n: int) -> CapturedEvent:
+    return CapturedEvent(float(n), source, KEY_EVENTS[0x290 + n % 12][1])
+
+
+def test_subscribers_share_one_stream():
+    """Ensure every subscriber sees every event, in order, from its own cursor."""
+    broadcaster = EventBroadcaster([], capacity=8)
+    first = broadcaster.subscribe()
+    broadcaster.publish([captured(0), captured(1)])
+    second = broadcaster.subscribe()
+    broadcaster.publish([captured(2)])
+    assert first.get(timeout=0) == [captured(0), captured(1), captured(2)]
+    assert second.get(timeout=0) == [captured(2)]
+    assert first.get(timeout=0) == []
+
+
+def test_drop_oldest():
+    broadcaster = EventBroadcaster([], capacity=4, policy=Backpressure.drop_oldest)
+    slow = broadcaster.subscribe()
+    fast = broadcaster.subscribe()
+    for n in range(10):
+        broadcaster.publish([captured(n)])
+        assert fast.get(timeout=0) == [captured(n)]
+    assert slow.get(timeout=0) == [captured(n) for n in range(6, 10)]
+    assert slow.dropped == 6
+
+
+def test_drop_newest():
+    broadcaster = EventBroadcaster([], capacity=4, policy=Backpressure.drop_newest)
+    slow = broadcaster.subscribe()
+    broadcaster.publish([captured(n) for n in range(10)])
+    assert slow.get(timeout=0) == [captured(n) for n in range(4)]
+    assert slow.dropped == 6
+    broadcaster.publish([captured(10)])
+    assert slow.get(timeout=0) == [captured(10)]
+
+
+def test_disconnect():
+    broadcaster = EventBroadcaster([], capacity=4, policy=Backpressure.disconnect)
+    slow = broadcaster.subscribe()
+    fast = broadcaster.subscribe()
+    broadcaster.publish([captured(n) for n in range(4)])
+    assert fast.get(timeout=0) == [captured(n) for n in range(4)]
+    broadcaster.publish([captured(4)])
+    with pytest.raises(SubscriberDisconnected):
+        slow.get(timeout=0)
+    assert fast.get(timeout=0) == [captured(4)]
+    assert broadcaster.subscribers == [fast]
+
+
+def test_reader_thread(tmp_path):
+    """Ensure the reader thread publishes device events and ends subscriptions when the device goes away."""
+    fifo = tmp_path.joinpath("event3")
+    os.mkfifo(fifo)
+    broadcaster = EventBroadcaster([fifo])
+    subscriptions = [broadcaster.subscribe() for _ in range(3)]
+    received: list[list] = [[] for _ in subscriptions]
+    readers = [
+        threading.Thread(target=lambda s=s, r=r: r.extend(e.event for e in s)) for s, r in zip(subscriptions, received)
+    ]
+    broadcaster.start()
+    for reader in readers:
+        reader.start()
+    writer = os.open(fifo, os.O_WRONLY)
+    os.write(writer, INPUT_EVENT.pack(1, 0, EV_KEY, 0x293, 1) + INPUT_EVENT.pack(1, 0, EV_KEY, 0x293, 0))
+    os.close(writer)
+    for reader in readers:
+        reader.join(timeout=5)
+    broadcaster.stop()
+    assert received == [[KEY_EVENTS[0x293][1], KEY_EVENTS[0x293][0]]] * 3
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+from panasonic_programmable_keys.input import EventMultiplexer
+from panasonic_programmable_keys.input import async_yield_from
+from panasonic_programmable_keys.input import decode_events
+from panasonic_programmable_keys.input import read_events
+from panasonic_programmable_keys.input.capture import INPUT_EVENT
+from panasonic_programmable_keys.input.capture import INPUT_EVENT_SIZE
+from panasonic_programmable_keys.input.ecodes import EV_KEY
+from panasonic_programmable_keys.input.ecodes import EV_MSC
+from panasonic_programmable_keys.input.ecodes import EV_SYN
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.models import KeyPressEvent
+from panasonic_programmable_keys.input.models import KeyPressEventType
+from panasonic_programmable_keys.util import settings
+
+press = [
+    (1, 100, EV_MSC, 4, 0x290),
+    (1, 100, EV_KEY, 0x290, 1),
+    (1, 100, EV_SYN, 0, 0),
+    (1, 200, EV_MSC, 4, 0x290),
+    (1, 200, EV_KEY, 0x290, 0),
+    (1, 200, EV_SYN, 0, 0),
+]
+
+
+class TrickleFile(io.RawIOBase):
+    """A file that returns at most `chunk` bytes per read, like a slow or partial reader."""
+
+    def __init__(self, data: bytes, chunk: int) -> None:
+        self.data = data
+        self.chunk = chunk
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.chunk, len(self.data))
+        buffer[:size] = self.data[:size]
+        self.data = self.data[size:]
+        return size
+
+
+def test_input_event_size():
+    """Ensure the record size follows the native input_event layout."""
+    assert INPUT_EVENT_SIZE == INPUT_EVENT.size
+    assert INPUT_EVENT_SIZE in (16, 24)
+
+
+@pytest.mark.parametrize("batch", [1, 2, 4, 64])
+def test_read_events_batches(batch):
+    """Ensure records are decoded identically regardless of batch size."""
+    data = b"".join(INPUT_EVENT.pack(*record) for record in press)
+    assert list(read_events(io.BytesIO(data), batch=batch)) == press
+
+
+@pytest.mark.parametrize("chunk", [1, 7, INPUT_EVENT_SIZE - 1, INPUT_EVENT_SIZE + 5])
+def test_read_events_partial_reads(chunk):
+    """Ensure records split across reads are reassembled."""
+    data = b"".join(INPUT_EVENT.pack(*record) for record in press)
+    assert list(read_events(TrickleFile(data, chunk), batch=4)) == press
+
+
+def test_decode_events_filters_and_interns():
+    """Ensure only macro key records are decoded, and that decoding returns the interned events."""
+    unknown = [(1, 300, EV_KEY, 0x1E, 1), (1, 300, EV_KEY, 0x290, 7)]
+    events = list(decode_events(press + unknown))
+    assert [(e.descriptor, e.type) for e in events] == [
+        (KeyPressDescriptor.KEY_MACRO1, KeyPressEventType.press),
+        (KeyPressDescriptor.KEY_MACRO1, KeyPressEventType.release),
+    ]
+    assert events[0] is KEY_EVENTS[0x290][1]
+    assert events[1] is KEY_EVENTS[0x290][0]
+
+
+def test_key_events_validate_at_the_boundary():
+    """Ensure every interned event converts to the same validated KeyPressEvent."""
+    for values in KEY_EVENTS.values():
+        for event in values.values():
+            model = KeyPressEvent(**event._asdict())
+            assert (model.descriptor, model.type) == event
+
+
+@pytest.fixture
+def fifos(tmp_path):
+    """Make a pair of FIFOs standing in for two event handlers of the same device."""
+    paths = [tmp_path.joinpath("event3"), tmp_path.joinpath("event7")]
+    for path in paths:
+        os.mkfifo(path)
+    return paths
+
+
+def test_multiplexer_merges_sources(fifos):
+    """Ensure events from several devices are merged in timestamp order and keep their source."""
+    with EventMultiplexer(fifos) as multiplexer:
+        writers = [os.open(path, os.O_WRONLY) for path in fifos]
+        os.write(writers[0], INPUT_EVENT.pack(5, 0, EV_KEY, 0x290, 1) + INPUT_EVENT.pack(5, 0, EV_SYN, 0, 0))
+        os.write(writers[1], INPUT_EVENT.pack(4, 500_000, EV_KEY, 0x291, 1) + INPUT_EVENT.pack(6, 0, EV_KEY, 0x291, 0))
+        events = []
+        while len(events) < 3:
+            events.extend(multiplexer.poll(timeout=1))
+        for writer in writers:
+            os.close(writer)
+        assert list(multiplexer) == []
+        assert multiplexer.sources == {}
+
+    assert [(e.time, e.source, e.event) for e in events] == [
+        (4.5, fifos[1], KEY_EVENTS[0x291][1]),
+        (5.0, fifos[0], KEY_EVENTS[0x290][1]),
+        (6.0, fifos[1], KEY_EVENTS[0x291][0]),
+    ]
+
+
+def test_multiplexer_poll_timeout(fifos):
+    with EventMultiplexer(fifos[:1]) as multiplexer:
+        writer = os.open(fifos[0], os.O_WRONLY)
+        assert multiplexer.poll(timeout=0.01) == []
+        os.close(writer)
+
+
+def test_async_yield_from(fifos, monkeypatch):
+    """Ensure the async reader yields events as they're written and stops when the devices close."""
+    monkeypatch.setitem(settings.input, "check_paths", False)
+
+    async def consume():
+        return [captured.event async for captured in async_yield_from(fifos[:1], timeout=1)]
+
+    async def produce_and_consume():
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        writer = os.open(fifos[0], os.O_WRONLY)
+        os.write(writer, INPUT_EVENT.pack(1, 0, EV_MSC, 4, 0x292) + INPUT_EVENT.pack(1, 0, EV_KEY, 0x292, 1))
+        await asyncio.sleep(0.01)
+        os.write(writer, INPUT_EVENT.pack(2, 0, EV_KEY, 0x292, 0))
+        os.close(writer)
+        return await consumer
+
+    assert asyncio.run(produce_and_consume()) == [KEY_EVENTS[0x292][1], KEY_EVENTS[0x292][0]]
+
+
+def test_async_yield_from_timeout(fifos, monkeypatch):
+    """Ensure a quiet device times out and releases its readers."""
+    monkeypatch.setitem(settings.input, "check_paths", False)
+
+    async def consume():
+        watched = asyncio.get_running_loop()._selector.get_map()  # type: ignore[attr-defined]
+        before = len(watched)
+        events = async_yield_from(fifos[:1], timeout=0.01)
+        with pytest.raises(TimeoutError):
+            await anext(events)
+        return before, len(watched)
+
+    before, after = asyncio.run(consume())
+    assert before == after
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import pytest
+from dynaconf import Dynaconf
+
+from panasonic_programmable_keys.util import config
+from panasonic_programmable_keys.util.config import SettingsHotReloader
+from panasonic_programmable_keys.util.config import SettingsSnapshot
+from panasonic_programmable_keys.util.config import changed_since
+from panasonic_programmable_keys.util.config import current_settings
+from panasonic_programmable_keys.util.config import settings_diff
+
+
+def test_settings_diff():
+    before = {"KEYBOARD": {"enabled_keys": [], "KEY_MACRO1": "true"}, "INPUT": {"grab": False, "mask": True}}
+    after = {"KEYBOARD": {"enabled_keys": ["KEY_MACRO2"], "KEY_MACRO2": "false"}, "INPUT": {"grab": False}}
+    diff = settings_diff(before, after)
+    assert diff.added == {"keyboard.key_macro2": "false"}
+    assert diff.removed == {"keyboard.key_macro1": "true", "input.mask": True}
+    assert diff.changed == {"keyboard.enabled_keys": ([], ["KEY_MACRO2"])}
+    assert diff.touches("input") and diff.touches("keyboard.key_macro1") and not diff.touches("input.grab", "key")
+    assert not settings_diff(before, before)
+
+
+@pytest.fixture
+def reloads(tmp_path, monkeypatch):
+    """The diffs of every reload of settings including a config.toml in a directory of tmp_path yet to be made."""
+    path = tmp_path.joinpath("panasonic", "config.toml")
+    settings = Dynaconf(core_loaders=["TOML"], settings_files=[config.default_config], includes=[path])
+    # Load them before there's anything to include, as they would be at startup
+    settings.as_dict()
+    monkeypatch.setattr(config, "settings", settings)
+    diffs: list = []
+    monkeypatch.setattr(config, "reload_callbacks", [diffs.append])
+    reload_settings = config.reload_settings
+    monkeypatch.setattr(config, "reload_settings", lambda: diffs.append("reload") or reload_settings())
+    with SettingsHotReloader([path], debounce=0.05):
+        yield path, diffs
+
+
+def settled(diffs: list, count: int) -> list:
+    start = time.monotonic()
+    while len(diffs) < count:
+        assert time.monotonic() - start < 2, f"only {diffs}"
+        time.sleep(0.01)
+    # Nothing more is on the way
+    time.sleep(0.2)
+    return diffs
+
+
+def test_hot_reload(reloads):
+    """Ensure a file created after startup and saved the way editors do is loaded once, and only when it changes."""
+    path, diffs = reloads
+    path.parent.mkdir()
+    path.with_suffix(".tmp").write_text('[keyboard]\nenabled_keys = []\nKEY_MACRO1 = "true"\n')
+    os.rename(path.with_suffix(".tmp"), path)
+    os.chmod(path, 0o644)
+    reload, diff = settled(diffs, 2)
+    assert reload == "reload"
+    assert diff.added == {"keyboard.key_macro1": "true"}
+    # Rewriting the same content isn't a change
+    path.write_text(path.read_text())
+    path.touch()
+    assert settled(diffs, 2) == ["reload", diff]
+    # Nor is a change that leaves the settings as they were
+    path.write_text('# Comment\n[keyboard]\nenabled_keys = []\nKEY_MACRO1 = "true"\n')
+    assert settled(diffs, 3)[2:] == ["reload"]
+    path.unlink()
+    assert settled(diffs, 5)[3:] == ["reload", config.SettingsDiff({}, {"keyboard.key_macro1": "true"}, {})]
+
+
+def test_snapshot_is_frozen():
+    snapshot = SettingsSnapshot({"KEYBOARD": {"enabled_keys": ["KEY_MACRO1"]}}, 3)
+    assert snapshot.keyboard.enabled_keys == ("KEY_MACRO1",)
+    assert snapshot["keyboard"].get("KEY_MACRO1", "") == ""
+    with pytest.raises(TypeError):
+        snapshot.keyboard["KEY_MACRO1"] = "true"  # type: ignore[index]
+    with pytest.raises(AttributeError):
+        snapshot.version = 4
+    with pytest.raises(AttributeError):
+        snapshot.input
+
+
+def test_snapshots_under_reloads(tmp_path, monkeypatch):
+    """Hammer reloads while reading, ensuring every snapshot read is one whole load and versions never go back."""
+    path = tmp_path.joinpath("config.toml")
+
+    def write(n: int) -> None:
+        path.with_suffix(".tmp").write_text(f'[keyboard]\nKEY_MACRO1 = "{n}"\n[rpc]\nbuffer_size = {n}\n')
+        os.rename(path.with_suffix(".tmp"), path)
+
+    write(0)
+    monkeypatch.setattr(config, "settings", Dynaconf(core_loaders=["TOML"], includes=[path]))
+    monkeypatch.setattr(config, "_current", None)
+    monkeypatch.setattr(config, "reload_callbacks", [])
+    first = current_settings()
+    assert first.version == 1 and not changed_since(1)
+    stop = threading.Event()
+    failures: list = []
+
+    def reload() -> None:
+        for n in range(1, 50):
+            write(n)
+            config.reload_settings()
+        stop.set()
+
+    def read() -> None:
+        version = 0
+        while not stop.is_set():
+            snapshot = current_settings()
+            if snapshot.version < version or snapshot.keyboard.KEY_MACRO1 != str(snapshot.rpc.buffer_size):
+                failures.append(snapshot)
+            version = snapshot.version
+
+    threads = [threading.Thread(target=read) for _ in range(4)] + [threading.Thread(target=reload)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not failures
+    last = current_settings()
+    assert last.keyboard.KEY_MACRO1 == "49" and last.version == 50
+    assert changed_since(first.version)
+    # The snapshot readers already held is untouched
+    assert first.rpc.buffer_size == 0
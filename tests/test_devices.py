@@ -0,0 +1,78 @@
+import shutil
+
+import pytest
+
+from panasonic_programmable_keys.input import devices
+from panasonic_programmable_keys.input import is_panasonic_keyboard
+from panasonic_programmable_keys.input import panasonic_keyboard_devices
+from panasonic_programmable_keys.input.models import DeviceRecord
+from panasonic_programmable_keys.util import settings
+
+from .example_devices import valid_devices
+
+settings.input["check_paths"] = False
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A copy of the FZ-40's device list standing in for /proc/bus/input/devices, with the cache emptied around it."""
+    path = tmp_path.joinpath("devices")
+    shutil.copy(valid_devices[0], path)
+    monkeypatch.setattr(devices, "DEVICES_PATH", path)
+    devices.invalidate()
+    yield path
+    devices.invalidate()
+
+
+def test_unchanged_source_is_cached(source, monkeypatch):
+    """Ensure repeated lookups share one table, without parsing or validating anything again."""
+    table = devices.device_table()
+    keyboards = table.devices(where=is_panasonic_keyboard).devices
+    monkeypatch.setattr(devices, "parse_devices", lambda _: pytest.fail("parsed again"))
+    monkeypatch.setattr(DeviceRecord, "model", lambda _: pytest.fail("validated again"))
+    assert devices.device_table(source) is table
+    assert panasonic_keyboard_devices() == keyboards
+    assert devices.device_table().devices(where=is_panasonic_keyboard).devices[0] is keyboards[0]
+
+
+def test_changed_source_is_read_again(source):
+    changes = []
+    devices.on_devices_changed(changes.append)
+    try:
+        before = devices.device_table()
+        keyboard = before.records.index(next(filter(is_panasonic_keyboard, before.records)))
+        # Unplugging a device changes the contents, though not necessarily the size or modification time
+        entries = source.read_text().split("\n\n")
+        source.write_text("\n\n".join(entries[:keyboard] + entries[keyboard + 1 :]))
+        after = devices.device_table()
+        assert after is not before
+        assert len(after) == len(before) - 1
+        assert changes == [before, after]
+        assert panasonic_keyboard_devices() == []
+    finally:
+        devices._listeners.remove(changes.append)
+
+
+def test_invalidate(source):
+    table = devices.device_table()
+    devices.invalidate(source)
+    assert devices.device_table() is not table
+
+
+def test_devices_are_validated_lazily(source):
+    table = devices.device_table()
+    assert table.names[0] == "Lid Switch"
+    assert table._models == [None] * len(table)
+    table.devices(where=is_panasonic_keyboard)
+    assert sum(model is not None for model in table._models) == 1
+    assert table.devices() is table.devices()
+
+
+def test_check_paths_changed_in_place(source, monkeypatch):
+    """Ensure models validated without checking paths aren't reused once checking is switched on in place."""
+    table = devices.device_table()
+    monkeypatch.setitem(settings.input, "check_paths", True)
+    checked = devices.device_table()
+    assert checked is not table and checked.check_paths
+    monkeypatch.setitem(settings.input, "check_paths", False)
+    assert not devices.device_table().check_paths
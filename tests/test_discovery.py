@@ -0,0 +1,133 @@
+import fcntl
+import os
+from pathlib import Path
+
+import pytest
+
+from panasonic_programmable_keys.input import devices
+from panasonic_programmable_keys.input import evdev
+from panasonic_programmable_keys.input import is_panasonic_keyboard
+from panasonic_programmable_keys.input.discovery import scan_devices
+from panasonic_programmable_keys.input.models import NON_DEVICE_HANDLERS
+from panasonic_programmable_keys.input.models import DeviceRecord
+from panasonic_programmable_keys.input.models import InputDevices
+from panasonic_programmable_keys.util import settings
+
+from .example_devices import valid_devices
+
+settings.input["check_paths"] = False
+
+
+def bitmap_bytes(text: str, size: int) -> bytes:
+    """The kernel's bitmap behind a /proc bitmap's text."""
+    words = [int(word, 16) for word in reversed(text.split())]
+    data = b"".join(word.to_bytes(evdev.LONG_SIZE, "little") for word in words)
+    return data[:size].ljust(size, b"\0")
+
+
+class FakeKernel:
+    """Answers evdev ioctls on the nodes of a fake /dev/input from the records of a /proc device list."""
+
+    def __init__(self, root: Path, records: list[DeviceRecord]) -> None:
+        self.nodes = root.joinpath("dev", "input")
+        self.sysfs = root.joinpath("sys")
+        self.nodes.mkdir(parents=True)
+        self.records: dict[str, DeviceRecord] = {}
+        for record in records:
+            handlers = record.handlers.split()
+            node = next(handler for handler in handlers if handler.startswith("event"))
+            self.records[node] = record
+            self.nodes.joinpath(node).touch()
+            device = self.sysfs.joinpath(record.sys.lstrip("/"))
+            for handler in handlers:
+                if handler not in NON_DEVICE_HANDLERS:
+                    device.joinpath(handler).mkdir(parents=True)
+            link = self.sysfs.joinpath("class", "input", node)
+            link.mkdir(parents=True)
+            link.joinpath("device").symlink_to(device)
+
+    def ioctl(self, fd, request, arg=0, *_):
+        record = self.records[Path(os.readlink(f"/proc/self/fd/{fd}")).name]
+        bitmaps = dict(record.bitmaps)
+        size = (request >> 16) & 0x3FFF
+        strings = {evdev.EVIOCGNAME(size): record.name.strip('"'), evdev.EVIOCGPHYS(size): record.phys}
+        strings[evdev.EVIOCGUNIQ(size)] = record.uniq
+        if request == evdev.EVIOCGID:
+            ids = dict(pair.split("=") for pair in record.id.split())
+            data = evdev.INPUT_ID.pack(*(int(ids[field], 16) for field in ("Bus", "Vendor", "Product", "Version")))
+        elif request in strings:
+            if not strings[request]:
+                raise FileNotFoundError(2, "No such file or directory")
+            data = strings[request].encode() + b"\0"
+        elif request == evdev.EVIOCGPROP(size):
+            data = bitmap_bytes(bitmaps["prop"], size)
+        else:
+            names = {evdev.EVIOCGBIT(ev_type, size): name for ev_type, name in [(0, "ev"), (1, "key"), (4, "msc")]}
+            names[evdev.EVIOCGBIT(0x11, size)] = "led"
+            data = bitmap_bytes(bitmaps[names[request]], size)
+        arg[: len(data)] = data
+        return len(data)
+
+
+@pytest.fixture
+def kernel(tmp_path, monkeypatch):
+    records = list(InputDevices.records(valid_devices[0]))
+    kernel = FakeKernel(tmp_path, records)
+    monkeypatch.setattr(fcntl, "ioctl", kernel.ioctl)
+    return kernel
+
+
+def test_ioctl_numbers():
+    """Ensure the ioctl request numbers match linux/input.h."""
+    assert evdev.EVIOCGID == 0x80084502
+    assert evdev.EVIOCGNAME(256) == 0x81004506
+    assert evdev.EVIOCGBIT(0x01, 96) == 0x80604521
+
+
+def test_bitmap_text():
+    assert evdev.bitmap_text(bytes(8)) == "0"
+    assert evdev.bitmap_text(bitmap_bytes("402000000 3803078f800d001 feffffdfffefffff 0", 96)) == (
+        "402000000 3803078f800d001 feffffdfffefffff 0"
+    )
+
+
+def test_scan_matches_proc(kernel):
+    """Ensure querying the nodes produces the same devices as /proc, apart from handlers without nodes."""
+    scanned = [record.model() for record in scan_devices(kernel.nodes, kernel.sysfs)]
+    parsed = InputDevices.load(valid_devices[0]).devices
+    assert len(scanned) == len(parsed)
+    for ours, theirs in zip(sorted(scanned, key=lambda d: d.sys), sorted(parsed, key=lambda d: d.sys)):
+        assert ours.model_dump(exclude={"handlers"}) == theirs.model_dump(exclude={"handlers"})
+        assert [h.name for h in ours.handlers] == [h.name for h in theirs.handlers if h.name not in NON_DEVICE_HANDLERS]
+
+
+def test_discovery_setting(kernel, monkeypatch):
+    """Ensure the ioctl backend is used for the default device table when selected, and finds the keyboard."""
+    monkeypatch.setitem(settings.input, "discovery", "ioctl")
+    monkeypatch.setattr(devices, "NODES_PATH", kernel.nodes)
+    monkeypatch.setattr(devices, "SYSFS_PATH", kernel.sysfs)
+    devices.invalidate()
+    try:
+        table = devices.device_table()
+        assert table.source == kernel.nodes
+        assert devices.device_table() is table
+        (keyboard,) = table.devices(where=is_panasonic_keyboard).devices
+        assert keyboard.phys == "panasonic/hkey0"
+    finally:
+        devices.invalidate()
+
+
+def test_discovery_falls_back_to_proc(monkeypatch):
+    """Ensure nodes that can't be opened lead to reading /proc, rather than a table missing devices."""
+
+    def scan_devices(*_):
+        raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setitem(settings.input, "discovery", "ioctl")
+    monkeypatch.setattr(devices, "scan_devices", scan_devices)
+    monkeypatch.setattr(devices, "DEVICES_PATH", valid_devices[0])
+    devices.invalidate()
+    try:
+        assert devices.device_table().source == valid_devices[0]
+    finally:
+        devices.invalidate()
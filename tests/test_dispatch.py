@@ -0,0 +1,87 @@
+import shutil
+
+from dynaconf import Dynaconf
+
+from panasonic_programmable_keys.input.dispatch import Dispatcher
+from panasonic_programmable_keys.input.dispatch import DispatchTable
+from panasonic_programmable_keys.input.dispatch import Overlap
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.models import KeyPressEvent
+from panasonic_programmable_keys.util import SettingsSnapshot
+from panasonic_programmable_keys.util import settings
+from panasonic_programmable_keys.util.config import default_config
+
+keyboard = {
+    "enabled_keys": ["KEY_MACRO1", "KEY_MACRO2", "KEY_MACRO3", "KEY_BOGUS"],
+    "KEY_MACRO1": "echo 'hello world'",
+    "KEY_MACRO2": "",
+    "KEY_MACRO3": "definitely-not-a-real-command --flag",
+    "KEY_MACRO4": "echo not enabled",
+}
+
+
+def test_compile():
+    """Ensure commands are split and resolved ahead of time, and only enabled keys with commands get actions."""
+    table = DispatchTable.compile(keyboard)
+    assert set(table.actions) == {0x290, 0x292}
+    assert table.enabled == {0x290, 0x291, 0x292}
+    action = table.actions[0x290]
+    assert action.key is KeyPressDescriptor.KEY_MACRO1
+    assert action.argv == (shutil.which("echo"), "hello world")
+    assert table.actions[0x292].argv == ("definitely-not-a-real-command", "--flag")
+    assert table.accepts == {KEY_EVENTS[0x290][1], KEY_EVENTS[0x292][1]}
+    # Presses of unconfigured keys are still sent, so they can be warned about
+    assert table.subscription == table.accepts | {KEY_EVENTS[code][1] for code in range(0x290, 0x29C)}
+
+
+def test_lookup():
+    table = DispatchTable.compile(keyboard)
+    assert table.lookup(KEY_EVENTS[0x290][1]) is table.actions[0x290]
+    assert table.lookup(KEY_EVENTS[0x290][0]) is None
+    assert table.lookup(KEY_EVENTS[0x291][1]) is None
+    assert table.lookup(KeyPressEvent(descriptor=0x290, type=1)) is table.actions[0x290]
+
+
+def test_reload_swaps_whole_table(monkeypatch):
+    """Ensure a reload publishes a new table and leaves the one readers already hold untouched."""
+    monkeypatch.setattr(settings, "keyboard", keyboard, raising=False)
+    dispatcher = Dispatcher()
+    before = dispatcher.table
+    monkeypatch.setattr(settings, "keyboard", {"enabled_keys": ["KEY_MACRO2"], "KEY_MACRO2": "true"}, raising=False)
+    dispatcher.reload()
+    assert dispatcher.table is not before
+    assert dispatcher.table.version == before.version + 1
+    assert set(dispatcher.table.actions) == {0x291}
+    assert set(before.actions) == {0x290, 0x292}
+
+
+def test_compile_from_snapshot():
+    """Ensure a table compiles from a frozen snapshot of the settings, and takes its version."""
+    snapshot = SettingsSnapshot(
+        {
+            "KEYBOARD": keyboard,
+            "ACTIONS": {"keys": {"KEY_MACRO1": {"overlap": "restart"}}},
+            "GESTURES": {"bindings": {"both": {"chord": ["KEY_MACRO1", "KEY_MACRO3"], "command": "true"}}},
+        },
+        7,
+    )
+    dispatcher = Dispatcher(snapshot)
+    assert dispatcher.table.version == 7
+    assert set(dispatcher.table.actions) == {0x290, 0x292}
+    assert dispatcher.table.actions[0x290].policy.overlap is Overlap.restart
+    assert dispatcher.table.gestures.keys == {0x290, 0x292}
+
+
+def test_compile_from_environment_snapshot(monkeypatch):
+    """Ensure keys set from the environment, which dynaconf stores lowercase, are found in a snapshot."""
+    monkeypatch.setenv("PANASONIC_KEYS_KEYBOARD__ENABLED_KEYS", '@json ["KEY_MACRO1", "KEY_MACRO2"]')
+    monkeypatch.setenv("PANASONIC_KEYS_KEYBOARD__KEY_MACRO1", "'echo one'")
+    monkeypatch.setenv("PANASONIC_KEYS_KEYBOARD__KEY_MACRO2", "'echo two'")
+    monkeypatch.setenv("PANASONIC_KEYS_ACTIONS__KEYS__KEY_MACRO2__OVERLAP", "restart")
+    environment = Dynaconf(envvar_prefix="PANASONIC_KEYS", core_loaders=["TOML"], settings_files=[default_config])
+    table = DispatchTable.compile(snapshot=SettingsSnapshot(environment.as_dict(), 1))
+    assert set(table.actions) == {0x290, 0x291}
+    assert table.actions[0x291].argv == (shutil.which("echo"), "two")
+    assert table.actions[0x291].policy.overlap is Overlap.restart
+    assert table.actions[0x290].policy.overlap is Overlap.queue
@@ -0,0 +1,69 @@
+import ctypes
+import fcntl
+
+import pytest
+
+from panasonic_programmable_keys.input import evdev
+from panasonic_programmable_keys.input.capture import prepare_device
+from panasonic_programmable_keys.input.ecodes import EV_KEY
+from panasonic_programmable_keys.input.ecodes import EV_SYN
+from panasonic_programmable_keys.input.ecodes import KEY_CNT
+from panasonic_programmable_keys.util import settings
+
+
+class FakeDevice:
+    """Records evdev ioctls made against a fake fd, reading back the mask bitmaps they point at."""
+
+    def __init__(self) -> None:
+        self.masks: dict[int, bytes] = {}
+        self.grabbed: bool | None = None
+
+    def ioctl(self, fd, request, arg=0, *_):
+        if request == evdev.EVIOCSMASK:
+            ev_type, size, pointer = evdev.INPUT_MASK.unpack(arg)
+            self.masks[ev_type] = ctypes.string_at(pointer, size)
+        elif request == evdev.EVIOCGRAB:
+            self.grabbed = bool(arg)
+        return 0
+
+
+@pytest.fixture
+def fake_device(monkeypatch):
+    device = FakeDevice()
+    monkeypatch.setattr(fcntl, "ioctl", device.ioctl)
+    return device
+
+
+def test_ioctl_numbers():
+    """Ensure the ioctl request numbers match linux/input.h."""
+    assert evdev.EVIOCGRAB == 0x40044590
+    assert evdev.EVIOCSMASK == 0x40104593
+
+
+def test_bitmap():
+    assert evdev.bitmap([0, 9, 15], 16) == bytearray([0b00000001, 0b10000010])
+
+
+def test_prepare_device_masks(fake_device, monkeypatch):
+    """Ensure only EV_SYN and the macro key codes are left unmasked."""
+    monkeypatch.setitem(settings.input, "grab", False)
+    prepare_device(3)
+    types = int.from_bytes(fake_device.masks[0], "little")
+    assert types == (1 << EV_SYN) | (1 << EV_KEY)
+    keys = int.from_bytes(fake_device.masks[EV_KEY], "little")
+    assert len(fake_device.masks[EV_KEY]) * 8 >= KEY_CNT
+    assert keys == sum(1 << code for code in range(0x290, 0x29C))
+    assert fake_device.grabbed is None
+
+
+def test_prepare_device_grabs(fake_device, monkeypatch):
+    monkeypatch.setitem(settings.input, "grab", True)
+    prepare_device(3)
+    assert fake_device.grabbed is True
+
+
+def test_prepare_device_unsupported(monkeypatch, tmp_path):
+    """Ensure a real fd that doesn't support evdev ioctls falls back without raising."""
+    monkeypatch.setitem(settings.input, "grab", True)
+    with open(tmp_path.joinpath("not-a-device"), "wb") as f:
+        prepare_device(f.fileno())
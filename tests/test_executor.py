@@ -0,0 +1,221 @@
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from types import MappingProxyType
+from typing import List
+
+import pytest
+
+from panasonic_programmable_keys.actions import ActionExecutor
+from panasonic_programmable_keys.actions import spawn as spawn_module
+from panasonic_programmable_keys.actions.spawn import spawn
+from panasonic_programmable_keys.actions.supervisor import ChildSupervisor
+from panasonic_programmable_keys.actions.supervisor import pidfd_supported
+from panasonic_programmable_keys.input.dispatch import Action
+from panasonic_programmable_keys.input.dispatch import ActionPolicy
+from panasonic_programmable_keys.input.dispatch import DispatchTable
+from panasonic_programmable_keys.input.dispatch import Overlap
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+
+sh = shutil.which("sh")
+env = MappingProxyType({"PATH": "/usr/bin:/bin"})
+
+
+def action(script: str, key=KeyPressDescriptor.KEY_MACRO1, **policy) -> Action:
+    return Action(key, script, (sh, "-c", script), env, ActionPolicy(**policy))
+
+
+@pytest.fixture
+def executor():
+    with ActionExecutor(max_concurrent=4) as executor:
+        yield executor
+
+
+def test_submit_never_waits(executor):
+    """Ensure submitting returns straight away, even for a command that takes a while."""
+    start = time.monotonic()
+    executor.submit(action("sleep 0.5"))
+    assert time.monotonic() - start < 0.1
+    executor.wait(timeout=5)
+    assert [result.returncode for result in executor.history] == [0]
+    assert executor.history[0].duration >= 0.5
+
+
+def test_overlap_queue(executor):
+    """Ensure presses beyond a key's limit run one after the other."""
+    for _ in range(3):
+        executor.submit(action("sleep 0.1"))
+    executor.wait(timeout=5)
+    results = list(executor.history)
+    assert len(results) == 3
+    for previous, result in zip(results, results[1:]):
+        assert result.started >= previous.started + previous.duration - 0.01
+
+
+def test_overlap_drop(executor):
+    for _ in range(3):
+        executor.submit(action("sleep 0.2", overlap=Overlap.drop))
+    executor.wait(timeout=5)
+    assert len(executor.history) == 1
+    assert executor.stats()["dropped"] == 2
+
+
+def test_overlap_restart(executor):
+    """Ensure a press while running terminates the running command and starts it again."""
+    executor.submit(action("sleep 5", overlap=Overlap.restart))
+    time.sleep(0.2)
+    executor.submit(action("true", overlap=Overlap.restart))
+    executor.wait(timeout=5)
+    returncodes = sorted(result.returncode for result in executor.history)
+    assert returncodes == [-15, 0]
+
+
+def test_queue_limit(executor):
+    """Ensure flooding a key bound to a slow command queues at most max_queued presses, dropping the rest."""
+    for _ in range(50):
+        executor.submit(action("sleep 0.3", max_queued=2))
+    time.sleep(0.1)
+    stats = executor.stats()
+    assert (stats["running"], stats["waiting"], stats["dropped"]) == (1, 2, 47)
+    executor.wait(timeout=5)
+    assert len(executor.history) == 3
+
+
+def test_restart_while_capturing_output(executor):
+    """Ensure a run cancelled before its output is being read still stops and reaps its command."""
+    capture_output = executor._capture_output
+    stalled: List[int] = []
+
+    async def stall_once(action: Action, fd: int) -> None:
+        if not stalled:
+            stalled.append(fd)
+            os.close(fd)
+            await asyncio.Event().wait()
+        await capture_output(action, fd)
+
+    executor._capture_output = stall_once
+    executor.submit(action("sleep 5", overlap=Overlap.restart))
+    time.sleep(0.2)
+    assert stalled
+    executor.submit(action("true", overlap=Overlap.restart))
+    executor.wait(timeout=5)
+    first, second = executor.history
+    assert (first.returncode, second.returncode) == (-15, 0)
+    with pytest.raises(ChildProcessError):
+        os.waitpid(first.pid, os.WNOHANG)
+
+
+def test_timeout_kill_escalation(executor):
+    """Ensure a command ignoring SIGTERM is killed kill_after seconds after its timeout."""
+    executor.submit(action("trap '' TERM; sleep 5", timeout=0.2, kill_after=0.2))
+    executor.wait(timeout=5)
+    (result,) = executor.history
+    assert result.returncode == -9
+    assert result.duration < 2
+
+
+def test_global_limit():
+    """Ensure no more than max_concurrent actions run at once, whichever keys they're for."""
+    keys = list(KeyPressDescriptor)[:4]
+    with ActionExecutor(max_concurrent=2) as executor:
+        for key in keys:
+            executor.submit(action("sleep 0.2", key=key))
+        time.sleep(0.1)
+        assert executor.stats()["running"] == 2
+        assert executor.stats()["waiting"] == 2
+        executor.wait(timeout=5)
+    assert len(executor.history) == 4
+
+
+def test_missing_command(executor):
+    executor.submit(Action(KeyPressDescriptor.KEY_MACRO1, "nope", ("definitely-not-a-real-command",), env))
+    executor.wait(timeout=5)
+    assert executor.history[0].returncode is None
+
+
+def test_policies_from_settings():
+    keyboard = {"enabled_keys": ["KEY_MACRO1", "KEY_MACRO2"], "KEY_MACRO1": "true", "KEY_MACRO2": "true"}
+    actions = {"overlap": "drop", "timeout": 0, "keys": {"KEY_MACRO2": {"overlap": "restart", "timeout": 3}}}
+    table = DispatchTable.compile(keyboard, actions)
+    assert table.actions[0x290].policy == ActionPolicy(overlap=Overlap.drop)
+    assert table.actions[0x291].policy == ActionPolicy(overlap=Overlap.restart, timeout=3.0)
+
+
+def test_thread_count_constant():
+    """Ensure many commands in flight don't each need a thread to wait on them."""
+    with ActionExecutor(max_concurrent=32) as executor:
+        threads = threading.active_count()
+        for key in KeyPressDescriptor:
+            executor.submit(action("sleep 0.3; echo done", key=key, max_running=4))
+            executor.submit(action("sleep 0.3; echo done", key=key, max_running=4))
+        time.sleep(0.2)
+        assert executor.stats()["running"] == 24
+        assert threading.active_count() == threads
+        executor.wait(timeout=5)
+    assert all(result.returncode == 0 for result in executor.history)
+    assert executor.stats()["actions"]["KEY_MACRO1"]["runs"] == 2
+
+
+def test_children_reaped(executor):
+    executor.submit(action("exit 3"))
+    executor.wait(timeout=5)
+    (result,) = executor.history
+    assert result.returncode == 3
+    with pytest.raises(ChildProcessError):
+        os.waitpid(result.pid, os.WNOHANG)
+
+
+@pytest.mark.parametrize("use_pidfd,in_main_thread", [(True, True), (False, True), (False, False)])
+def test_supervisor_modes(use_pidfd, in_main_thread):
+    """Ensure every way of noticing children exit reaps them with their exit status."""
+    if use_pidfd and not pidfd_supported():
+        pytest.skip("pidfds aren't supported here")
+
+    async def run() -> List[int | None]:
+        supervisor = ChildSupervisor(asyncio.get_running_loop(), use_pidfd)
+        try:
+            processes = [subprocess.Popen([sh, "-c", f"sleep 0.{n}; exit {n}"]) for n in range(3)]
+            return await asyncio.gather(*(supervisor.watch(process.pid) for process in processes))
+        finally:
+            supervisor.close()
+            for process in processes:
+                process.returncode = 0
+
+    results: List[List[int | None]] = []
+    if in_main_thread:
+        results.append(asyncio.run(run()))
+    else:
+        thread = threading.Thread(target=lambda: results.append(asyncio.run(run())))
+        thread.start()
+        thread.join()
+    assert results == [[0, 1, 2]]
+
+
+def test_spawn():
+    """Ensure spawned commands get their own session, no input, and their output and errors on the pipe."""
+    pid, output = spawn((sh, "-c", "echo $FOO; cat; echo error >&2; grep SigIgn /proc/self/status"), {"FOO": "bar"})
+    assert os.getsid(pid) == pid
+    with open(output, "rb") as f:
+        lines = f.read().decode().splitlines()
+    assert os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) == 0
+    assert lines[:2] == ["bar", "error"]
+    # SIGPIPE isn't left ignored as it is in Python
+    assert not int(lines[2].split()[1], 16) & (1 << (signal.SIGPIPE - 1))
+    with pytest.raises(FileNotFoundError):
+        spawn(("definitely-not-a-real-command",), env)
+
+
+def test_popen_fallback(monkeypatch, executor):
+    """Ensure commands started through Popen, where posix_spawn is missing, report their real exit code."""
+    monkeypatch.delattr(os, "posix_spawn")
+    executor.submit(action("echo fallback; exit 3"))
+    executor.wait(timeout=5)
+    (result,) = executor.history
+    assert result.returncode == 3
+    output = executor.last_output("KEY_MACRO1")
+    assert output is not None and output.tail() == ["fallback"]
+    assert not spawn_module._popened
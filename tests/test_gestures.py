@@ -0,0 +1,144 @@
+import asyncio
+from typing import List
+from typing import Tuple
+
+import pytest
+
+from panasonic_programmable_keys.input.dispatch import DispatchTable
+from panasonic_programmable_keys.input.gestures import GestureDriver
+from panasonic_programmable_keys.input.gestures import GestureRecognizer
+from panasonic_programmable_keys.input.gestures import GestureTrie
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+
+P1, P2, P3, P4 = (KeyPressDescriptor[f"KEY_MACRO{n}"].value for n in range(1, 5))
+PRESS, RELEASE = 1, 0
+
+gestures = {
+    "chord_window": 50,
+    "long_press": 600,
+    "sequence_window": 500,
+    "double_tap_window": 300,
+    "bindings": {
+        "both": {"chord": ["KEY_MACRO1", "KEY_MACRO2"], "command": "both"},
+        "then": {"sequence": ["KEY_MACRO1", "KEY_MACRO3"], "command": "then"},
+        "hold": {"long_press": "KEY_MACRO3", "command": "hold"},
+        "twice": {"double_tap": "KEY_MACRO4", "command": "twice"},
+    },
+}
+
+
+@pytest.fixture
+def recognizer() -> GestureRecognizer[str]:
+    """A recognizer firing the command strings, with single commands on P1 to P4."""
+    single = {P1: "one", P2: "two", P3: "three", P4: "four"}
+    trie = GestureTrie.compile(gestures, lambda name, key, command: command, single)
+    return GestureRecognizer(trie)
+
+
+def play(recognizer: GestureRecognizer[str], stream: List[Tuple[int, int, int]], end: int) -> List[Tuple[int, str]]:
+    """Feed (milliseconds, code, value) events, settling deadlines when they're due as GestureDriver would, until end.
+
+    Returns (milliseconds, action) for each action fired.
+    """
+    fired = []
+    for ms, code, value in [*stream, (end, 0, 0)]:
+        while (deadline := recognizer.next_deadline) is not None and deadline <= ms / 1000:
+            fired.extend((round(deadline * 1000), action) for action in recognizer.expire(deadline))
+        if code:
+            fired.extend((ms, action) for action in recognizer.feed(ms / 1000, KEY_EVENTS[code][value]))
+    return fired
+
+
+def test_plain_press_fires_immediately(recognizer):
+    """Ensure a key that only has a plain press bound doesn't wait on anything."""
+    trie = GestureTrie.compile({}, lambda *_: None, {P2: "two"})
+    assert GestureRecognizer(trie).feed(0, KEY_EVENTS[P2][PRESS]) == ["two"]
+    assert trie.accepts == {KEY_EVENTS[P2][PRESS]}
+
+
+def test_chord(recognizer):
+    stream = [(0, P1, PRESS), (20, P2, PRESS), (100, P1, RELEASE), (110, P2, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(20, "both")]
+
+
+def test_chord_too_slow(recognizer):
+    """Ensure keys pressed further apart than the chord window, or released before the next, act alone."""
+    stream = [(0, P2, PRESS), (20, P2, RELEASE), (30, P1, PRESS), (90, P2, PRESS), (100, P1, RELEASE)]
+    # P1 then waits for the sequence window in case P3 follows
+    assert play(recognizer, stream, 2000) == [(20, "two"), (140, "one"), (140, "two")]
+
+
+def test_sequence(recognizer):
+    stream = [(0, P1, PRESS), (30, P1, RELEASE), (300, P3, PRESS), (350, P3, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(350, "then")]
+
+
+def test_sequence_broken(recognizer):
+    """Ensure a sequence interrupted by another key fires the binding matched so far, then the interruption."""
+    stream = [(0, P1, PRESS), (30, P1, RELEASE), (200, P4, PRESS), (220, P4, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(200, "one"), (500, "four")]
+
+
+def test_sequence_too_slow(recognizer):
+    stream = [(0, P1, PRESS), (30, P1, RELEASE), (700, P3, PRESS), (720, P3, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(500, "one"), (720, "three")]
+
+
+def test_long_press(recognizer):
+    stream = [(0, P3, PRESS), (900, P3, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(600, "hold")]
+    # Without a timer, the deadline is only noticed when the next event or expire comes along
+    assert recognizer.feed(3.0, KEY_EVENTS[P3][PRESS]) == []
+    assert recognizer.next_deadline == pytest.approx(3.6)
+    assert recognizer.expire(3.6) == ["hold"]
+
+
+def test_short_press_of_long_press_key(recognizer):
+    stream = [(0, P3, PRESS), (100, P3, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(100, "three")]
+
+
+def test_double_tap(recognizer):
+    stream = [(0, P4, PRESS), (50, P4, RELEASE), (200, P4, PRESS), (250, P4, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(200, "twice")]
+
+
+def test_double_tap_too_slow(recognizer):
+    stream = [(0, P4, PRESS), (50, P4, RELEASE), (400, P4, PRESS), (450, P4, RELEASE)]
+    assert play(recognizer, stream, 2000) == [(300, "four"), (700, "four")]
+
+
+def test_compile_into_dispatch_table():
+    """Ensure gesture bindings become actions named after themselves, and their keys' events are accepted."""
+    keyboard = {"enabled_keys": ["KEY_MACRO1"], "KEY_MACRO1": "true"}
+    table = DispatchTable.compile(keyboard, {"keys": {"hold": {"timeout": 3}}}, gestures=gestures)
+    hold = table.gestures.root.children[(frozenset([P3]), True)].action
+    assert hold is not None
+    assert hold.name == "hold"
+    assert hold.key is KeyPressDescriptor.KEY_MACRO3
+    assert hold.policy.timeout == 3
+    assert table.actions[P1].name == "KEY_MACRO1"
+    assert KEY_EVENTS[P3][RELEASE] in table.accepts
+    assert KEY_EVENTS[P4][PRESS] in table.accepts
+
+
+def test_driver_times_long_press():
+    """Ensure the driver fires a long press from a loop timer, without waiting for the release."""
+
+    async def run() -> List[Tuple[float, str]]:
+        loop = asyncio.get_running_loop()
+        trie = GestureTrie.compile(
+            {"long_press": 100, "bindings": {"hold": {"long_press": "KEY_MACRO3"}}}, lambda *_: "hold"
+        )
+        fired: List[Tuple[float, str]] = []
+        driver: GestureDriver[str] = GestureDriver(loop, lambda action: fired.append((loop.time(), action)))
+        start = loop.time()
+        # Kernel timestamps are on their own clock, which the driver maps onto the loop's
+        driver.feed(trie, 1_000_000.0, KEY_EVENTS[P3][PRESS])
+        await asyncio.sleep(0.3)
+        return [(at - start, action) for at, action in fired]
+
+    ((after, action),) = asyncio.run(run())
+    assert action == "hold"
+    assert 0.1 <= after < 0.25
@@ -0,0 +1,180 @@
+import os
+import shutil
+import time
+from typing import List
+
+import pytest
+
+from panasonic_programmable_keys.input import devices
+from panasonic_programmable_keys.input import is_panasonic_keyboard
+from panasonic_programmable_keys.input.capture import INPUT_EVENT
+from panasonic_programmable_keys.input.ecodes import EV_KEY
+from panasonic_programmable_keys.input.hotplug import DeviceMonitor
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.rpc.broadcast import EventBroadcaster
+from panasonic_programmable_keys.util import settings
+
+from .example_devices import valid_devices
+
+settings.input["check_paths"] = False
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A copy of the FZ-40's device list."""
+    path = tmp_path.joinpath("devices")
+    shutil.copy(valid_devices[0], path)
+    devices.invalidate()
+    yield path
+    devices.invalidate()
+
+
+@pytest.fixture
+def plug(source):
+    """Unplug the keyboard from the device list, or plug it back in."""
+    entries = source.read_text().split("\n\n")
+    keyboard = next(n for n, entry in enumerate(entries) if "panasonic/hkey" in entry)
+
+    def plug(plugged: bool) -> None:
+        source.write_text("\n\n".join(entries if plugged else entries[:keyboard] + entries[keyboard + 1 :]))
+
+    return plug
+
+
+@pytest.fixture
+def directory(tmp_path):
+    """A directory standing in for /dev/input."""
+    path = tmp_path.joinpath("input")
+    path.mkdir()
+    return path
+
+
+def test_monitor_diffs(source, plug, directory):
+    """Ensure handler nodes coming and going produce diffs of the device list, and anything else is ignored."""
+    with DeviceMonitor(directory, source) as monitor:
+        assert not monitor.read()
+        plug(False)
+        directory.joinpath("by-id").mkdir()
+        assert not monitor.read()
+        directory.joinpath("event5").touch()
+        directory.joinpath("event5").unlink()
+        diff = monitor.read()
+        assert [record.phys for record in diff.removed] == ["panasonic/hkey0"]
+        assert diff.added == frozenset()
+        plug(True)
+        directory.joinpath("event5").touch()
+        diff = monitor.read()
+        assert [record.phys for record in diff.added] == ["panasonic/hkey0"]
+        assert diff.table.devices(where=is_panasonic_keyboard).devices[0].phys == "panasonic/hkey0"
+
+
+def test_broadcaster_reattaches(source, plug, directory):
+    """Ensure the reader keeps going when the keyboard goes away, and attaches to it as soon as it's back."""
+    node = directory.joinpath("event5")
+
+    def resolve(table: devices.DeviceTable) -> list:
+        return [node] if any(map(is_panasonic_keyboard, table.records)) and node.exists() else []
+
+    plug(False)
+    broadcaster = EventBroadcaster([], monitor=DeviceMonitor(directory, source), resolve=resolve)
+    subscription = broadcaster.subscribe()
+    broadcaster.start()
+    try:
+        plug(True)
+        start = time.monotonic()
+        os.mkfifo(node)
+        while broadcaster.stats()["devices"] != [str(node)]:
+            assert time.monotonic() - start < 1, "not reattached"
+            time.sleep(0.001)
+        writer = os.open(node, os.O_WRONLY)
+        os.write(writer, INPUT_EVENT.pack(1, 0, EV_KEY, 0x290, 1))
+        assert [captured.event for captured in subscription.get(timeout=1)] == [KEY_EVENTS[0x290][1]]
+        # Unplugging leaves the reader running without devices
+        plug(False)
+        os.close(writer)
+        node.unlink()
+        while broadcaster.stats()["devices"]:
+            assert time.monotonic() - start < 2, "not detached"
+            time.sleep(0.001)
+        assert not broadcaster.finished
+    finally:
+        broadcaster.stop()
+    assert broadcaster.finished
+
+
+def test_broadcaster_retries_until_resolved(source, plug, directory):
+    """Ensure a keyboard listed before its node exists is attached once the node is created, with no other change."""
+    node = directory.joinpath("event5")
+    resolved: List[bool] = []
+
+    def resolve(table: devices.DeviceTable) -> list:
+        resolved.append(node.exists())
+        return [node] if node.exists() else []
+
+    plug(False)
+    broadcaster = EventBroadcaster([], monitor=DeviceMonitor(directory, source), resolve=resolve)
+    broadcaster.start()
+    try:
+        plug(True)
+        directory.joinpath("event6").touch()
+        start = time.monotonic()
+        while not broadcaster.retry:
+            assert time.monotonic() - start < 1, "not looked up"
+            time.sleep(0.001)
+        os.mkfifo(node)
+        while broadcaster.stats()["devices"] != [str(node)]:
+            assert time.monotonic() - start < 2, "not retried"
+            time.sleep(0.001)
+    finally:
+        broadcaster.stop()
+    assert resolved == [False, True]
+    assert not broadcaster.retry
+
+
+def test_broadcaster_idle_without_keyboard(source, plug, directory):
+    """Ensure nothing is looked up again while the keyboard is unplugged, however long the reader sits idle."""
+    calls: List[devices.DeviceTable] = []
+
+    def resolve(table: devices.DeviceTable) -> list:
+        calls.append(table)
+        return []
+
+    broadcaster = EventBroadcaster([], monitor=DeviceMonitor(directory, source), resolve=resolve)
+    broadcaster.start()
+    try:
+        plug(False)
+        directory.joinpath("event5").touch()
+        start = time.monotonic()
+        while not calls:
+            assert time.monotonic() - start < 1, "not looked up"
+            time.sleep(0.001)
+        # Long enough for the reader to time out waiting for events twice, and for other nodes to come and go
+        time.sleep(1.2)
+        directory.joinpath("event6").touch()
+        time.sleep(0.1)
+    finally:
+        broadcaster.stop()
+    assert len(calls) == 1
+    assert not broadcaster.retry
+
+
+def test_broadcaster_gives_up_retrying(source, plug, directory):
+    """Ensure a node that never becomes usable is only retried max_retries times until the device list changes."""
+    calls: List[devices.DeviceTable] = []
+
+    def resolve(table: devices.DeviceTable) -> list:
+        calls.append(table)
+        return []
+
+    plug(False)
+    broadcaster = EventBroadcaster([], monitor=DeviceMonitor(directory, source), resolve=resolve)
+    broadcaster.max_retries = 3
+    broadcaster.start()
+    try:
+        plug(True)
+        for n in range(8):
+            directory.joinpath(f"event{n}").touch()
+            time.sleep(0.05)
+    finally:
+        broadcaster.stop()
+    assert len(calls) == 1 + broadcaster.max_retries
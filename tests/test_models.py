@@ -2,6 +2,15 @@ import pytest
 from pydantic import ValidationError
 
 from panasonic_programmable_keys.input import InputDevices
+from panasonic_programmable_keys.input import is_panasonic_keyboard
+from panasonic_programmable_keys.input.ecodes import EV_KEY
+from panasonic_programmable_keys.input.ecodes import EV_MSC
+from panasonic_programmable_keys.input.ecodes import EV_SW
+from panasonic_programmable_keys.input.ecodes import EV_SYN
+from panasonic_programmable_keys.input.models import DeviceRecord
+from panasonic_programmable_keys.input.models import InputDeviceBitmaps
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.models import parse_devices
 from panasonic_programmable_keys.util import settings
 
 from .example_devices import invalid_devices
@@ -21,3 +30,68 @@ def test_invalid_device_parsing(invalid_device):
     """Ensure that invalid /proc/bus/input/devices files can be deserialized."""
     with pytest.raises(ValidationError):
         InputDevices.load(source=invalid_device)
+
+
+def test_records_are_not_validated():
+    """Ensure a malformed device only fails once its model is asked for."""
+    (record,) = InputDevices.records(invalid_devices[0])
+    assert record.name == '"Sleep Button"'
+    assert record.bitmaps == ()
+    with pytest.raises(ValidationError):
+        record.model()
+
+
+def test_load_only_validates_matching_devices(monkeypatch):
+    calls = []
+    model = DeviceRecord.model
+    monkeypatch.setattr(DeviceRecord, "model", lambda self: calls.append(self.name) or model(self))
+    devices = InputDevices.load(valid_devices[0], where=is_panasonic_keyboard)
+    assert [device.phys for device in devices.devices] == ["panasonic/hkey0"]
+    assert calls == [f'"{devices.devices[0].name}"']
+
+
+def test_unknown_prefix():
+    with pytest.raises(ValueError):
+        list(parse_devices(["I: Bus=0019 Vendor=0000 Product=0003 Version=0000\n", "X: Nonsense=1\n"]))
+
+
+@pytest.mark.parametrize("valid_device", valid_devices)
+def test_bitmaps_round_trip(valid_device):
+    """Ensure the bitmaps the model knows about serialize back to the kernel's text they were read from."""
+    for record in InputDevices.records(valid_device):
+        bitmaps = record.model().bitmaps
+        expected = {"key": "0"} | {name: text for name, text in record.bitmaps if name in InputDeviceBitmaps.__slots__}
+        assert {name: text for name, text in bitmaps.text().items() if text is not None} == expected
+        assert InputDeviceBitmaps(**bitmaps.text()) == bitmaps
+        assert record.model().model_dump()["bitmaps"] == bitmaps.text()
+
+
+def test_bitmaps_capabilities():
+    devices = InputDevices.load(valid_devices[0]).devices
+    keyboard = next(device for device in devices if device.phys == "panasonic/hkey0").bitmaps
+    assert keyboard.has_key(KeyPressDescriptor.KEY_MACRO5)
+    assert not keyboard.has_key(0x1E)
+    assert keyboard.has_ev(EV_KEY) and keyboard.has_ev(EV_MSC) and not keyboard.has_ev(EV_SW)
+    # Bitmaps are hexadecimal, msc included
+    assert keyboard.msc == 0x10
+    # The key bitmap as it used to be held, in longs
+    assert InputDeviceBitmaps(prop=0, ev=3, key=[1, 0]).has_key(64)
+
+
+def test_bitmaps_union_and_intersection():
+    bitmaps = [device.bitmaps for device in InputDevices.load(valid_devices[0]).devices]
+    union = InputDeviceBitmaps.union(bitmaps)
+    assert union.has_key(KeyPressDescriptor.KEY_MACRO1) and union.has_key(0x1E)
+    assert union.led == 0x7
+    both = InputDeviceBitmaps.intersection(bitmaps)
+    assert (both.ev, both.key, both.msc, both.led) == (1 << EV_SYN, 0, None, None)
+    assert (bitmaps[0] | bitmaps[1]).ev == 0x23
+    assert (bitmaps[0] & bitmaps[1]).ev == 0x1
+
+
+def test_bitmaps_validation():
+    """Ensure bitmaps that aren't the kernel's text fail validation of the device they're part of."""
+    (record,) = filter(is_panasonic_keyboard, InputDevices.records(valid_devices[0]))
+    for bitmaps in ((("prop", "0"),), (("prop", "0"), ("ev", "not hex"))):
+        with pytest.raises(ValidationError):
+            record._replace(bitmaps=bitmaps).model()
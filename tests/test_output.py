@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+from types import MappingProxyType
+
+from panasonic_programmable_keys.actions import ActionExecutor
+from panasonic_programmable_keys.actions.output import ActionOutput
+from panasonic_programmable_keys.actions.output import OutputCapture
+from panasonic_programmable_keys.input.dispatch import Action
+from panasonic_programmable_keys.input.dispatch import ActionPolicy
+from panasonic_programmable_keys.input.dispatch import OutputMode
+from panasonic_programmable_keys.input.handle import _stats_on_signal
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.util.ratelimit import TokenBucket
+
+sh = shutil.which("sh")
+env = MappingProxyType({"PATH": "/usr/bin:/bin"})
+
+
+def run(script: str, **policy):
+    """Run script as KEY_MACRO1's action, returning its output."""
+    action = Action(KeyPressDescriptor.KEY_MACRO1, script, (sh, "-c", script), env, ActionPolicy(**policy))
+    with ActionExecutor() as executor:
+        executor.submit(action)
+        executor.wait(timeout=10)
+    output = executor.last_output("KEY_MACRO1")
+    assert output is not None and output.closed
+    return output
+
+
+def test_tail_of_chatty_command():
+    """Ensure a command writing far more than a pipe holds runs to completion, keeping only its last lines."""
+    output = run("seq 200000", output=OutputMode.tail, output_lines=3)
+    assert output.tail() == ["199998", "199999", "200000"]
+    assert output.total_lines == 200000
+    assert output.suppressed == 0
+
+
+def test_tail_logged_for_debugging(caplog):
+    with caplog.at_level(logging.DEBUG, logger="panasonic-programmable-keys"):
+        run("seq 5", output=OutputMode.tail, output_lines=2)
+    assert "KEY_MACRO1: last 2 of 5 lines of output:\n4\n5" in caplog.messages
+
+
+def test_log_rate_limit(caplog):
+    with caplog.at_level(logging.INFO, logger="panasonic-programmable-keys"):
+        output = run("seq 1000", output=OutputMode.log, output_rate=5)
+    logged = [record.getMessage() for record in caplog.records if record.getMessage().startswith("KEY_MACRO1: ")]
+    assert logged[:5] == [f"KEY_MACRO1: {n}" for n in range(1, 6)]
+    assert len(logged) < 20
+    assert output.suppressed > 900
+    assert logged[-1].startswith("KEY_MACRO1: skipped logging")
+
+
+def test_discard():
+    output = run("seq 1000", output=OutputMode.discard)
+    assert output.tail() == []
+    assert output.total_bytes == len("".join(f"{n}\n" for n in range(1, 1001)))
+
+
+def test_long_lines_truncated():
+    """Ensure a line without an end can't grow the buffer without bound."""
+    output = run("head -c 100000 /dev/zero | tr '\\0' x; echo; printf last", output=OutputMode.tail)
+    assert output.tail() == ["x" * 4096, "last"]
+    assert output.truncated == 1
+
+
+def test_long_line_in_one_read():
+    """Ensure a long line arriving whole, with its end, is cut short like one arriving in pieces."""
+
+    async def feed() -> ActionOutput:
+        capture = OutputCapture("KEY_MACRO1", "cat", ActionPolicy(output=OutputMode.tail))
+        capture.data_received(b"x" * 100000 + b"\nlast\n")
+        capture.connection_lost(None)
+        return capture.output
+
+    output = asyncio.run(feed())
+    assert output.tail() == ["x" * 4096, "last"]
+    assert output.truncated == 1
+
+
+def test_output_in_stats(caplog):
+    """Ensure the latest output of each action can be had from outside the client, by sending it SIGUSR1."""
+    action = Action(KeyPressDescriptor.KEY_MACRO1, "seq 5", (sh, "-c", "seq 5"), env, ActionPolicy(output_lines=2))
+    with ActionExecutor() as executor, _stats_on_signal(executor):
+        executor.submit(action)
+        executor.wait(timeout=10)
+        output = executor.stats()["output"]["KEY_MACRO1"]
+        with caplog.at_level(logging.INFO, logger="panasonic-programmable-keys"):
+            os.kill(os.getpid(), signal.SIGUSR1)
+    assert output["lines"] == ["4", "5"]
+    assert output["total_lines"] == 5
+    (logged,) = [message for message in caplog.messages if message.startswith("Action stats: ")]
+    assert json.loads(logged.removeprefix("Action stats: "))["output"]["KEY_MACRO1"] == output
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, burst=3, now=0)
+    assert [bucket.take(now=0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(now=0.5)
+    assert not bucket.take(now=0.5)
+    assert [bucket.take(now=10) for _ in range(4)] == [True, True, True, False]
@@ -0,0 +1,90 @@
+import os
+import signal
+import time
+from types import MappingProxyType
+
+from panasonic_programmable_keys.actions import ActionExecutor
+from panasonic_programmable_keys.input.dispatch import Action
+from panasonic_programmable_keys.input.dispatch import ActionPolicy
+from panasonic_programmable_keys.input.dispatch import DispatchTable
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.plugins import action_types
+
+
+def run(*actions: Action) -> ActionExecutor:
+    with ActionExecutor() as executor:
+        for action in actions:
+            executor.submit(action)
+        executor.wait(timeout=10)
+    return executor
+
+
+def test_builtins_registered():
+    assert {"write", "signal", "toggle"} <= set(action_types())
+
+
+def test_compile_plugins(tmp_path):
+    """Ensure keys mapped to tables become in-process actions, and bad ones are left out."""
+    target = tmp_path.joinpath("out")
+    keyboard = {
+        "enabled_keys": ["KEY_MACRO1", "KEY_MACRO2", "KEY_MACRO3"],
+        "KEY_MACRO1": {"action": "write", "path": str(target), "data": "hello"},
+        "KEY_MACRO2": {"action": "definitely-not-an-action"},
+        "KEY_MACRO3": {"action": "write", "bogus": True},
+    }
+    table = DispatchTable.compile(keyboard, {})
+    assert set(table.actions) == {0x290}
+    action = table.actions[0x290]
+    assert action.argv == ()
+    assert action.command == f"write(path={str(target)!r}, data='hello')"
+    executor = run(action, action)
+    assert [result.returncode for result in executor.history] == [0, 0]
+    assert target.read_text() == "hello\n"
+
+
+def test_write_fifo_without_reader(tmp_path):
+    """Ensure writing to a FIFO nobody's reading fails straight away rather than hanging."""
+    fifo = tmp_path.joinpath("fifo")
+    os.mkfifo(fifo)
+    table = DispatchTable.compile(
+        {"enabled_keys": ["KEY_MACRO1"], "KEY_MACRO1": {"action": "write", "path": str(fifo)}}
+    )
+    executor = run(table.actions[0x290])
+    assert executor.history[0].returncode == 1
+
+
+def test_signal_and_toggle(tmp_path):
+    received = []
+    previous = signal.signal(signal.SIGUSR2, lambda signum, _: received.append(signum))
+    pid_file = tmp_path.joinpath("pid")
+    pid_file.write_text(f"{os.getpid()}\n")
+    attribute = tmp_path.joinpath("attribute")
+    attribute.write_text("0\n")
+    keyboard = {
+        "enabled_keys": ["KEY_MACRO1", "KEY_MACRO2"],
+        "KEY_MACRO1": {"action": "signal", "signal": "sigusr2", "pid_file": str(pid_file)},
+        "KEY_MACRO2": {"action": "toggle", "path": str(attribute)},
+    }
+    try:
+        table = DispatchTable.compile(keyboard)
+        executor = run(table.actions[0x290], table.actions[0x291])
+        time.sleep(0.1)
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+    assert received == [signal.SIGUSR2]
+    assert attribute.read_text() == "1"
+    last_output = executor.last_output("KEY_MACRO2")
+    assert last_output is not None and last_output.tail() == ["1"]
+
+
+def test_plugin_timeout_abandoned():
+    """Ensure a hung in-process action is given up on, without holding up the actions queued behind it."""
+
+    def hang() -> None:
+        time.sleep(1)
+
+    key = KeyPressDescriptor.KEY_MACRO1
+    policy = ActionPolicy(timeout=0.1, max_running=2)
+    executor = run(*(Action(key, "hang", (), MappingProxyType({}), policy, hang) for _ in range(2)))
+    assert [result.returncode for result in executor.history] == [None, None]
+    assert all(result.duration < 0.5 for result in executor.history)
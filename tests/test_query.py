@@ -0,0 +1,67 @@
+from panasonic_programmable_keys.input import devices
+from panasonic_programmable_keys.input import is_panasonic_keyboard
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.query import PANASONIC_KEYBOARD
+from panasonic_programmable_keys.input.query import bus
+from panasonic_programmable_keys.input.query import device_id
+from panasonic_programmable_keys.input.query import handler
+from panasonic_programmable_keys.input.query import has_ev
+from panasonic_programmable_keys.input.query import has_key
+from panasonic_programmable_keys.input.query import name
+from panasonic_programmable_keys.input.query import phys
+from panasonic_programmable_keys.input.query import sysfs
+from panasonic_programmable_keys.util import settings
+
+from .example_devices import valid_devices
+
+settings.input["check_paths"] = False
+
+
+def table() -> devices.DeviceTable:
+    return devices.device_table(valid_devices[0])
+
+
+def names(found) -> list[str]:
+    return [device.name for device in found]
+
+
+def test_lookups():
+    """Ensure each index finds the devices with the field, in the order they're listed."""
+    assert names(table().find(phys("panasonic/hkey0"))) == ["Panasonic Laptop Support - With Macros"]
+    assert names(table().find(name("Video Bus"))) == ["Video Bus", "Video Bus"]
+    assert len(table().find(name("sof-hda-dsp HDMI", prefix=True))) == 3
+    assert names(table().find(sysfs("/devices/platform/i8042/serio0/input/input2"))) == ["AT Translated Set 2 keyboard"]
+    assert names(table().find(handler("mouse"))) == ["Wacom Multitouch sensor Finger", "IEI0029:00 214A:0029 Mouse"]
+    assert names(table().find(handler("event6"))) == ["Panasonic Laptop Support - With Macros"]
+    assert names(table().find(device_id(0x18, 0x214A, 0x29))) == [
+        "IEI0029:00 214A:0029 Mouse",
+        "IEI0029:00 214A:0029 Keyboard",
+    ]
+    assert len(table().find(bus(0x19))) == 7
+    assert table().find(phys("nonexistent")) == []
+
+
+def test_composition():
+    """Ensure queries combine as sets do."""
+    assert names(table().find(bus(0x19) & handler("kbd") & ~name("Video Bus"))) == [
+        "Power Button",
+        "Intel HID events",
+        "Intel HID 5 button array",
+        "Panasonic Laptop Support - With Macros",
+    ]
+    assert len(table().find(handler("mouse0") | handler("mouse1") | phys("ALSA"))) == 7
+    assert len(table().find(~bus(0x19) | bus(0x19))) == len(table().records)
+
+
+def test_capabilities():
+    """Ensure the capability lookups read the kernel's bitmaps."""
+    assert names(table().find(has_key(KeyPressDescriptor.KEY_MACRO1))) == ["Panasonic Laptop Support - With Macros"]
+    # Switches: the lid and the jacks
+    assert len(table().find(has_ev(0x05))) == 6
+
+
+def test_panasonic_keyboard():
+    """Ensure the query for the keyboard agrees with the predicate it replaces."""
+    found = table().find(PANASONIC_KEYBOARD)
+    assert found == table().devices(where=is_panasonic_keyboard).devices
+    assert repr(PANASONIC_KEYBOARD) == "phys('panasonic/hkey', prefix=True)"
@@ -0,0 +1,77 @@
+from typing import List
+from typing import Tuple
+
+from panasonic_programmable_keys.input.capture import decode_events
+from panasonic_programmable_keys.input.dispatch import DispatchTable
+from panasonic_programmable_keys.input.ecodes import EV_KEY
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.input.models import KeyPressEventType
+from panasonic_programmable_keys.input.repeat import RepeatLimiter
+
+P1, P2 = 0x290, 0x291
+RELEASE, PRESS, REPEAT = 0, 1, 2
+
+
+def table(**policy) -> DispatchTable:
+    keyboard = {"enabled_keys": ["KEY_MACRO1", "KEY_MACRO2"], "KEY_MACRO1": "true", "KEY_MACRO2": "true"}
+    return DispatchTable.compile(keyboard, {"keys": {"KEY_MACRO1": policy}}, gestures={})
+
+
+def allowed(limiter: RepeatLimiter, stream: List[Tuple[int, int, int]]) -> List[Tuple[int, int]]:
+    """Feed (milliseconds, code, value) events, returning (milliseconds, value) for those allowed through."""
+    return [(ms, value) for ms, code, value in stream if limiter.allow(ms / 1000, KEY_EVENTS[code][value]) and value]
+
+
+def held(code: int, start: int, end: int, delay: int = 250, period: int = 33) -> List[Tuple[int, int, int]]:
+    """A key held from start to end, repeating like the kernel does."""
+    return [
+        (start, code, PRESS),
+        *((ms, code, REPEAT) for ms in range(start + delay, end, period)),
+        (end, code, RELEASE),
+    ]
+
+
+def test_repeats_are_decoded():
+    """Ensure autorepeat records become events of their own, rather than failing validation."""
+    (event,) = decode_events([(1, 0, EV_KEY, P1, REPEAT)])
+    assert event.type is KeyPressEventType.repeat
+
+
+def test_repeats_ignored_by_default():
+    limiter = RepeatLimiter(table())
+    assert allowed(limiter, held(P1, 0, 2000)) == [(0, PRESS)]
+    assert KEY_EVENTS[P1][REPEAT] not in limiter.table.accepts
+
+
+def test_repeats_fire_at_capped_rate():
+    """Ensure a held key fires on its repeats, but no faster than repeat_rate."""
+    limiter = RepeatLimiter(table(repeat="fire", repeat_rate=4))
+    fired = allowed(limiter, held(P1, 0, 1260))
+    assert fired[0] == (0, PRESS)
+    assert [ms for ms, _ in fired[1:]] == [250, 514, 778, 1042]
+    assert KEY_EVENTS[P1][REPEAT] in limiter.table.accepts
+
+
+def test_coalesce_bursts():
+    """Ensure a bouncing key, or one held down, fires once per burst."""
+    limiter = RepeatLimiter(table(repeat="coalesce", coalesce_window=0.1))
+    bounce = [(0, P1, PRESS), (5, P1, RELEASE), (12, P1, PRESS), (20, P1, RELEASE), (400, P1, PRESS)]
+    assert allowed(limiter, bounce) == [(0, PRESS), (400, PRESS)]
+    # Repeats keep the burst going for as long as the key is held
+    fired = allowed(limiter, held(P1, 1000, 3000) + [(3050, P1, PRESS), (3200, P1, PRESS)])
+    assert fired == [(1000, PRESS), (3200, PRESS)]
+
+
+def test_rate_limit_stops_runaway_key():
+    """Ensure a key can't fire faster than rate_limit, whatever its repeat policy, and other keys are unaffected."""
+    limiter = RepeatLimiter(table(rate_limit=5))
+    stuck = [(ms, P1, value) for ms in range(0, 1000, 10) for value in (PRESS, RELEASE)]
+    # A burst of five, then one every 200ms
+    assert [ms for ms, _ in allowed(limiter, stuck)] == [0, 10, 20, 30, 40, 210, 410, 610, 810]
+    assert limiter.dropped[P1] == 100 - 9
+    assert allowed(limiter, [(990, P2, PRESS)]) == [(990, PRESS)]
+
+
+def test_no_rate_limit():
+    limiter = RepeatLimiter(table(rate_limit=0))
+    assert len(allowed(limiter, [(ms, P1, PRESS) for ms in range(100)])) == 100
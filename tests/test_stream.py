@@ -0,0 +1,116 @@
+import threading
+import time
+from pathlib import Path
+from typing import List
+from typing import Set
+from typing import Tuple
+
+import pytest
+
+from panasonic_programmable_keys.input import CapturedEvent
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.input.models import KeyPressDescriptor
+from panasonic_programmable_keys.input.models import KeyPressEventType
+from panasonic_programmable_keys.input.models import key_filter
+from panasonic_programmable_keys.rpc.broadcast import EventBroadcaster
+from panasonic_programmable_keys.rpc.client import KeyClient
+from panasonic_programmable_keys.rpc.stream import KeyStreamServer
+from panasonic_programmable_keys.rpc.stream import stream_socket_path
+from panasonic_programmable_keys.util import settings
+
+source = Path("/dev/input/event99")
+events = [CapturedEvent(n / 10, source, KEY_EVENTS[0x290 + n % 12][n % 2]) for n in range(100)]
+
+
+def test_stream_socket_path(monkeypatch):
+    monkeypatch.setitem(settings.rpc, "socket", "/run/panasonic/keys.sock")
+    assert stream_socket_path() == Path("/run/panasonic/keys.stream.sock")
+    monkeypatch.setitem(settings.rpc, "stream_socket", "/tmp/elsewhere.sock")
+    assert stream_socket_path() == Path("/tmp/elsewhere.sock")
+
+
+@pytest.fixture
+def stream_server(tmp_path, monkeypatch):
+    """Serve a broadcaster that's only fed by publish on a temporary stream socket."""
+    monkeypatch.setitem(settings.rpc, "socket", str(tmp_path.joinpath("keys.sock")))
+    broadcaster = EventBroadcaster([])
+    server = KeyStreamServer(stream_socket_path(), lambda accepts: broadcaster.subscribe(accepts=accepts))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield broadcaster
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition) -> None:
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_server_pushes_to_client(stream_server):
+    """Ensure a connected client receives published events, and that the server notices when it hangs up."""
+
+    def publish():
+        wait_for(lambda: stream_server.subscribers)
+        stream_server.publish(events)
+
+    threading.Thread(target=publish, daemon=True).start()
+    client = KeyClient().stream_keys()
+    received = [event for _, event in zip(events, client)]
+    client.close()
+    assert received == [e.event for e in events]
+
+    wait_for(lambda: not stream_server.subscribers)
+    assert stream_server.subscribers == []
+
+
+def test_server_filters_for_client(stream_server):
+    """Ensure only the events a client subscribed to are sent, and that its filter can be replaced in place."""
+    macro1 = key_filter([KeyPressDescriptor.KEY_MACRO1], [KeyPressEventType.press])
+    macro2 = key_filter([KeyPressDescriptor.KEY_MACRO2], [KeyPressEventType.press])
+    every_event = [CapturedEvent(0, source, event) for values in KEY_EVENTS.values() for event in values.values()]
+    client = KeyClient()
+    stream = client.stream_keys(macro1)
+
+    def publish():
+        wait_for(lambda: stream_server.subscribers)
+        stream_server.publish(every_event)
+        wait_for(lambda: stream_server.subscribers[0].cursor == len(every_event))
+        client.set_filter(macro2)
+        wait_for(lambda: stream_server.subscribers[0].accepts == macro2)
+        stream_server.publish(every_event)
+
+    threading.Thread(target=publish, daemon=True).start()
+    received = [next(stream) for _ in range(2)]
+    assert received == [KEY_EVENTS[0x290][1], KEY_EVENTS[0x291][1]]
+    stats = stream_server.stats()["subscribers"][0]
+    assert stats["filtered"] == 2 * len(every_event) - 2
+    assert stats["delivered"] == 2
+    stream.close()
+
+
+def test_rpc_fallback_follows_filter(monkeypatch):
+    """Ensure a filter set while iterating over RPC is sent to the server, by starting the iteration again."""
+    monkeypatch.setitem(settings.rpc, "streaming", False)
+    macro1 = key_filter([KeyPressDescriptor.KEY_MACRO1], [KeyPressEventType.press])
+    macro2 = key_filter([KeyPressDescriptor.KEY_MACRO2], [KeyPressEventType.press])
+    client = KeyClient()
+    requested: List[Set[Tuple[int, int]]] = []
+
+    class Proxy:
+        def yield_keys(self, accepts):
+            requested.append(set(accepts))
+            for n in range(4):
+                if n == 2 and len(requested) == 1:
+                    client.set_filter(macro2)
+                for event in (KEY_EVENTS[0x290][1], KEY_EVENTS[0x291][1]):
+                    # Filtered like the server does, before anything is sent
+                    if (event.descriptor.value, event.type.value) in accepts:
+                        yield {"descriptor": event.descriptor.value, "type": event.type.value, "time": n}
+
+    client.proxy = Proxy()  # type: ignore[assignment]
+    received = [(timed.time, timed.event) for timed in client.timed_keys(macro1)]
+    assert requested == [{(0x290, 1)}, {(0x291, 1)}]
+    assert received == [(0, KEY_EVENTS[0x290][1]), (1, KEY_EVENTS[0x290][1])] + [
+        (n, KEY_EVENTS[0x291][1]) for n in range(4)
+    ]
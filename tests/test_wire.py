@@ -0,0 +1,109 @@
+import random
+import socket
+import threading
+from pathlib import Path
+
+import pytest
+
+from panasonic_programmable_keys.input import CapturedEvent
+from panasonic_programmable_keys.input.models import KEY_EVENTS
+from panasonic_programmable_keys.rpc import wire
+
+all_events = [event for values in KEY_EVENTS.values() for event in values.values()]
+
+
+def random_events(seed: int, count: int) -> list[CapturedEvent]:
+    rng = random.Random(seed)
+    return [
+        CapturedEvent(
+            rng.randrange(0, 2**41) / 1_000_000,
+            Path(f"/dev/input/event{rng.randrange(0, 1024)}"),
+            rng.choice(all_events),
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("version", sorted(wire.FRAMES))
+@pytest.mark.parametrize("seed", range(20))
+def test_frames_round_trip(version, seed):
+    """Ensure any event survives encoding and decoding with its time, source and identity intact."""
+    events = random_events(seed, random.Random(seed).randrange(1, 300))
+    data = wire.encode_batches(events, version)
+    frames = memoryview(data)[wire.BATCH_HEADER.size :]
+    decoded = list(wire.decode_frames(frames, version))
+    assert decoded == [wire.WireEvent(e.time, wire.source_id(e.source), e.event) for e in events]
+    assert all(d.event is e.event for d, e in zip(decoded, events))
+
+
+@pytest.mark.parametrize("version", sorted(wire.FRAMES))
+def test_frames_are_fixed_size(version):
+    events = random_events(0, 10)
+    assert len(wire.encode_batches(events, version)) == wire.BATCH_HEADER.size + 10 * wire.FRAMES[version].size
+
+
+def test_decode_skips_unknown_events():
+    frame = wire.FRAMES[wire.VERSION]
+    data = frame.pack(1, 0x1E, 1, 0) + frame.pack(2, 0x290, 1, 0) + frame.pack(3, 0x290, 9, 0)
+    assert [d.event for d in wire.decode_frames(data)] == [KEY_EVENTS[0x290][1]]
+
+
+def test_stream_round_trip_across_batches():
+    """Ensure a stream of several batches, split across reads, decodes back into the same interned events."""
+    events = random_events(1, wire.MAX_BATCH + 10)
+    left, right = socket.socketpair()
+    with right:
+        sender = threading.Thread(target=lambda: (left.sendall(wire.encode_batches(events)), left.close()))
+        sender.start()
+        assert list(wire.decode_stream(right)) == [e.event for e in events]
+        sender.join()
+
+
+def handshake(client_range: tuple[int, int]) -> tuple[int | Exception, int | Exception]:
+    left, right = socket.socketpair()
+    results: list[int | Exception] = []
+
+    def server():
+        try:
+            results.append(wire.server_handshake(right))
+        except wire.WireVersionError as e:
+            results.append(e)
+        right.close()
+
+    thread = threading.Thread(target=server)
+    thread.start()
+    try:
+        client: int | Exception = wire.client_handshake(left, *client_range)
+    except wire.WireVersionError as e:
+        client = e
+    thread.join()
+    left.close()
+    return client, results[0]
+
+
+def test_handshake_picks_highest_shared_version():
+    assert handshake((wire.MIN_VERSION, 200)) == (wire.VERSION, wire.VERSION)
+
+
+def test_handshake_without_shared_version():
+    client, server = handshake((100, 200))
+    assert isinstance(client, wire.WireVersionError)
+    assert isinstance(server, wire.WireVersionError)
+
+
+def test_source_id():
+    assert wire.source_id(Path("/dev/input/event7")) == 7
+    assert wire.source_id(Path("/tmp/not-an-event-handler")) == 0
+
+
+def test_filter_round_trip():
+    accepts = frozenset(random.Random(2).sample(all_events, 7))
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(wire.encode_filter(accepts))
+        assert wire.read_filter(right) == accepts
+        left.sendall(b"nope\x00\x00")
+        with pytest.raises(wire.WireError):
+            wire.read_filter(right)
+        left.close()
+        assert wire.read_filter(right) is None